@@ -0,0 +1,51 @@
+import math
+from typing import NamedTuple
+import numpy as np
+
+# angle between the main line and the arrow lines
+ARROW_ANGLE = math.pi/8
+# arrow length relative to the line length
+ARROW_LENGTH = 1/8
+
+
+class ArrowheadCache(NamedTuple):
+    # all points are (latitude, longitude), one entry per line in the order of network.lines
+    midpoints: np.ndarray       # shape (lines, 2)
+    forward: np.ndarray         # arrowheads pointing from bus0 to bus1, shape (lines, 3, 2)
+    reverse: np.ndarray         # arrowheads pointing from bus1 to bus0, shape (lines, 3, 2)
+
+
+def get_arrowheads(x1, y1, x2, y2) -> np.ndarray:
+    # side point, tip and other side point of arrowheads drawn at the middle of
+    # the lines (x1, y1) -> (x2, y2), pointing towards (x2, y2)
+    x3, y3 = (x1+x2)/2, (y1+y2)/2     # mid point
+    dx, dy = x2-x1, y2-y1
+    l = np.hypot(dx, dy)    #line length
+    # unit vector along the line, left as zero for lines whose ends coincide
+    ux = np.divide(dx, l, out=np.zeros_like(l), where=l > 0)
+    uy = np.divide(dy, l, out=np.zeros_like(l), where=l > 0)
+    al = l*ARROW_LENGTH    #arrow length
+    hw = al*math.tan(ARROW_ANGLE)   # half width of the arrowhead
+    # base of the arrowhead, one arrow length back from the tip
+    xprime = x3 - al*ux
+    yprime = y3 - al*uy
+    # latitude first then longitude
+    return np.stack([np.stack([yprime + hw*ux, xprime - hw*uy], axis=-1),
+                     np.stack([y3, x3], axis=-1),
+                     np.stack([yprime - hw*ux, xprime + hw*uy], axis=-1)], axis=-2)
+
+
+def build_arrowhead_cache(network) -> ArrowheadCache:
+    # bus coordinates never change, so both orientations are computed only once
+    x0 = network.buses.x.reindex(network.lines.bus0).to_numpy(dtype=float)
+    y0 = network.buses.y.reindex(network.lines.bus0).to_numpy(dtype=float)
+    x1 = network.buses.x.reindex(network.lines.bus1).to_numpy(dtype=float)
+    y1 = network.buses.y.reindex(network.lines.bus1).to_numpy(dtype=float)
+    return ArrowheadCache(midpoints=np.stack([(y0+y1)/2, (x0+x1)/2], axis=-1),
+                          forward=get_arrowheads(x0, y0, x1, y1),
+                          reverse=get_arrowheads(x1, y1, x0, y0))
+
+
+def select_arrowheads(cache: ArrowheadCache, forward: np.ndarray) -> np.ndarray:
+    # picks the arrowhead of every line that matches its flow direction
+    return np.where(forward[:, None, None], cache.forward, cache.reverse)
@@ -0,0 +1,91 @@
+"""
+Batch power flow for replaying and backfilling past meter readings.
+
+Every minute of readings becomes one PyPSA snapshot, and a whole chunk of
+minutes (a day by default) is solved with a single network.pf() call instead
+of one call per minute as in the live loop of main.py.
+
+The readings file is a CSV with a timestamp column followed by one column per
+meter (physics, biotech, management, civil, electrical, transformer) holding the
+total power of the meter in W.
+
+usage: python batch_flow.py readings.csv [--chunk 1440] [--render OUTPUT_DIR] [--history HISTORY_DIR]
+"""
+
+import os
+import argparse
+import pandas as pd
+import ku_grid_model
+import load_allocation
+import grid_metrics
+import grid_state
+from history_store import HistoryStore
+
+
+def read_meter_readings(path: str) -> pd.DataFrame:
+    readings = pd.read_csv(path, index_col=0, parse_dates=True)
+    readings = readings.reindex(columns=load_allocation.METERS)
+    # meters that did not report in a minute keep their last value
+    return readings.sort_index().ffill().fillna(load_allocation.INITIAL_METER_POWER)
+
+
+def solve_chunk(network, readings: pd.DataFrame, line_resistances):
+    # load all minutes of the chunk into snapshots and solve them in one call
+    p_set, q_set = load_allocation.allocate_loads(readings)
+    network.set_snapshots(readings.index)
+    network.loads_t.p_set = p_set
+    network.loads_t.q_set = q_set
+    network.pf()
+
+    bus_metrics = grid_metrics.compute_all_bus_metrics(network)
+    line_metrics = grid_metrics.compute_all_line_metrics(network, line_resistances)
+    return bus_metrics, line_metrics
+
+
+def run_batch(network, readings: pd.DataFrame, chunk_size=1440, on_results=None):
+    # solves all readings chunk by chunk, so that memory stays bounded for long replays
+    # on_results(timestamps, bus_metrics, line_metrics) is called once per chunk
+    # with one row per minute in every metric array
+    line_resistances = grid_metrics.get_line_resistances(network)
+    for start in range(0, len(readings), chunk_size):
+        chunk = readings.iloc[start:start+chunk_size]
+        bus_metrics, line_metrics = solve_chunk(network, chunk, line_resistances)
+        print(f"solved {chunk.index[0]} to {chunk.index[-1]} ({len(chunk)} minutes)")
+        if on_results is not None:
+            on_results(chunk.index, bus_metrics, line_metrics)
+
+
+def render_states(output_dir: str):
+    # writes the grid state document of every solved minute into output_dir
+    def on_results(timestamps, bus_metrics, line_metrics):
+        for i, timestamp in enumerate(timestamps):
+            buses = grid_metrics.select_snapshot(bus_metrics, i)
+            lines = grid_metrics.select_snapshot(line_metrics, i)
+            state = grid_state.get_grid_state(timestamp, buses, lines, [])
+            grid_state.save_grid_state(os.path.join(output_dir, f"ku_grid_state_{timestamp:%Y%m%d_%H%M}.js"), state)
+    return on_results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve past meter readings in batches of snapshots")
+    parser.add_argument("readings", help="CSV file with one row of meter powers (W) per minute")
+    parser.add_argument("--chunk", type=int, default=1440, help="number of minutes solved per power flow call")
+    parser.add_argument("--render", metavar="OUTPUT_DIR", help="also write the grid state of every minute")
+    parser.add_argument("--history", metavar="HISTORY_DIR",
+                        help="also append every minute to the history store, a directory of its own "
+                             "if the live loop already wrote these days")
+    args = parser.parse_args()
+
+    network = ku_grid_model.create_network()
+    callbacks = []
+    if args.render:
+        os.makedirs(args.render, exist_ok=True)
+        callbacks.append(render_states(args.render))
+    if args.history:
+        callbacks.append(HistoryStore(args.history, network.buses.index, network.lines.index).append_many)
+
+    def on_results(timestamps, bus_metrics, line_metrics):
+        for callback in callbacks:
+            callback(timestamps, bus_metrics, line_metrics)
+
+    run_batch(network, read_meter_readings(args.readings), chunk_size=args.chunk, on_results=on_results)
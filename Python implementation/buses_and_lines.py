@@ -1,115 +1,13 @@
-buses_dict = {
-    'HVB': 'Transformer Primary(HVB)',
-    'LVB1': 'Transformer Secondary(LVB1)',
-    'LVB2': 'LVB2',
-    'LVB3': 'Multipurpose Hall(LVB3)',
-    'LVB4': 'LVB4',
-    'LVB5': 'Block10(LVB5)',
-    'LVB6': 'Civil Engineering(LVB6)',
-    'LVB7': 'LVB7',
-    'LVB8': 'Administration(LVB8)',
-    'LVB9': 'LVB9',
-    'LVB10': 'Library(LVB10)',
-    'LVB11': 'LVB11',
-    'LVB12': 'LVB12',
-    'LVB13': 'CV Raman Auditorium(LVB13)',
-    'LVB14': 'LVB14',
-    'LVB15': 'LVB15',
-    'LVB16': 'UMN Science Block(LVB16)',
-    'LVB17': 'AEC Block (LVB17)',
-    'LVB18': 'LVB18',
-    'LVB19': 'Biotechnology Block(LVB19)',
-    'LVB20': 'LVB20',
-    'LVB21': 'LVB21',
-    'LVB22': 'Girls Hostel(LVB22)',
-    'LVB23': 'Staff Quarter(LVB23)',
-    'LVB24': 'LVB24',
-    'LVB25': 'Mechanical Workshop(LVB25)',
-    'LVB26': 'LVB26',
-    'LVB27': 'TTC1(LVB27)',
-    'LVB28': 'TTC2(LVB28)',
-    'LVB29': 'LVB29',
-    'LVB30': 'NIMB ATM(LVB30)',
-    'LVB31': 'LVB31',
-    'LVB32': 'Biotechnology Block(LVB32)',
-    'LVB33': 'LVB33',
-    'LVB34': 'Fast Food Café(LVB34)',
-    'LVB35': 'LVB35',
-    'LVB36': 'KU Mesh(LVB36)',
-    'LVB37': 'LVB37',
-    'LVB38': 'KU Boys Hostel(LVB38)',
-    'LVB39': 'LVB39',
-    'LVB40': 'KU Girls Hostel 2(LVB40)',
-    'LVB41': 'KU Boys Hostel 2(LVB41)',
-    'LVB42': 'LVB42',
-    'LVB43': 'Staff Quarter 2(LVB43)',
-    'LVB44': 'LVB44',
-    'LVB45': 'NIMB(LVB45)',
-    'LVB46': 'LVB46',
-    'LVB47': 'LVB47',
-    'LVB48': 'LVB48',
-    'LVB49': 'Electrical Engineering Block(LVB49)',
-    'LVB50': 'Block9(LVB50)',
-    'LVB51': 'TTL (LVB51)',
-    'LVB52': 'SOM Lab(LVB52)',
-    'LVB55': 'LVB55'
-}
+import model_loader
 
-line_resistance_dict = {
-    'Line1_2': 0.082 * 0.039,
-    'Line2_3': 0.082 * 0.03,
-    'Line2_4': 0.082 * 0.1485,
-    'Line4_5': 0.082 * 0.03,
-    'Line4_6': 0.082 * 0.03,
-    'Line4_7': 0.082 * 0.03774,
-    'Line7_8': 0.082 * 0.03,
-    'Line7_9': 0.082 * 0.04611,
-    'Line9_10': 0.082 * 0.03,
-    'Line9_11': 0.082 * 0.03551,
-    'Line11_12': 0.082 * 0.01087,
-    'Line12_13': 0.082 * 0.03,
-    'Line12_14': 0.082 * 0.0307,
-    'Line14_15': 0.082 * 0.04298,
-    'Line15_16': 0.082 * 0.03,
-    'Line15_17': 0.082 * 0.03,
-    'Line15_18': 0.082 * 0.09234,
-    'Line18_19': 0.082 * 0.03,
-    'Line14_20': 0.082 * 0.033,
-    'Line20_21': 0.082 * 0.06867,
-    'Line21_22': 0.082 * 0.04,
-    'Line21_23': 0.082 * 0.06259,
-    'Line1_24': 0.082 * 0.0413,
-    'Line24_25': 0.082 * 0.03,
-    'Line24_26': 0.082 * 0.05058,
-    'Line26_27': 0.082 * 0.03,
-    'Line27_28': 0.082 * 0.03,
-    'Line26_52': 0.082 * 0.03,
-    'Line26_29': 0.082 * 0.10924,
-    'Line29_30': 0.082 * 0.03,
-    'Line4_31': 0.082 * 0.04907,
-    'Line31_32': 0.082 * 0.03,
-    'Line31_33': 0.082 * 0.04446,
-    'Line33_34': 0.082 * 0.16,
-    'Line33_35': 0.082 * 0.09695,
-    'Line35_36': 0.082 * 0.03,
-    'Line35_37': 0.082 * 0.05521,
-    'Line37_38': 0.082 * 0.03,
-    'Line37_40': 0.082 * 0.03,
-    'Line40_41': 0.082 * 0.03,
-    'Line35_42': 0.082 * 0.05915,
-    'Line42_43': 0.082 * 0.03,
-    'Line42_44': 0.082 * 0.05007,
-    'Line44_45': 0.082 * 0.05007,
-    'Line7_46': 0.082 * 0.01352,
-    'Line46_47': 0.082 * 0.04956,
-    'Line47_48': 0.082 * 0.05461,
-    'Line48_49': 0.082 * 0.03,
-    'Line48_50': 0.082 * 0.03,
-    'Line48_51': 0.082 * 0.03
-}
+# display names and line resistances, read from the same tables as the network in ku_grid_model
+_model = model_loader.read_model(model_loader.KU_MODEL_DIR)
+buses_dict = model_loader.get_bus_names(_model)
+line_resistance_dict = model_loader.get_line_resistances(_model)
 
 def get_bus_names(bus_no: str)->str:
-    return buses_dict[bus_no]
+    # buses without a descriptive name (e.g. of synthetic feeders) keep their bus number
+    return buses_dict.get(bus_no, bus_no)
 
 def get_line_resistance(line_no: str)->float:
     return line_resistance_dict[line_no]
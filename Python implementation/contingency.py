@@ -0,0 +1,279 @@
+"""
+N-1 contingency analysis: every single line and transformer outage.
+
+The feeder is radial, so taking out a branch de-energises everything below
+it and leaves the rest a smaller tree with the same ordering. Every outage is
+therefore the radial sweep of the base topology with the loads of the cut off
+subtree set to zero, and a whole batch of outages is solved at once as a sweep
+with one column per case (radial_sweep.sweep with s_load of shape
+(buses, cases)), warm started from the base solution. Outages cutting off no
+load keep the base solution and are not solved at all.
+
+The batches are spread over a process pool. The topology and the limits are
+handed to every worker once by the pool initializer (inherited without
+pickling where processes are forked), so a task only carries the current bus
+loads, their base solution and the branch indices of its batch.
+
+Every case reports the buses it de-energises and the load lost, the energised
+buses outside the voltage limits and the lines loaded above 100%, and the
+report ranks
+
+    cases   by load lost, then number of violations and overloads
+    buses   by the number of cases de-energising them or violating their limits
+    lines   by the highest loading any case puts on them
+
+usage: python contingency.py [--buses 5000] [--workers 4] [--batch 64] [--top 10] [--output report.json]
+"""
+
+import os
+import json
+import time
+import argparse
+import multiprocessing
+from typing import NamedTuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import radial_sweep
+import grid_metrics
+
+# cases solved together in one sweep
+DEFAULT_BATCH = 64
+# lines above this loading (%) are overloaded
+OVERLOAD_LIMIT = grid_metrics.LOADING_LIMITS[1]
+
+
+class CaseResult(NamedTuple):
+    outage: int                 # branch index in the topology, -1 for the base case
+    de_energised: np.ndarray    # bus indices
+    lost_load: float            # MW
+    violations: np.ndarray      # indices of the energised buses outside the voltage limits
+    violation_v: np.ndarray     # their |V| in p.u.
+    overloads: np.ndarray       # branch indices of the lines above OVERLOAD_LIMIT
+    overload_loading: np.ndarray    # their loading in %
+    converged: bool
+
+
+def get_de_energised(topology: radial_sweep.RadialTopology, outages) -> np.ndarray:
+    # buses cut off by every outage, shape (buses, cases)
+    outages = np.asarray(outages)
+    mask = np.zeros((len(topology.parent) + 1, len(outages)), dtype=bool)
+    mask[topology.child[outages], np.arange(len(outages))] = True
+    # levels run from the slack outwards, so a parent is always done before its children
+    for level in topology.levels:
+        mask[topology.child[level]] |= mask[topology.parent[level]]
+    return mask
+
+
+def solve_base(topology: radial_sweep.RadialTopology, s_load, tol=1e-8):
+    # bus voltages and branch currents without any outage
+    v, i_branch, iterations = radial_sweep.sweep(topology, np.asarray(s_load, dtype=complex), tol=tol)
+    return v, i_branch
+
+
+def solve_cases(topology: radial_sweep.RadialTopology, s_load, outages, is_line, base=None, tol=1e-8) -> list:
+    # s_load: complex power drawn at every bus (MW + j MVAr) in the base case
+    # outages: branch indices, -1 for the base case; is_line: True for the branches that are lines
+    # base: solve_base() of s_load, solved here if not given
+    s_load = np.asarray(s_load, dtype=complex)
+    outages = np.asarray(outages)
+    v_base, i_base = base if base is not None else solve_base(topology, s_load, tol)
+    de_energised = get_de_energised(topology, np.where(outages < 0, 0, outages))
+    de_energised[:, outages < 0] = False
+    s_cases = np.where(de_energised, 0, s_load[:, None])
+
+    # an outage cutting off no load leaves the base solution unchanged, the others start from it
+    v = np.repeat(v_base[:, None], len(outages), axis=1)
+    i_branch = np.repeat(i_base[:, None], len(outages), axis=1)
+    changed = (s_cases != s_load[:, None]).any(axis=0)
+    converged = np.ones(len(outages), dtype=bool)
+    if changed.any():
+        # a diverging case overflows in its own column only
+        with np.errstate(all='ignore'):
+            v[:, changed], i_branch[:, changed], iterations, converged[changed] = radial_sweep.sweep_cases(
+                topology, s_cases[:, changed], tol=tol, v0=v[:, changed])
+        v[:, ~converged] = np.nan
+        i_branch[:, ~converged] = np.nan
+    v_mag = np.where(de_energised, 0.0, np.abs(v))
+    s0, s1 = radial_sweep.get_branch_flows(topology, v, i_branch)
+    loading = np.abs(s0)/grid_metrics.S_NOM_ASSUMED*100
+    loading[~is_line] = 0.0
+
+    lower, upper = grid_metrics.VOLTAGE_LIMITS
+    lost_load = np.where(de_energised, np.asarray(s_load).real[:, None], 0.0).sum(axis=0)
+    results = []
+    for case, outage in enumerate(outages):
+        case_v = v_mag[:, case]
+        violations = np.flatnonzero(~de_energised[:, case] & ((case_v < lower) | (case_v > upper)))
+        overloads = np.flatnonzero(loading[:, case] > OVERLOAD_LIMIT)
+        results.append(CaseResult(outage=int(outage),
+                                  de_energised=np.flatnonzero(de_energised[:, case]),
+                                  lost_load=float(lost_load[case]),
+                                  violations=violations,
+                                  violation_v=case_v[violations],
+                                  overloads=overloads,
+                                  overload_loading=loading[overloads, case],
+                                  converged=bool(converged[case])))
+    return results
+
+
+# the topology of the worker processes, set once by init_worker
+_worker = {}
+
+
+def init_worker(topology, is_line):
+    _worker["topology"] = topology
+    _worker["is_line"] = is_line
+
+
+def solve_batch(s_load, outages, base) -> list:
+    return solve_cases(_worker["topology"], s_load, outages, _worker["is_line"], base)
+
+
+class ContingencyReport(NamedTuple):
+    base: CaseResult
+    cases: list                 # CaseResult of every outage, most severe first
+    buses: list                 # (bus index, cases de-energising it, cases violating its limits, lowest |V|)
+    lines: list                 # (branch index, highest loading, outage causing it)
+    seconds: float
+
+
+def rank_cases(cases) -> list:
+    return sorted(cases, key=lambda case: (-case.lost_load, -(len(case.violations) + len(case.overloads)),
+                                           -(case.overload_loading.max() if len(case.overloads) else 0.0)))
+
+
+def get_report(topology: radial_sweep.RadialTopology, base: CaseResult, cases, seconds: float) -> ContingencyReport:
+    n_buses = len(topology.parent) + 1
+    de_energised_count = np.zeros(n_buses, dtype=int)
+    violation_count = np.zeros(n_buses, dtype=int)
+    lowest_v = np.full(n_buses, np.inf)
+    highest_loading = np.zeros(len(topology.parent))
+    worst_outage = np.full(len(topology.parent), -1)
+    for case in cases:
+        de_energised_count[case.de_energised] += 1
+        violation_count[case.violations] += 1
+        np.minimum.at(lowest_v, case.violations, case.violation_v)
+        higher = case.overload_loading > highest_loading[case.overloads]
+        highest_loading[case.overloads[higher]] = case.overload_loading[higher]
+        worst_outage[case.overloads[higher]] = case.outage
+
+    bus_order = np.lexsort((-violation_count, -de_energised_count))
+    buses = [(int(bus), int(de_energised_count[bus]), int(violation_count[bus]),
+              float(lowest_v[bus]) if np.isfinite(lowest_v[bus]) else None)
+             for bus in bus_order if de_energised_count[bus] or violation_count[bus]]
+    line_order = np.argsort(-highest_loading, kind='stable')
+    lines = [(int(branch), float(highest_loading[branch]), int(worst_outage[branch]))
+             for branch in line_order if highest_loading[branch] > 0]
+    return ContingencyReport(base, rank_cases(cases), buses, lines, seconds)
+
+
+class ContingencyAnalysis:
+    # runs every single branch outage of a radial topology on a process pool
+    def __init__(self, topology: radial_sweep.RadialTopology, workers=None, batch_size=DEFAULT_BATCH):
+        self.topology = topology
+        self.batch_size = batch_size
+        self.is_line = topology.branch_component == "Line"
+        self.workers = workers or os.cpu_count() or 1
+        # forked workers inherit the topology instead of receiving it pickled
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        self.executor = ProcessPoolExecutor(self.workers, mp_context=context,
+                                            initializer=init_worker, initargs=(topology, self.is_line))
+
+    def start(self):
+        # starts the workers now, e.g. before the live loop starts its threads
+        for future in [self.executor.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+    def run(self, s_load) -> ContingencyReport:
+        # s_load: complex power drawn at every bus (MW + j MVAr) of the current solved state
+        start = time.perf_counter()
+        s_load = np.asarray(s_load, dtype=complex)
+        outages = np.arange(len(self.topology.parent))
+        batches = [outages[i:i + self.batch_size] for i in range(0, len(outages), self.batch_size)]
+        base_solution = solve_base(self.topology, s_load)
+        futures = [self.executor.submit(solve_batch, s_load, batch, base_solution) for batch in batches]
+        base = solve_cases(self.topology, s_load, [-1], self.is_line, base_solution)[0]
+        cases = [case for future in futures for case in future.result()]
+        return get_report(self.topology, base, cases, time.perf_counter() - start)
+
+    def close(self):
+        self.executor.shutdown()
+
+
+def get_report_dict(report: ContingencyReport, topology: radial_sweep.RadialTopology, bus_names=None, top=20) -> dict:
+    # the top entries of every ranking with element names, e.g. to publish as JSON
+    if bus_names is None:
+        bus_names = topology.bus_names
+    branch_names = topology.branch_names
+
+    def case_dict(case: CaseResult) -> dict:
+        worst_v = case.violation_v.min() if len(case.violations) else None
+        return {"outage": branch_names[case.outage] if case.outage >= 0 else None,
+                "de_energised_buses": len(case.de_energised),
+                "lost_load_kw": round(case.lost_load*1000, 3),
+                "voltage_violations": len(case.violations),
+                "lowest_v": round(float(worst_v), 4) if worst_v is not None else None,
+                "overloads": [[branch_names[branch], round(float(loading), 2)]
+                              for branch, loading in zip(case.overloads, case.overload_loading)],
+                "converged": case.converged}
+
+    return {"seconds": round(report.seconds, 3),
+            "cases": len(report.cases),
+            "base": case_dict(report.base),
+            "worst_cases": [case_dict(case) for case in report.cases[:top]],
+            "buses": [{"bus": str(bus_names[bus]), "de_energised_in": de_energised, "violated_in": violated,
+                       "lowest_v": round(lowest_v, 4) if lowest_v is not None else None}
+                      for bus, de_energised, violated, lowest_v in report.buses[:top]],
+            "lines": [{"line": branch_names[branch], "highest_loading": round(loading, 2),
+                       "outage": branch_names[outage]}
+                      for branch, loading, outage in report.lines[:top]]}
+
+
+def print_report(report_dict: dict):
+    print(f"{report_dict['cases']} outages in {report_dict['seconds']:.2f} s")
+    print("worst outages:")
+    for case in report_dict["worst_cases"]:
+        print(f"  {case['outage']:>12}  {case['de_energised_buses']:>6} buses off  {case['lost_load_kw']:>10.1f} kW lost"
+              f"  {case['voltage_violations']:>5} voltage violations  {len(case['overloads']):>4} overloads")
+    print("buses:")
+    for bus in report_dict["buses"]:
+        print(f"  {bus['bus']:>30}  off in {bus['de_energised_in']:>5} cases  outside limits in {bus['violated_in']:>5}")
+    print("lines:")
+    for line in report_dict["lines"]:
+        print(f"  {line['line']:>12}  {line['highest_loading']:>8.1f}% after outage of {line['outage']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="N-1 contingency analysis of the KU grid or a synthetic feeder")
+    parser.add_argument("--buses", type=int, help="analyse a synthetic feeder of this size instead of the KU grid")
+    parser.add_argument("--workers", type=int, help="worker processes (default one per CPU)")
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH, help="outages solved together")
+    parser.add_argument("--top", type=int, default=10, help="entries of every ranking")
+    parser.add_argument("--output", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    if args.buses:
+        import feeder_generator
+        feeder = feeder_generator.create_feeder(args.buses)
+        network = feeder.network
+        bus_names = None
+    else:
+        import ku_grid_model
+        import buses_and_lines
+        network = ku_grid_model.create_network()
+        bus_names = [buses_and_lines.get_bus_names(bus_name) for bus_name in network.buses.index]
+    topology = radial_sweep.build_topology(network)
+    # the loads of the model stand in for the current solved state
+    s_load = radial_sweep.get_bus_loads(network, topology)[:, 0]
+
+    analysis = ContingencyAnalysis(topology, args.workers, args.batch)
+    try:
+        report = analysis.run(s_load)
+    finally:
+        analysis.close()
+    report_dict = get_report_dict(report, topology, bus_names, args.top)
+    print_report(report_dict)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report_dict, f, indent=2)
@@ -0,0 +1,86 @@
+"""
+Tables of the most critical buses and lines of a cycle.
+
+Every criterion ranks the buses or the lines by a score computed from the
+metric arrays, the largest scores being the most critical:
+
+    voltage_deviation   buses furthest from 1 p.u.
+    lowest_voltage      buses with the lowest |V|
+    highest_voltage     buses with the highest |V|
+    loading             most heavily loaded lines
+    loss                lines with the highest losses
+
+Only the top k are selected, with np.argpartition, and only those k are
+sorted, so asking for the top 20 of a feeder with tens of thousands of
+elements costs one linear pass per criterion.
+"""
+
+from typing import Callable, NamedTuple
+import numpy as np
+
+
+class Criterion(NamedTuple):
+    element: str                # "bus" or "line"
+    title: str
+    value_title: str
+    score: Callable             # metrics -> array, the largest are the most critical
+    value: Callable             # metrics -> array of the values shown in the table
+
+
+class CriticalTable(NamedTuple):
+    title: str
+    element_title: str
+    value_title: str
+    rows: list                  # (name, value), most critical first
+
+
+CRITERIA = {
+    "voltage_deviation": Criterion("bus", "Critical Buses", "|V| pu",
+                                   lambda m: m.v_mag_diff, lambda m: m.v_mag_pu),
+    "lowest_voltage": Criterion("bus", "Lowest Voltages", "|V| pu",
+                                lambda m: -m.v_mag_pu, lambda m: m.v_mag_pu),
+    "highest_voltage": Criterion("bus", "Highest Voltages", "|V| pu",
+                                 lambda m: m.v_mag_pu, lambda m: m.v_mag_pu),
+    "loading": Criterion("line", "Critical Lines", "% Loading",
+                         lambda m: m.loading, lambda m: m.loading),
+    "loss": Criterion("line", "Line Losses", "Loss kW",
+                      lambda m: m.loss, lambda m: m.loss/1000),
+}
+DEFAULT_CRITERIA = ("voltage_deviation", "loading")
+DEFAULT_K = 3
+
+
+def get_top_k(scores, k: int) -> np.ndarray:
+    # indices of the k largest scores, largest first (NaN counts as the smallest)
+    scores = np.nan_to_num(np.asarray(scores, dtype=float), nan=-np.inf)
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=int)
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def get_critical_table(criterion: Criterion, metrics, names, k: int) -> CriticalTable:
+    top = get_top_k(criterion.score(metrics), k)
+    values = criterion.value(metrics)[top]
+    element_title = "Bus" if criterion.element == "bus" else "Line"
+    return CriticalTable(criterion.title, element_title, criterion.value_title,
+                         [(str(names[i]), float(value)) for i, value in zip(top, values)])
+
+
+def get_critical_tables(bus_metrics, line_metrics, bus_names=None, criteria=DEFAULT_CRITERIA,
+                        k=DEFAULT_K) -> list:
+    # bus_names: names shown for the buses, in the order of bus_metrics (default the bus ids)
+    if bus_names is None:
+        bus_names = bus_metrics.names
+    tables = []
+    for name in criteria:
+        criterion = CRITERIA[name]
+        if criterion.element == "bus":
+            tables.append(get_critical_table(criterion, bus_metrics, bus_names, k))
+        else:
+            tables.append(get_critical_table(criterion, line_metrics, line_metrics.names, k))
+    return tables
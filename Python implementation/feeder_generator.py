@@ -0,0 +1,140 @@
+"""
+Synthetic radial feeders for scale testing.
+
+create_feeder() builds a feeder with the same structure as ku_grid_model: a
+slack bus HVB, a transformer to LVB1 and a tree of lines LineX_Y down to the
+buses LVB2 ... LVBn, with loads LoadX on some of them. Buses get coordinates
+around a geographic centre, so the feeder can be drawn by live_map like the
+KU grid.
+
+    branching_factor    mean number of lines leaving a bus
+    mean_length         mean line length in km (lognormal, spread length_sigma)
+    load_density        share of the buses with a load
+    load_per_load       mean load in MW, so the total grows with the feeder
+    total_load          sum of all loads in MW instead, split with a lognormal spread
+
+The name mapping and line resistance tables come with the network (Feeder.bus_names,
+Feeder.line_resistances) and are handed to the metric and rendering code in
+place of the KU tables of buses_and_lines, which stay untouched.
+
+usage: python feeder_generator.py 10000 [--branching 3] [--seed 0] [--export DIRECTORY]
+"""
+
+import argparse
+from typing import NamedTuple
+import numpy as np
+import pypsa
+import load_allocation
+
+# same conductor as the KU model (ohm/km)
+R_PER_KM = 0.082
+X_PER_KM = 0.07
+# km per degree of latitude
+KM_PER_DEGREE = 111.32
+# mean load (MW) of every load, after diversity: a feeder of 10000 buses drops to about 0.975 p.u.,
+# one of 50000 buses to about 0.87 p.u.
+LOAD_PER_LOAD = 0.0002
+
+
+class Feeder(NamedTuple):
+    network: pypsa.Network
+    bus_names: dict             # bus -> name shown on the map, like buses_and_lines.buses_dict
+    line_resistances: dict      # line -> resistance in ohm, like buses_and_lines.line_resistance_dict
+
+
+def get_parents(n_lv_buses: int, branching_factor: float, rng) -> np.ndarray:
+    # parent of every low voltage bus, -1 for LVB1
+    # buses are connected breadth first, every bus getting 1 + Poisson(branching_factor - 1)
+    # children, so the depth of the tree only grows with the logarithm of its size
+    children = 1 + rng.poisson(max(branching_factor - 1.0, 0.0), n_lv_buses)
+    parents = np.repeat(np.arange(n_lv_buses), children)[:n_lv_buses - 1]
+    return np.concatenate([[-1], parents])
+
+
+def get_coordinates(parents, lengths, centre, rng):
+    # every line leaves its parent bus roughly in the direction the parent was reached from,
+    # the lines leaving LVB1 are spread all around the centre
+    n = len(parents)
+    heading = np.empty(n)
+    heading[0] = 0.0
+    turn = rng.uniform(-np.pi/3, np.pi/3, n)
+    root_children = np.flatnonzero(parents == 0)
+    turn[root_children] = 2*np.pi*np.arange(len(root_children))/max(len(root_children), 1)
+    # parents always come before their children, so one pass fills in all headings
+    for i in range(1, n):
+        heading[i] = heading[parents[i]] + turn[i]
+
+    north = np.zeros(n)
+    east = np.zeros(n)
+    for i in range(1, n):
+        north[i] = north[parents[i]] + lengths[i]*np.cos(heading[i])
+        east[i] = east[parents[i]] + lengths[i]*np.sin(heading[i])
+    y = centre[0] + north/KM_PER_DEGREE
+    x = centre[1] + east/(KM_PER_DEGREE*np.cos(np.radians(centre[0])))
+    return x, y
+
+
+def create_feeder(n_buses: int, branching_factor=3.0, mean_length=0.04, length_sigma=0.5,
+                  load_density=0.6, load_per_load=LOAD_PER_LOAD, total_load=None,
+                  centre=(27.619013147338894, 85.5387356168638), seed=0) -> Feeder:
+    # n_buses counts HVB and the low voltage buses, like the 52 buses of the KU model
+    # total_load: sum of all loads in MW, load_per_load times the number of loads if None
+    rng = np.random.default_rng(seed)
+    n_lv_buses = n_buses - 1
+    parents = get_parents(n_lv_buses, branching_factor, rng)
+    # lognormal lengths with the given mean
+    lengths = mean_length*rng.lognormal(-length_sigma**2/2, length_sigma, n_lv_buses)
+    lengths[0] = 0.0
+    x, y = get_coordinates(parents, lengths, centre, rng)
+
+    network = pypsa.Network()
+    lv_buses = np.array([f"LVB{i}" for i in range(1, n_buses)])
+    network.add("Bus", "HVB", v_nom=11.0, y=y[0], x=x[0] - 0.0007)
+    network.add("Bus", lv_buses, v_nom=0.4, y=y, x=x)
+    network.add("Generator", "External network", bus="HVB", control="Slack")
+    network.add("Transformer", "Transformer", bus0="HVB", bus1="LVB1", model="t", x=0.5, r=0.5,
+                s_nom=250000000*1.25)
+
+    # line LineX_Y connects LVBX to LVBY
+    child = np.arange(1, n_lv_buses)
+    line_names = np.array([f"Line{parents[i] + 1}_{i + 1}" for i in child])
+    line_lengths = lengths[1:]
+    network.add("Line", line_names, bus0=lv_buses[parents[1:]], bus1=lv_buses[1:],
+                length=line_lengths, r=R_PER_KM*line_lengths, x=X_PER_KM*line_lengths)
+
+    # loads on a random share of the buses (never on LVB1), lognormal sizes adding up to total_load
+    load_buses = np.flatnonzero(rng.random(n_lv_buses) < load_density)
+    load_buses = load_buses[load_buses > 0]
+    p_set = rng.lognormal(0.0, 0.5, len(load_buses))
+    if total_load is None:
+        total_load = load_per_load*len(load_buses)
+    p_set *= total_load/p_set.sum()
+    network.add("Load", [f"Load{i + 1}" for i in load_buses], bus=lv_buses[load_buses],
+                p_set=p_set, q_set=p_set*load_allocation.tan_phi)
+
+    bus_names = {name: name for name in lv_buses}
+    bus_names["HVB"] = "Transformer Primary(HVB)"
+    bus_names["LVB1"] = "Transformer Secondary(LVB1)"
+    line_resistances = dict(zip(line_names, R_PER_KM*line_lengths))
+    return Feeder(network, bus_names, line_resistances)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic radial feeder")
+    parser.add_argument("buses", type=int)
+    parser.add_argument("--branching", type=float, default=3.0, help="mean number of lines leaving a bus")
+    parser.add_argument("--mean-length", type=float, default=0.04, help="mean line length in km")
+    parser.add_argument("--load-density", type=float, default=0.6, help="share of the buses with a load")
+    parser.add_argument("--load-per-load", type=float, default=LOAD_PER_LOAD, help="mean load in MW")
+    parser.add_argument("--total-load", type=float, help="sum of all loads in MW instead")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--export", metavar="DIRECTORY", help="write the network as PyPSA csv files")
+    args = parser.parse_args()
+
+    feeder = create_feeder(args.buses, args.branching, args.mean_length, load_density=args.load_density,
+                           load_per_load=args.load_per_load, total_load=args.total_load, seed=args.seed)
+    network = feeder.network
+    print(f"{len(network.buses)} buses, {len(network.lines)} lines, {len(network.loads)} loads, "
+          f"{network.lines.length.sum():.1f} km of line, {network.loads.p_set.sum()*1000:.1f} kW of load")
+    if args.export:
+        network.export_to_csv_folder(args.export)
@@ -0,0 +1,170 @@
+"""
+Compiled grid cache for a fast start of the live loop.
+
+Importing PyPSA and folium and building the network takes seconds, while the
+live loop only needs a handful of arrays: the load order, the radial topology,
+the line resistances, the nominal bus voltages, the arrowheads, the map geometry
+and the static map page. compile_grid() derives all of them once, and
+load_compiled_grid() keeps the result in a pickle file keyed by a hash of the
+model tables, the source files that shape it and the versions of the libraries
+that draw the map, so a restart with an unchanged model reads one file and needs
+NumPy only. Writing a new cache file deletes the ones of the same model and page
+that it supersedes.
+
+The PyPSA network itself is stored pickled inside the cache and only unpickled
+(importing PyPSA) when get_network() is called, e.g. on a background thread.
+Until then solve_sweep() solves the cached topology with the radial sweep.
+"""
+
+import os
+import re
+import sys
+import pickle
+import hashlib
+from typing import NamedTuple
+import numpy as np
+import arrow_geometry
+import grid_metrics
+import radial_sweep
+import grid_geojson
+import model_loader
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(SOURCE_DIR, "cache")
+# code that changes what compile_grid() produces
+SOURCE_FILES = ["model_loader.py", "ku_grid_model.py", "buses_and_lines.py", "radial_sweep.py",
+                "arrow_geometry.py", "live_map.py", "html_contents.py", "grid_geojson.py", "live_server.py",
+                "grid_metrics.py", "grid_cache.py"]
+# cache files named before they were kept per model and page
+OLD_CACHE_FILE = re.compile(r"grid_[0-9a-f]{16}\.pickle$")
+
+
+class CompiledGrid(NamedTuple):
+    key: str
+    bus_names: np.ndarray           # in the order of network.buses
+    bus_display_names: np.ndarray
+    bus_v_nom: np.ndarray           # nominal voltage of every bus in kV
+    line_names: np.ndarray          # in the order of network.lines
+    line_resistances: np.ndarray
+    load_names: np.ndarray          # in the order of network.loads
+    load_buses: np.ndarray          # bus index of every load
+    p_set: np.ndarray
+    q_set: np.ndarray
+    topology: radial_sweep.RadialTopology
+    line_branches: np.ndarray       # branch of the topology of every line
+    arrowheads: arrow_geometry.ArrowheadCache
+    geometry: grid_geojson.GridGeometry
+    static_map: str                 # html of the map page of RENDER_MODE = "state" or "geojson"
+    network: bytes                  # pickled PyPSA network
+
+
+def get_cache_key(model_dir: str, state_file: str, render_mode: str) -> str:
+    from importlib import metadata
+    digest = hashlib.sha256()
+    files = model_loader.get_model_files(model_dir) + [os.path.join(SOURCE_DIR, f) for f in SOURCE_FILES]
+    for path in files:
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    # a pickled network is only valid for the versions that wrote it, the static map for the folium that drew it
+    versions = " ".join(metadata.version(package) for package in ("pypsa", "folium", "branca"))
+    digest.update(f"{state_file} {render_mode} {sys.version} {versions} {np.__version__}".encode())
+    return digest.hexdigest()
+
+
+def compile_grid(model_dir: str, state_file: str, render_mode: str, key: str) -> CompiledGrid:
+    # the slow path: read the model, build the network and draw the static map
+    # state_file is the per-cycle file the page of render_mode loads
+    import live_map
+    model = model_loader.read_model(model_dir)
+    network = model_loader.create_network(model)
+    bus_display_names = model_loader.get_bus_names(model)
+    line_resistances = model_loader.get_line_resistances(model)
+
+    topology = radial_sweep.build_topology(network)
+    branch_index = {name: i for i, name in enumerate(topology.branch_names)
+                    if topology.branch_component[i] == "Line"}
+    arrowheads = arrow_geometry.build_arrowhead_cache(network)
+    if render_mode == "geojson":
+        static_map = live_map.create_geojson_map(network, state_file).get_root().render()
+    else:
+        static_map = live_map.create_static_map(network, arrowheads, state_file).get_root().render()
+    bus_display_names = np.array([bus_display_names[bus_name] for bus_name in network.buses.index])
+
+    return CompiledGrid(key=key,
+                        bus_names=network.buses.index.to_numpy(),
+                        bus_display_names=bus_display_names,
+                        bus_v_nom=network.buses.v_nom.to_numpy(dtype=float),
+                        line_names=network.lines.index.to_numpy(),
+                        line_resistances=np.array([line_resistances[line_name] for line_name in network.lines.index]),
+                        load_names=network.loads.index.to_numpy(),
+                        load_buses=network.buses.index.get_indexer(network.loads.bus),
+                        p_set=network.loads.p_set.to_numpy(),
+                        q_set=network.loads.q_set.to_numpy(),
+                        # plain arrays, so that unpickling the topology does not import pandas
+                        topology=topology._replace(bus_names=topology.bus_names.to_numpy()),
+                        line_branches=np.array([branch_index[name] for name in network.lines.index]),
+                        arrowheads=arrowheads,
+                        geometry=grid_geojson.get_grid_geometry(network, bus_display_names),
+                        static_map=static_map,
+                        network=pickle.dumps(network))
+
+
+def load_compiled_grid(model_dir=model_loader.KU_MODEL_DIR, state_file="ku_grid_state.js", render_mode="state",
+                       cache_dir=CACHE_DIR):
+    # returns the compiled grid and True if it came from the cache
+    key = get_cache_key(model_dir, state_file, render_mode)
+    # one cache file per model and page, a new key supersedes the file of the old one
+    variant = hashlib.sha256(f"{os.path.abspath(model_dir)} {state_file} {render_mode}".encode()).hexdigest()[:8]
+    prefix = f"grid_{variant}_"
+    path = os.path.join(cache_dir, f"{prefix}{key[:16]}.pickle")
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            grid = pickle.load(f)
+        if grid.key == key:
+            return grid, True
+
+    grid = compile_grid(model_dir, state_file, render_mode, key)
+    os.makedirs(cache_dir, exist_ok=True)
+    # write to a temporary file first so a crash never leaves a half written cache behind
+    with open(path + ".tmp", 'wb') as f:
+        pickle.dump(grid, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+    for name in os.listdir(cache_dir):
+        if name != os.path.basename(path) and (name.startswith(prefix) or OLD_CACHE_FILE.match(name)):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                # e.g. still open in another process on Windows, removed by a later write
+                pass
+    return grid, False
+
+
+def get_network(grid: CompiledGrid):
+    # unpickling imports PyPSA
+    return pickle.loads(grid.network)
+
+
+def get_bus_loads(grid: CompiledGrid, p_set, q_set) -> np.ndarray:
+    # complex power drawn at every bus (MW + j MVAr), in the order of grid.bus_names
+    s_load = np.zeros(len(grid.bus_names), dtype=complex)
+    np.add.at(s_load, grid.load_buses, np.asarray(p_set) + 1j*np.asarray(q_set))
+    return s_load
+
+
+def solve_sweep(grid: CompiledGrid, p_set, q_set, v0=None):
+    # power flow of the cached topology without PyPSA
+    # returns the bus and line metrics and the complex bus voltages (to seed the next call)
+    s_load = get_bus_loads(grid, p_set, q_set)
+    v, i_branch, iterations = radial_sweep.sweep(grid.topology, s_load, v0=v0)
+    bus_metrics, line_metrics = get_radial_metrics(grid, v, i_branch)
+    return bus_metrics, line_metrics, v
+
+
+def get_radial_metrics(grid: CompiledGrid, v, i_branch):
+    # bus and line metrics of complex bus voltages and branch currents of the cached topology
+    s0, s1 = radial_sweep.get_branch_flows(grid.topology, v, i_branch)
+    s_line = s0[grid.line_branches]
+    bus_metrics = grid_metrics.get_bus_metrics(grid.bus_names, np.abs(v), np.angle(v))
+    line_metrics = grid_metrics.get_line_metrics(grid.line_names, s_line.real, s_line.imag, grid.line_resistances)
+    return bus_metrics, line_metrics
@@ -0,0 +1,88 @@
+"""
+The grid of one cycle as a single GeoJSON FeatureCollection.
+
+Every bus is a Point and every line a LineString, carrying only numbers:
+
+    bus     name, v_mag_pu, v_ang_deg
+    line    name, p (kW), q (kVAr), loading (%), direction (1 from bus0 to bus1,
+            -1 from bus1 to bus0, 0 no flow)
+
+Colours, widths, arrowheads, animation and popups are derived from these in
+the browser (live_map.GeoJsonUpdater), so the size of the output grows by a
+few dozen bytes per element instead of a folium object with inline styles and
+popup html per element. The time, the critical element tables of the cycle and
+the url of the short-circuit currents are carried as foreign members of the
+collection.
+"""
+
+import json
+from typing import NamedTuple
+import numpy as np
+
+# decimals of the coordinates (about 1 cm) and the values
+COORDINATE_DECIMALS = 7
+VALUE_DECIMALS = 4
+
+
+class GridGeometry(NamedTuple):
+    bus_names: np.ndarray       # names shown on the map, in the order of network.buses
+    bus_locations: np.ndarray   # (buses, 2) longitude, latitude
+    line_names: np.ndarray      # in the order of network.lines
+    line_locations: np.ndarray  # (lines, 2, 2) longitude, latitude of bus0 and bus1
+
+
+def get_grid_geometry(network, bus_names=None) -> GridGeometry:
+    # bus_names: names shown on the map, in the order of network.buses (default the bus ids)
+    if bus_names is None:
+        bus_names = network.buses.index.to_numpy()
+    bus0 = network.buses.loc[network.lines.bus0, ['x', 'y']].to_numpy(dtype=float)
+    bus1 = network.buses.loc[network.lines.bus1, ['x', 'y']].to_numpy(dtype=float)
+    return GridGeometry(bus_names=np.asarray(bus_names),
+                        bus_locations=network.buses[['x', 'y']].to_numpy(dtype=float),
+                        line_names=network.lines.index.to_numpy(),
+                        line_locations=np.stack([bus0, bus1], axis=1))
+
+
+def get_feature_collection(geometry: GridGeometry, timestamp, bus_metrics, line_metrics, critical_tables=(),
+                           short_circuit=None) -> dict:
+    # short_circuit: url of the short-circuit script, as grid_state.get_grid_state
+    bus_locations = geometry.bus_locations.round(COORDINATE_DECIMALS).tolist()
+    v_mag_pu = bus_metrics.v_mag_pu.round(VALUE_DECIMALS).tolist()
+    v_ang_deg = bus_metrics.v_ang_deg.round(VALUE_DECIMALS).tolist()
+    features = [{"type": "Feature",
+                 "geometry": {"type": "Point", "coordinates": location},
+                 "properties": {"element": "bus", "name": str(name), "v_mag_pu": v, "v_ang_deg": angle}}
+                for name, location, v, angle in zip(geometry.bus_names, bus_locations, v_mag_pu, v_ang_deg)]
+
+    line_locations = geometry.line_locations.round(COORDINATE_DECIMALS).tolist()
+    p = (line_metrics.p*1000).round(VALUE_DECIMALS).tolist()
+    q = (line_metrics.q*1000).round(VALUE_DECIMALS).tolist()
+    loading = line_metrics.loading.round(VALUE_DECIMALS).tolist()
+    direction = np.where(line_metrics.active, np.where(line_metrics.forward, 1, -1), 0).tolist()
+    features += [{"type": "Feature",
+                  "geometry": {"type": "LineString", "coordinates": locations},
+                  "properties": {"element": "line", "name": str(name), "p": line_p, "q": line_q,
+                                 "loading": line_loading, "direction": line_direction}}
+                 for name, locations, line_p, line_q, line_loading, line_direction
+                 in zip(geometry.line_names, line_locations, p, q, loading, direction)]
+
+    collection = {"type": "FeatureCollection",
+                  "time": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+                  "critical_tables": [{"title": table.title, "columns": [table.element_title, table.value_title],
+                                       "rows": [[name, round(value, 4)] for name, value in table.rows]}
+                                      for table in critical_tables],
+                  "features": features}
+    if short_circuit:
+        collection["short_circuit"] = short_circuit
+    return collection
+
+
+def get_feature_script(collection: dict) -> str:
+    # wrapped in a call like the grid state, so the page also works when opened from disk
+    return f"disvizApplyFeatures({json.dumps(collection, separators=(',', ':'))});"
+
+
+def save_feature_collection(path: str, collection: dict):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(get_feature_script(collection))
+
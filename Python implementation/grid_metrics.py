@@ -0,0 +1,128 @@
+import math
+from typing import NamedTuple
+import numpy as np
+
+#assumed nominal capacity of the line (sqrt(3)*400*300/1000000 MVA)
+S_NOM_ASSUMED = 0.207846
+
+# line colour classes, used as indices into LINE_COLORS
+NO_FLOW = 0
+LIGHT = 1       # loading <= 50%
+MEDIUM = 2      # 50% < loading <= 100%
+HEAVY = 3       # 100% < loading <= 150%
+FAULT = 4       # loading > 150%
+LINE_COLORS = np.array(['black', 'green', 'orange', 'red', 'red'])
+# upper loading limits (%) of LIGHT, MEDIUM and HEAVY
+LOADING_LIMITS = (50, 100, 150)
+
+# bus colour classes, used as indices into BUS_COLORS
+UNDER_VOLTAGE = 0   # |V| < 0.95
+NORMAL_VOLTAGE = 1  # 0.95 <= |V| <= 1.05
+OVER_VOLTAGE = 2    # |V| > 1.05
+BUS_COLORS = np.array(['red', 'green', 'yellow'])
+# lower and upper |V| limits (p.u.) of NORMAL_VOLTAGE
+VOLTAGE_LIMITS = (0.95, 1.05)
+
+
+class BusMetrics(NamedTuple):
+    # one entry per bus, in the order of network.buses
+    names: np.ndarray
+    v_mag_pu: np.ndarray
+    v_ang_deg: np.ndarray
+    v_mag_diff: np.ndarray      # |V - 1.0| in per unit
+    color_class: np.ndarray
+
+
+class LineMetrics(NamedTuple):
+    # one entry per line, in the order of network.lines
+    names: np.ndarray
+    p: np.ndarray               # active power at bus0 in MW
+    q: np.ndarray               # reactive power at bus0 in MVAr
+    s: np.ndarray               # apparent power in MVA
+    loading: np.ndarray         # percentage loading
+    current: np.ndarray         # per phase current in A
+    loss: np.ndarray            # total 3 phase power loss in W
+    color_class: np.ndarray
+    weight: np.ndarray
+    forward: np.ndarray         # True if power flows from bus0 to bus1
+    active: np.ndarray          # False if no power flows through the line
+    fault: np.ndarray
+
+
+def get_line_resistances(network, line_resistances=None) -> np.ndarray:
+    # line resistances in the order of network.lines, looked up once at startup
+    # line_resistances: line -> resistance in ohm, e.g. Feeder.line_resistances, the KU tables if None
+    if line_resistances is None:
+        import buses_and_lines
+        line_resistances = buses_and_lines.line_resistance_dict
+    return np.array([line_resistances[line_name] for line_name in network.lines.index])
+
+
+def compute_bus_metrics(network, snapshot=0) -> BusMetrics:
+    v_mag_pu = network.buses_t.v_mag_pu.iloc[snapshot].reindex(network.buses.index).to_numpy()
+    v_ang_rad = network.buses_t.v_ang.iloc[snapshot].reindex(network.buses.index).to_numpy()
+    return get_bus_metrics(network.buses.index.to_numpy(), v_mag_pu, v_ang_rad)
+
+
+def get_bus_metrics(names, v_mag_pu, v_ang_rad) -> BusMetrics:
+    # set bus color based on voltage magnitude
+    color_class = np.full(v_mag_pu.shape, NORMAL_VOLTAGE)
+    color_class[v_mag_pu < VOLTAGE_LIMITS[0]] = UNDER_VOLTAGE
+    color_class[v_mag_pu > VOLTAGE_LIMITS[1]] = OVER_VOLTAGE
+
+    return BusMetrics(names=names,
+                      v_mag_pu=v_mag_pu,
+                      v_ang_deg=np.degrees(v_ang_rad),
+                      v_mag_diff=np.abs(v_mag_pu - 1.0),
+                      color_class=color_class)
+
+
+def compute_line_metrics(network, line_resistances: np.ndarray, snapshot=0) -> LineMetrics:
+    p = network.lines_t.p0.iloc[snapshot].reindex(network.lines.index).to_numpy()
+    q = network.lines_t.q0.iloc[snapshot].reindex(network.lines.index).to_numpy()
+    return get_line_metrics(network.lines.index.to_numpy(), p, q, line_resistances)
+
+
+def get_line_metrics(names, p, q, line_resistances) -> LineMetrics:
+    # calculate the line percentage loading
+    s = np.hypot(p, q)      #actual apparent power
+    loading = (s/S_NOM_ASSUMED)*100
+    line_I = (s*10e6)/(math.sqrt(3)*400.0)   #line current
+    line_I = line_I/3   #per phase current
+    loss = 3*(line_I**2)*line_resistances    # total 3 phase power loss
+
+    # black if no power flows through the line, otherwise coloured by loading
+    active = (p != 0) | (q != 0)
+    loading = np.where(active, loading, 0.0)
+    color_class = np.select([~active] + [loading <= limit for limit in LOADING_LIMITS],
+                            [NO_FLOW, LIGHT, MEDIUM, HEAVY], default=FAULT)
+
+    return LineMetrics(names=names, p=p, q=q, s=s,
+                       loading=loading,
+                       current=line_I,
+                       loss=loss,
+                       color_class=color_class,
+                       # set line weight relative to percentage loading
+                       weight=2.0 + loading*4/100,
+                       forward=p > 0,
+                       active=active,
+                       fault=color_class == FAULT)
+
+
+def compute_all_bus_metrics(network) -> BusMetrics:
+    # metrics of every snapshot at once, the arrays have one row per snapshot
+    v_mag_pu = network.buses_t.v_mag_pu.reindex(columns=network.buses.index).to_numpy()
+    v_ang_rad = network.buses_t.v_ang.reindex(columns=network.buses.index).to_numpy()
+    return get_bus_metrics(network.buses.index.to_numpy(), v_mag_pu, v_ang_rad)
+
+
+def compute_all_line_metrics(network, line_resistances: np.ndarray) -> LineMetrics:
+    # metrics of every snapshot at once, the arrays have one row per snapshot
+    p = network.lines_t.p0.reindex(columns=network.lines.index).to_numpy()
+    q = network.lines_t.q0.reindex(columns=network.lines.index).to_numpy()
+    return get_line_metrics(network.lines.index.to_numpy(), p, q, line_resistances)
+
+
+def select_snapshot(metrics, snapshot: int):
+    # one row of metrics computed for several snapshots
+    return type(metrics)(*(field if field is metrics.names else field[snapshot] for field in metrics))
@@ -0,0 +1,55 @@
+import json
+import numpy as np
+import grid_metrics
+
+
+def get_grid_state(timestamp, bus_metrics, line_metrics, critical_tables, short_circuit=None):
+    # the per-minute document the static map applies, with one entry per bus and per line
+    # in the same order as network.buses and network.lines
+    # short_circuit: url of the short-circuit script, the map loads it again when it changes
+    state = {
+        "time": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+        "bus_v": bus_metrics.v_mag_pu.round(4).tolist(),
+        "bus_ang": bus_metrics.v_ang_deg.round(3).tolist(),
+        "bus_color": grid_metrics.BUS_COLORS[bus_metrics.color_class].tolist(),
+        "line_p": (line_metrics.p*1000).round(3).tolist(),
+        "line_q": (line_metrics.q*1000).round(3).tolist(),
+        "line_loading": line_metrics.loading.round(3).tolist(),
+        "line_color": grid_metrics.LINE_COLORS[line_metrics.color_class].tolist(),
+        "line_weight": line_metrics.weight.round(2).tolist(),
+        "line_dash": np.where(line_metrics.active, '', '5, 10').tolist(),
+        "line_forward": line_metrics.forward.astype(int).tolist(),
+        "line_active": line_metrics.active.astype(int).tolist(),
+        "line_fault": line_metrics.fault.astype(int).tolist(),
+        "critical_tables": [{"title": table.title, "columns": [table.element_title, table.value_title],
+                             "rows": [[name, round(value, 4)] for name, value in table.rows]}
+                            for table in critical_tables],
+    }
+    if short_circuit:
+        state["short_circuit"] = short_circuit
+    return state
+
+
+def get_state_delta(previous: dict, state: dict) -> dict:
+    # the entries of state that differ from previous, for the per-bus and per-line lists
+    # only the changed elements: {"index": [...], "value": [...]}
+    delta = {}
+    for key, value in state.items():
+        old = previous.get(key)
+        if key.startswith(("bus_", "line_")) and old is not None and len(old) == len(value):
+            changed = [i for i, (old_value, new_value) in enumerate(zip(old, value)) if old_value != new_value]
+            if changed:
+                delta[key] = {"index": changed, "value": [value[i] for i in changed]}
+        elif value != old:
+            delta[key] = value
+    return delta
+
+
+def get_state_script(state: dict) -> str:
+    # the state is wrapped in a call so the browser can load it with a script tag
+    return f"disvizApplyState({json.dumps(state, separators=(',', ':'))});"
+
+
+def save_grid_state(path: str, state: dict):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(get_state_script(state))
@@ -0,0 +1,162 @@
+"""
+Streaming statistics of every bus and line over hour, day and month windows.
+
+Every cycle of the live loop is folded into running statistics with a fixed
+amount of work per bus and line, so no history has to be scanned to answer
+"what was the lowest voltage of LVB45 today" or "when was Line1_2 loaded most
+this month":
+
+    buses    min, max and time weighted mean |V|, |V| histogram
+    lines    peak loading with its time, loading histogram, energy lost (kWh)
+    system   energy supplied (kWh), peak power with its time and the loss at
+             that moment, total loss (kWh)
+
+Percentiles are read from the histograms, so they are exact to a bin width
+(0.0025 p.u. and 2% loading). When a window ends (e.g. the first
+cycle after midnight for "day") its statistics are handed to on_close and a
+new window starts.
+"""
+
+import numpy as np
+
+# window name -> numpy datetime unit
+WINDOWS = {"hour": "h", "day": "D", "month": "M"}
+
+# histogram bin edges, values outside the range are counted in the first or last bin
+VOLTAGE_BINS = np.arange(0.80, 1.20 + 1e-9, 0.0025)
+LOADING_BINS = np.arange(0.0, 250.0 + 1e-9, 2.0)
+
+
+def get_bin(values, bins) -> np.ndarray:
+    return np.clip(np.searchsorted(bins, values, side='right') - 1, 0, len(bins) - 2)
+
+
+def get_percentiles(histogram, bins, q: float) -> np.ndarray:
+    # q-th percentile (0 to 100) of every row of a histogram, interpolated within the bin
+    cumulative = np.cumsum(histogram, axis=1)
+    total = cumulative[:, -1]
+    target = q/100*total
+    index = np.argmax(cumulative >= target[:, None], axis=1)
+    rows = np.arange(len(histogram))
+    below = np.where(index > 0, cumulative[rows, np.maximum(index - 1, 0)], 0.0)
+    in_bin = histogram[rows, index]
+    fraction = np.divide(target - below, in_bin, out=np.zeros_like(target), where=in_bin > 0)
+    percentiles = bins[index] + fraction*(bins[index + 1] - bins[index])
+    return np.where(total > 0, percentiles, np.nan)
+
+
+class WindowStatistics:
+    # running statistics of one window, e.g. the day 2024-05-01
+    def __init__(self, window: str, start, bus_names, line_names):
+        self.window = window
+        self.start = start                  # np.datetime64 in the unit of the window
+        self.bus_names = bus_names
+        self.line_names = line_names
+        self.minutes = 0.0
+        self.cycles = 0
+
+        n_buses = len(bus_names)
+        n_lines = len(line_names)
+        self.v_min = np.full(n_buses, np.inf)
+        self.v_max = np.full(n_buses, -np.inf)
+        self.v_min_time = np.full(n_buses, np.datetime64('NaT'), dtype='datetime64[s]')
+        self.v_max_time = np.full(n_buses, np.datetime64('NaT'), dtype='datetime64[s]')
+        self._v_minutes = np.zeros(n_buses)         # sum of |V| * minutes
+        self.v_histogram = np.zeros((n_buses, len(VOLTAGE_BINS) - 1), dtype=np.float32)
+
+        self.loading_peak = np.zeros(n_lines)
+        self.loading_peak_time = np.full(n_lines, np.datetime64('NaT'), dtype='datetime64[s]')
+        self.loading_histogram = np.zeros((n_lines, len(LOADING_BINS) - 1), dtype=np.float32)
+        self.loss_kwh = np.zeros(n_lines)
+
+        self.energy_kwh = 0.0
+        self.power_peak = 0.0                # W
+        self.power_peak_time = None
+        self.loss_at_power_peak = 0.0        # W
+        self.system_loss_kwh = 0.0
+
+    def update(self, timestamp, minutes: float, bus_metrics, line_metrics, system_power: float):
+        # minutes: time the results stand for, system_power: power supplied by the transformer (W)
+        time = np.datetime64(timestamp, 's')
+        hours = minutes/60
+        self.minutes += minutes
+        self.cycles += 1
+
+        v = bus_metrics.v_mag_pu
+        lower = v < self.v_min
+        self.v_min[lower] = v[lower]
+        self.v_min_time[lower] = time
+        higher = v > self.v_max
+        self.v_max[higher] = v[higher]
+        self.v_max_time[higher] = time
+        self._v_minutes += v*minutes
+        self.v_histogram[np.arange(len(v)), get_bin(v, VOLTAGE_BINS)] += minutes
+
+        loading = line_metrics.loading
+        peak = loading > self.loading_peak
+        self.loading_peak[peak] = loading[peak]
+        self.loading_peak_time[peak] = time
+        self.loading_histogram[np.arange(len(loading)), get_bin(loading, LOADING_BINS)] += minutes
+        self.loss_kwh += line_metrics.loss/1000*hours
+
+        total_loss = line_metrics.loss.sum()
+        self.energy_kwh += system_power/1000*hours
+        self.system_loss_kwh += total_loss/1000*hours
+        if self.power_peak_time is None or system_power > self.power_peak:
+            self.power_peak = system_power
+            self.power_peak_time = time
+            self.loss_at_power_peak = total_loss
+
+    @property
+    def v_mean(self) -> np.ndarray:
+        return self._v_minutes/self.minutes if self.minutes else np.full(len(self.v_min), np.nan)
+
+    @property
+    def average_power(self) -> float:
+        # kW over the time covered so far
+        return self.energy_kwh/(self.minutes/60) if self.minutes else 0.0
+
+    def get_voltage_percentiles(self, q: float) -> np.ndarray:
+        return get_percentiles(self.v_histogram, VOLTAGE_BINS, q)
+
+    def get_loading_percentiles(self, q: float) -> np.ndarray:
+        return get_percentiles(self.loading_histogram, LOADING_BINS, q)
+
+    def get_bus(self, bus_name: str) -> dict:
+        i = list(self.bus_names).index(bus_name)
+        return {"v_min": self.v_min[i], "v_min_time": self.v_min_time[i],
+                "v_max": self.v_max[i], "v_max_time": self.v_max_time[i],
+                "v_mean": self.v_mean[i],
+                "v_p5": self.get_voltage_percentiles(5)[i], "v_p95": self.get_voltage_percentiles(95)[i]}
+
+    def get_line(self, line_name: str) -> dict:
+        i = list(self.line_names).index(line_name)
+        return {"loading_peak": self.loading_peak[i], "loading_peak_time": self.loading_peak_time[i],
+                "loading_p50": self.get_loading_percentiles(50)[i],
+                "loading_p95": self.get_loading_percentiles(95)[i],
+                "loss_kwh": self.loss_kwh[i]}
+
+
+class GridStatistics:
+    # the current hour, day and month (or any subset of WINDOWS) and the last closed one of each
+    def __init__(self, bus_names, line_names, windows=tuple(WINDOWS), on_close=None):
+        self.bus_names = np.asarray(bus_names)
+        self.line_names = np.asarray(line_names)
+        self.windows = list(windows)
+        self.on_close = on_close
+        self.current = {}
+        self.closed = {}
+
+    def update(self, timestamp, minutes: float, bus_metrics, line_metrics, system_power: float):
+        for window in self.windows:
+            start = np.datetime64(timestamp, WINDOWS[window])
+            statistics = self.current.get(window)
+            if statistics is not None and statistics.start != start:
+                self.closed[window] = statistics
+                if self.on_close is not None:
+                    self.on_close(statistics)
+                statistics = None
+            if statistics is None:
+                statistics = WindowStatistics(window, start, self.bus_names, self.line_names)
+                self.current[window] = statistics
+            statistics.update(timestamp, minutes, bus_metrics, line_metrics, system_power)
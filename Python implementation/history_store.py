@@ -0,0 +1,206 @@
+"""
+Append-only history of every solved minute.
+
+The store is a directory with one sub-directory per day. Every day holds one
+raw little-endian file per quantity, with one row per minute and one column per
+bus or line, and a time file with one int64 (seconds since the epoch, wall
+clock) per row:
+
+    history/2024-05-01/meta.json            bus and line names of the columns
+    history/2024-05-01/time.i8
+    history/2024-05-01/bus_v_mag_pu.f4      p.u.
+    history/2024-05-01/bus_v_ang_deg.f4     deg
+    history/2024-05-01/line_p.f4            MW
+    history/2024-05-01/line_q.f4            MVAr
+    history/2024-05-01/line_loading.f4      %
+    history/2024-05-01/line_loss.f4         W
+
+Appending a minute adds one row to every file, the time file last, so a row
+only counts once its time is written. The rows of a day are kept in time order,
+which reads rely on: an append with a time that is not after the last row of
+its day is refused, e.g. a backfill of a day that already has live rows, which
+belongs in a history directory of its own. Bytes left behind by an append that was
+cut short are ignored by reads and overwritten by the next append. Reads map
+the files with np.memmap and copy out only the requested minutes and columns.
+
+usage: python history_store.py HISTORY_DIR FIELD --start 2024-05-01 --end 2024-05-02 [--elements LVB3 LVB5]
+"""
+
+import os
+import json
+import argparse
+import numpy as np
+
+# quantity -> (element type, metrics field)
+FIELDS = {
+    "bus_v_mag_pu": ("bus", "v_mag_pu"),
+    "bus_v_ang_deg": ("bus", "v_ang_deg"),
+    "line_p": ("line", "p"),
+    "line_q": ("line", "q"),
+    "line_loading": ("line", "loading"),
+    "line_loss": ("line", "loss"),
+}
+# float32 keeps a year of per-minute values of the KU grid below 2 GB
+VALUE_DTYPE = np.dtype('<f4')
+TIME_DTYPE = np.dtype('<i8')
+
+
+def to_seconds(timestamps) -> np.ndarray:
+    # datetimes, pandas timestamps or datetime64 values -> int64 seconds of the wall clock
+    return np.asarray(timestamps, dtype='datetime64[s]').astype(np.int64).reshape(-1)
+
+
+class HistoryStore:
+    def __init__(self, root: str, bus_names, line_names):
+        self.root = root
+        self.names = {"bus": [str(name) for name in bus_names], "line": [str(name) for name in line_names]}
+
+    def get_day_dir(self, day) -> str:
+        return os.path.join(self.root, str(np.datetime64(day, 'D')))
+
+    def days(self):
+        # days with history, oldest first
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(day for day in os.listdir(self.root) if os.path.exists(os.path.join(self.root, day, "meta.json")))
+
+    def _open_day(self, day) -> str:
+        day_dir = self.get_day_dir(day)
+        meta_path = os.path.join(day_dir, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta["bus"] != self.names["bus"] or meta["line"] != self.names["line"]:
+                raise ValueError(f"the buses or lines of {day_dir} differ from the network")
+            return day_dir
+        os.makedirs(day_dir, exist_ok=True)
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(self.names, f)
+        return day_dir
+
+    def append(self, timestamp, bus_metrics, line_metrics):
+        # one cycle of the live loop
+        self.append_many([timestamp], bus_metrics, line_metrics)
+
+    def append_many(self, timestamps, bus_metrics, line_metrics):
+        # metrics with one row per timestamp, as from grid_metrics.compute_all_*_metrics,
+        # or a single row for a single timestamp
+        seconds = to_seconds(timestamps)
+        metrics = {"bus": bus_metrics, "line": line_metrics}
+        values = {field: np.asarray(getattr(metrics[element], name), dtype=VALUE_DTYPE).reshape(len(seconds), -1)
+                  for field, (element, name) in FIELDS.items()}
+
+        if (np.diff(seconds) <= 0).any():
+            raise ValueError("the timestamps of an append must increase")
+        days = seconds.astype('datetime64[s]').astype('datetime64[D]')
+        # every day is checked before anything is written
+        for day in np.unique(days):
+            last = self.get_last_time(day)
+            if last is not None and seconds[days == day][0] <= last:
+                raise ValueError(f"{self.get_day_dir(day)} already has rows up to {np.datetime64(last, 's')}, "
+                                 f"appends must come after them")
+        for day in np.unique(days):
+            rows = days == day
+            day_dir = self._open_day(day)
+            time_path = os.path.join(day_dir, "time.i8")
+            committed = self._get_committed(time_path)
+            for field, field_values in values.items():
+                self._write(os.path.join(day_dir, field + ".f4"), field_values[rows], committed*self.get_row_size(field))
+            # the rows become visible once their time is written
+            self._write(time_path, seconds[rows].astype(TIME_DTYPE), committed*TIME_DTYPE.itemsize)
+
+    @staticmethod
+    def _get_committed(time_path: str) -> int:
+        # rows with a time, bytes written after the last complete append are cut off again
+        return os.path.getsize(time_path)//TIME_DTYPE.itemsize if os.path.exists(time_path) else 0
+
+    def get_last_time(self, day):
+        # seconds of the last row of a day, None if the day has no rows
+        time_path = os.path.join(self.get_day_dir(day), "time.i8")
+        committed = self._get_committed(time_path)
+        if committed == 0:
+            return None
+        with open(time_path, 'rb') as f:
+            f.seek((committed - 1)*TIME_DTYPE.itemsize)
+            return int(np.frombuffer(f.read(TIME_DTYPE.itemsize), dtype=TIME_DTYPE)[0])
+
+    def get_row_size(self, field: str) -> int:
+        return len(self.names[FIELDS[field][0]])*VALUE_DTYPE.itemsize
+
+    @staticmethod
+    def _write(path: str, rows: np.ndarray, size: int):
+        # appends rows to a file that should be size bytes long
+        with open(path, 'ab') as f:
+            if f.tell() != size:
+                f.truncate(size)
+            f.write(np.ascontiguousarray(rows).tobytes())
+
+    def _map_day(self, day: str, field: str):
+        # times and values of one day, mapped rather than read
+        day_dir = os.path.join(self.root, day)
+        with open(os.path.join(day_dir, "meta.json"), 'r', encoding='utf-8') as f:
+            names = json.load(f)[FIELDS[field][0]]
+        n_rows = os.path.getsize(os.path.join(day_dir, "time.i8"))//TIME_DTYPE.itemsize
+        if n_rows == 0:
+            return names, np.empty(0, dtype=TIME_DTYPE), np.empty((0, len(names)), dtype=VALUE_DTYPE)
+        times = np.memmap(os.path.join(day_dir, "time.i8"), dtype=TIME_DTYPE, mode='r', shape=(n_rows,))
+        values = np.memmap(os.path.join(day_dir, field + ".f4"), dtype=VALUE_DTYPE, mode='r',
+                           shape=(n_rows, len(names)))
+        return names, times, values
+
+    def read(self, field: str, start, end, elements=None):
+        # values of field for start <= time < end, for the named buses or lines (all if None)
+        # returns the times as datetime64[s] and the values with one row per time and one column per element
+        if field not in FIELDS:
+            raise ValueError(f"unknown field {field}, expected one of {', '.join(FIELDS)}")
+        start_seconds, end_seconds = to_seconds([start, end])
+        first_day = str(np.datetime64(start, 'D'))
+        last_day = str(np.datetime64(end, 'D'))
+
+        times = []
+        values = []
+        for day in self.days():
+            if not first_day <= day <= last_day:
+                continue
+            names, day_times, day_values = self._map_day(day, field)
+            # rows are appended in time order, so the range is found by bisection
+            i0, i1 = np.searchsorted(day_times, [start_seconds, end_seconds])
+            if i0 == i1:
+                continue
+            if elements is None:
+                columns = slice(None)
+            else:
+                position = {name: i for i, name in enumerate(names)}
+                columns = np.array([position[str(element)] for element in elements])
+            times.append(np.array(day_times[i0:i1]))
+            values.append(np.array(day_values[i0:i1, columns]))
+
+        n_columns = len(self.names[FIELDS[field][0]]) if elements is None else len(elements)
+        if not times:
+            return np.empty(0, dtype='datetime64[s]'), np.empty((0, n_columns), dtype=VALUE_DTYPE)
+        return np.concatenate(times).astype('datetime64[s]'), np.concatenate(values)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print a range of the history as CSV")
+    parser.add_argument("root", help="history directory")
+    parser.add_argument("field", choices=list(FIELDS))
+    parser.add_argument("--start", required=True, help="first time, e.g. 2024-05-01 or 2024-05-01T08:00")
+    parser.add_argument("--end", required=True, help="end time (exclusive)")
+    parser.add_argument("--elements", nargs="+", help="buses or lines to print (default all)")
+    args = parser.parse_args()
+
+    store = HistoryStore(args.root, [], [])
+    days = store.days()
+    if not days:
+        parser.error(f"no history in {args.root}")
+    # the column names of the newest day
+    with open(os.path.join(args.root, days[-1], "meta.json"), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    store = HistoryStore(args.root, meta["bus"], meta["line"])
+
+    times, values = store.read(args.field, np.datetime64(args.start), np.datetime64(args.end), args.elements)
+    element_names = args.elements or meta[FIELDS[args.field][0]]
+    print("time," + ",".join(element_names))
+    for time, row in zip(times, values):
+        print(f"{time}," + ",".join(f"{value:.6g}" for value in row))
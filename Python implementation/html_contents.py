@@ -1,23 +1,33 @@
-def get_table_html(top_margin: int, table_name: str, col1_title: str, col2_title: str, **rows) -> str:
-    rows = list(rows.items())
-    table_html = f"""
-    <div style="position: fixed; top: {top_margin}px; left: 20px; z-index: 1000; background-color: white; padding: 10px; border: 1px solid #ccc;">
+# the critical element tables are stacked in one box that scrolls when they are taller than the window
+TABLES_STYLE = """
         <style>
-            table {{
+            .disviz-critical table {
                 border-collapse: collapse;
                 width: 100%;
-            }}
+                margin-bottom: 10px;
+            }
 
-            th, td {{
+            .disviz-critical th, .disviz-critical td {
                 border: 1px solid black;
                 padding: 8px;
                 text-align: center;
-            }}
+            }
 
-            th {{
+            .disviz-critical th {
                 background-color: #f2f2f2;
-            }}
+            }
         </style>
+"""
+
+
+def get_table_html(table_name: str, col1_title: str, col2_title: str, rows) -> str:
+    # rows: (name, value) pairs, any number of them
+    rows_html = "".join(f"""
+            <tr>
+                <td>{name}</td>
+                <td>{value:.2f}</td>
+            </tr>""" for name, value in rows)
+    table_html = f"""
         <table>
             <tr>
                 <th colspan="2">{table_name}</th>
@@ -25,25 +35,22 @@ def get_table_html(top_margin: int, table_name: str, col1_title: str, col2_title
             <tr>
                 <th>{col1_title}</th>
                 <th>{col2_title}</th>
-            </tr>
-            <tr>
-                <td>{rows[0][0]}</td>
-                <td>{rows[0][1]:.2f}</td>
-            </tr>
-            <tr>
-                <td>{rows[1][0]}</td>
-                <td>{rows[1][1]:.2f}</td>
-            </tr>
-            <tr>
-                <td>{rows[2][0]}</td>
-                <td>{rows[2][1]:.2f}</td>
-            </tr>
+            </tr>{rows_html}
         </table>
-    </div>
     """
     return table_html
 
 
+def get_tables_html(top_margin: int, tables_html: str, element_id: str) -> str:
+    # the box holding the tables, its contents are replaced as a whole when the tables change
+    return f"""
+    <div style="position: fixed; top: {top_margin}px; left: 20px; z-index: 1000; background-color: white; padding: 10px; border: 1px solid #ccc; max-height: calc(100vh - {top_margin + 40}px); overflow-y: auto;">
+        {TABLES_STYLE}
+        <div class="disviz-critical" id="{element_id}">{tables_html}</div>
+    </div>
+    """
+
+
 def get_legend_html(element_name: str) -> str:
     bus_legend_html = """
         <div style="position: fixed; 
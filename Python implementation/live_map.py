@@ -0,0 +1,526 @@
+import math
+import folium
+from folium.plugins import AntPath
+from folium.elements import JSCSSMixin
+from branca.element import MacroElement
+from jinja2 import Template
+import html_contents
+import buses_and_lines
+import grid_metrics
+import arrow_geometry
+import live_server
+
+# centre of the map (KU premises)
+MAP_LOCATION = (27.619013147338894, 85.5387356168638)
+
+# url of fault icon
+FLASH_URL = 'G:\\My Drive\\D-VA\\Main Project\\Python implementation\\images\\flash2.png'
+# the static map loads the same icon relative to the html file
+FLASH_RELATIVE_URL = 'images/flash2.png'
+
+# short-circuit circles of supplied buses (True) and of buses cut off (False)
+SHORT_CIRCUIT_COLORS = {True: 'purple', False: 'grey'}
+
+# top margin (px) of the box with the critical element tables
+TABLES_TOP = 300
+# id of the element holding the critical element tables
+TABLES_ID = "disviz-critical-tables"
+
+# how often (in milliseconds) the page reloads the grid state
+# solves follow the meter readings within seconds, so the small state script is polled often
+STATE_REFRESH_MS = 2000
+
+
+def create_base_map():
+    # create a map object
+    map = folium.Map(location=MAP_LOCATION, zoom_start=18, max_zoom=30)
+
+    # add a layer to plot the distribution grid
+    grid_layer = folium.FeatureGroup(name='Grid Layer').add_to(map)
+
+    # add a layer for animation
+    animation_layer = folium.FeatureGroup(name='Animation', show=False).add_to(map)
+
+    # add a layer to display faults
+    fault_layer = folium.FeatureGroup(name='Fault Detection', show=False).add_to(map)
+
+    # add a layer to display the short-circuit currents of every bus
+    short_circuit_layer = folium.FeatureGroup(name='Short-Circuit Currents', show=False).add_to(map)
+    folium.LayerControl().add_to(map)
+
+    # Add bus and line legends to the map
+    map.get_root().html.add_child(folium.Element(html_contents.get_legend_html(element_name="bus")))
+    map.get_root().html.add_child(folium.Element(html_contents.get_legend_html(element_name="line")))
+
+    return map, grid_layer, animation_layer, fault_layer, short_circuit_layer
+
+
+def render_full_map(network, arrowheads, bus_metrics, line_metrics, critical_tables, short_circuit=None,
+                    bus_names=None):
+    # draws the complete map for one cycle
+    # a fresh map is created every time so that nothing accumulates between cycles
+    # short_circuit: short_circuit.get_report_dict() with the bus locations, if any
+    # bus_names: bus -> name shown, e.g. Feeder.bus_names, the KU names of buses_and_lines if None
+    if bus_names is None:
+        bus_names = buses_and_lines.buses_dict
+    map, grid_layer, animation_layer, fault_layer, short_circuit_layer = create_base_map()
+
+    bus_colors = grid_metrics.BUS_COLORS[bus_metrics.color_class]
+    for i, bus_name in enumerate(bus_metrics.names):
+        # show bus voltage magnitude and voltage angle on the popup
+        popup_text = f'<span style="font-weight:bold; padding-left:20px;">{bus_names.get(bus_name, bus_name)}</span><br>|V| = {bus_metrics.v_mag_pu[i]: .3f} p.u.<br>δ = {bus_metrics.v_ang_deg[i]: .3f} deg'
+        folium.Circle(location=(network.buses.y.iloc[i], network.buses.x.iloc[i]), radius=3.5,
+                    stroke=False,
+                    fill=True, fill_color=bus_colors[i], fill_opacity=1.0,
+                    popup=folium.Popup(popup_text, max_width=100)).add_to(grid_layer)
+
+    line_colors = grid_metrics.LINE_COLORS[line_metrics.color_class]
+    # arrowheads pointing in the direction of the power flow
+    line_arrowheads = arrow_geometry.select_arrowheads(arrowheads, line_metrics.forward)
+    for i, line_name in enumerate(line_metrics.names):
+        bus0 = network.buses.loc[network.lines.bus0.iloc[i]]
+        bus1 = network.buses.loc[network.lines.bus1.iloc[i]]
+        line_color = line_colors[i]
+        # tooltip text for the line
+        tooltip_text = f'<span style="font-weight: bold; padding-left: 0px">{line_name}</span><br>P = {line_metrics.p[i]*1000: .3f} kW<br>Q = {line_metrics.q[i]*1000:.3f} kVAr<br>loading = {line_metrics.loading[i]: .3f}%'
+        # latitude first then longitude
+        folium.PolyLine(locations=[(bus0.y, bus0.x), (bus1.y, bus1.x)],
+                        color=line_color, weight=line_metrics.weight[i],
+                        dash_array='' if line_metrics.active[i] else '5, 10',
+                        tooltip=tooltip_text).add_to(grid_layer)
+
+        if not line_metrics.active[i]:
+            continue
+
+        if line_metrics.forward[i]:
+            # if power is flowing from bus0 to bus1 direct arrows from bus0 to bus1
+            start, end = bus0, bus1
+        else:
+            # if power is flowing from bus1 to bus0 direct arrows from bus1 to bus0
+            start, end = bus1, bus0
+
+        folium.Polygon(locations=line_arrowheads[i].tolist(),
+                    color=line_color, weight=2.0,
+                    fill=True, fill_color=line_color, fill_opacity=0.8).add_to(grid_layer)
+
+        # coordinates - first latitude(y) then longitude(x)
+        AntPath([(start.y, start.x), (end.y, end.x)],
+                delay=1200, dash_array=(3,10),
+                color=line_color, pulse_color='#FFFFFF',
+                weight=3, opacity=1.0).add_to(animation_layer)
+
+        if line_metrics.fault[i]:
+            add_fault_marker(fault_layer, arrowheads.midpoints[i].tolist(), line_name)
+
+    if short_circuit is not None:
+        add_short_circuit_markers(short_circuit_layer, short_circuit)
+
+    map.get_root().html.add_child(folium.Element(get_critical_tables_html(critical_tables)))
+
+    add_transformer_line(network, grid_layer)
+    return map
+
+
+def get_critical_tables_html(critical_tables) -> str:
+    # critical_tables: critical_elements.CriticalTable
+    tables_html = "".join(html_contents.get_table_html(table.title, table.element_title, table.value_title, table.rows)
+                          for table in critical_tables)
+    return html_contents.get_tables_html(TABLES_TOP, tables_html, TABLES_ID)
+
+
+def get_full_map_html(map, refresh_seconds=60) -> str:
+    # the html of the geomap, rendered in memory
+    html = map.get_root().render()
+    #     Autorefresh section -- the page reloads itself every minute
+    return html.replace('</head>', f'<meta http-equiv="refresh" content="{refresh_seconds}"></head>', 1)
+
+
+def save_full_map(map, path: str, refresh_seconds=60):
+    # save the geomap of the network in an html file
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(get_full_map_html(map, refresh_seconds))
+
+
+def add_fault_marker(fault_layer, flash_coords, line_name):
+    # Create a custom icon using the image URL
+    icon = folium.CustomIcon(
+        FLASH_URL,
+        icon_size=(70, 70),  # Size of the icon
+        icon_anchor=(35, 35),  # Position of the icon anchor relative to the icon center
+        popup_anchor=(0, -20),  # Position of the popup relative to the icon
+    )
+
+    # Add a marker with the custom icon to the map
+    folium.Marker(
+        location=flash_coords,
+        icon=icon,
+        popup=f'A fault exists in {line_name}'
+    ).add_to(fault_layer)
+
+
+def get_short_circuit_radius(ik3: float, highest: float) -> float:
+    # circles grow with the three-phase current, buses cut off get the smallest
+    return 4 + 8*math.sqrt(ik3/highest) if ik3 > 0 else 4
+
+
+def add_short_circuit_markers(short_circuit_layer, short_circuit):
+    highest = max(bus["ik3"] for bus in short_circuit["buses"])
+    for bus in short_circuit["buses"]:
+        if bus["ik3"] > 0:
+            tooltip_text = f'<span style="font-weight: bold; padding-left: 0px">{bus["bus"]}</span><br>Ik3 = {bus["ik3"]:.2f} kA<br>ip = {bus["ip"]:.2f} kA<br>Ik1 = {bus["ik1"]:.2f} kA<br>Ik1 min = {bus["ik1_min"]:.2f} kA'
+        else:
+            tooltip_text = f'<span style="font-weight: bold; padding-left: 0px">{bus["bus"]}</span><br>not supplied'
+        folium.CircleMarker(location=bus["location"], radius=get_short_circuit_radius(bus["ik3"], highest),
+                            color=SHORT_CIRCUIT_COLORS[bus["ik3"] > 0], weight=1.0,
+                            fill=True, fill_opacity=0.5, tooltip=tooltip_text).add_to(short_circuit_layer)
+
+
+def add_transformer_line(network, grid_layer):
+    # add a line between HVB and LVB1 as PyPSA doesn't create a line between the buses if there is a transformer in between
+    folium.PolyLine(locations=[(network.buses.loc['HVB'].y, network.buses.loc['HVB'].x),
+                                (network.buses.loc['LVB1'].y, network.buses.loc['LVB1'].x)],
+                            color='black').add_to(grid_layer)
+
+
+# draws the short-circuit currents (short_circuit.get_short_circuit_script) into a layer, and loads them
+# again whenever the state names a new version of the script
+SHORT_CIRCUIT_JS = """
+            var disvizShortCircuitUrl = null;
+            function disvizLoadShortCircuit(url, layer) {
+                if (!url || url == disvizShortCircuitUrl) {
+                    return;
+                }
+                disvizShortCircuitUrl = url;
+                window.disvizApplyShortCircuit = function(report) {
+                    var highest = Math.max.apply(null, report.buses.map(function(bus) { return bus.ik3; }));
+                    layer.clearLayers();
+                    report.buses.forEach(function(bus) {
+                        var supplied = bus.ik3 > 0;
+                        L.circleMarker(bus.location, {radius: supplied ? 4 + 8*Math.sqrt(bus.ik3/highest) : 4,
+                            color: supplied ? 'purple' : 'grey', weight: 1.0, fill: true, fillOpacity: 0.5})
+                            .bindTooltip('<span style="font-weight: bold; padding-left: 0px">' + bus.bus + '</span><br>'
+                                + (supplied ? 'Ik3 = ' + bus.ik3.toFixed(2) + ' kA<br>ip = ' + bus.ip.toFixed(2)
+                                    + ' kA<br>Ik1 = ' + bus.ik1.toFixed(2) + ' kA<br>Ik1 min = '
+                                    + bus.ik1_min.toFixed(2) + ' kA' : 'not supplied'))
+                            .addTo(layer);
+                    });
+                };
+                var script = document.createElement('script');
+                script.src = url;
+                script.onload = script.onerror = function() { script.remove(); };
+                document.head.appendChild(script);
+            }
+"""
+
+# html of a critical element table of the grid state, as html_contents.get_table_html
+TABLE_JS = """
+            function disvizTable(table) {
+                return '<table><tr><th colspan="2">' + table.title + '</th></tr><tr><th>'
+                    + table.columns[0] + '</th><th>' + table.columns[1] + '</th></tr>'
+                    + table.rows.map(function(row) {
+                        return '<tr><td>' + row[0] + '</td><td>' + row[1].toFixed(2) + '</td></tr>';
+                    }).join('') + '</table>';
+            }
+"""
+
+
+class GridStateUpdater(JSCSSMixin, MacroElement):
+    # draws the static grid once and restyles it whenever a new state script is loaded
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var disvizGrid = {{ this.geometry|tojson }};
+            var disvizBuses = disvizGrid.buses.map(function(bus) {
+                return L.circle(bus.location, {radius: 3.5, stroke: false, fill: true,
+                    fillColor: 'grey', fillOpacity: 1.0}).bindPopup('', {maxWidth: 100})
+                    .addTo({{ this.grid_layer }});
+            });
+            var disvizLines = disvizGrid.lines.map(function(line) {
+                return L.polyline(line.locations, {color: 'grey', weight: 2.0})
+                    .bindTooltip('').addTo({{ this.grid_layer }});
+            });
+            var disvizArrows = L.layerGroup().addTo({{ this.grid_layer }});
+
+            {{ this.table_js }}
+            {{ this.short_circuit_js }}
+
+            var disvizState = null;
+
+            window.disvizApplyState = function(state) {
+                disvizState = state;
+                disvizBuses.forEach(function(circle, i) {
+                    circle.setStyle({fillColor: state.bus_color[i]});
+                    circle.setPopupContent('<span style="font-weight:bold; padding-left:20px;">'
+                        + disvizGrid.buses[i].name + '</span><br>|V| = ' + state.bus_v[i].toFixed(3)
+                        + ' p.u.<br>δ = ' + state.bus_ang[i].toFixed(3) + ' deg');
+                });
+                disvizArrows.clearLayers();
+                {{ this.animation_layer }}.clearLayers();
+                {{ this.fault_layer }}.clearLayers();
+                disvizLines.forEach(function(polyline, i) {
+                    var line = disvizGrid.lines[i];
+                    var color = state.line_color[i];
+                    polyline.setStyle({color: color, weight: state.line_weight[i],
+                        dashArray: state.line_dash[i] || null});
+                    polyline.setTooltipContent('<span style="font-weight: bold; padding-left: 0px">'
+                        + line.name + '</span><br>P = ' + state.line_p[i].toFixed(3)
+                        + ' kW<br>Q = ' + state.line_q[i].toFixed(3) + ' kVAr<br>loading = '
+                        + state.line_loading[i].toFixed(3) + '%');
+                    if (!state.line_active[i]) {
+                        return;
+                    }
+                    // arrowheads and animation point from the sending to the receiving bus
+                    var forward = state.line_forward[i];
+                    L.polygon(forward ? line.arrows[0] : line.arrows[1], {color: color, weight: 2.0,
+                        fill: true, fillColor: color, fillOpacity: 0.8}).addTo(disvizArrows);
+                    var path = forward ? line.locations : line.locations.slice().reverse();
+                    L.polyline.antPath(path, {delay: 1200, dashArray: [3, 10], color: color,
+                        pulseColor: '#FFFFFF', weight: 3, opacity: 1.0}).addTo({{ this.animation_layer }});
+                    if (state.line_fault[i]) {
+                        L.marker(line.midpoint, {icon: L.icon({iconUrl: {{ this.flash_url|tojson }},
+                            iconSize: [70, 70], iconAnchor: [35, 35], popupAnchor: [0, -20]})})
+                            .bindPopup('A fault exists in ' + line.name).addTo({{ this.fault_layer }});
+                    }
+                });
+                // the tables of the previous state are replaced, not added to
+                document.getElementById({{ this.tables_id|tojson }}).innerHTML = state.critical_tables.map(disvizTable).join('');
+                disvizLoadShortCircuit(state.short_circuit, {{ this.short_circuit_layer }});
+            };
+
+            // a delta of grid_state.get_state_delta: element lists only list the changed elements
+            function disvizApplyDelta(delta) {
+                if (disvizState === null) {
+                    return;
+                }
+                Object.keys(delta).forEach(function(key) {
+                    var change = delta[key];
+                    if (Array.isArray(disvizState[key]) && change !== null && change.index) {
+                        change.index.forEach(function(i, j) { disvizState[key][i] = change.value[j]; });
+                    } else {
+                        disvizState[key] = change;
+                    }
+                });
+                window.disvizApplyState(disvizState);
+            }
+
+            // the state is loaded as a script so that the page also works when opened from disk
+            function disvizLoadState() {
+                var script = document.createElement('script');
+                script.src = {{ this.state_file|tojson }} + '?t=' + Date.now();
+                script.onload = script.onerror = function() { script.remove(); };
+                document.head.appendChild(script);
+            }
+
+            var disvizPolling = null;
+            function disvizStartPolling() {
+                if (disvizPolling === null) {
+                    disvizLoadState();
+                    disvizPolling = setInterval(disvizLoadState, {{ this.refresh_ms }});
+                }
+            }
+            function disvizStopPolling() {
+                clearInterval(disvizPolling);
+                disvizPolling = null;
+            }
+
+            // served by live_server: the state is pushed, otherwise (or while the stream is down) it is polled
+            if (window.EventSource && location.protocol.indexOf('http') == 0) {
+                var disvizEvents = new EventSource({{ this.events_url|tojson }});
+                disvizEvents.addEventListener('state', function(event) {
+                    disvizStopPolling();
+                    window.disvizApplyState(JSON.parse(event.data));
+                });
+                disvizEvents.addEventListener('delta', function(event) {
+                    disvizApplyDelta(JSON.parse(event.data));
+                });
+                disvizEvents.onerror = disvizStartPolling;
+            } else {
+                disvizStartPolling();
+            }
+        {% endmacro %}
+    """)
+
+    default_js = AntPath.default_js
+
+    def __init__(self, geometry, state_file, grid_layer, animation_layer, fault_layer, short_circuit_layer):
+        super().__init__()
+        self._name = 'GridStateUpdater'
+        self.geometry = geometry
+        self.state_file = state_file
+        self.flash_url = FLASH_RELATIVE_URL
+        self.refresh_ms = STATE_REFRESH_MS
+        self.events_url = live_server.EVENTS_PATH
+        self.tables_id = TABLES_ID
+        self.table_js = TABLE_JS
+        self.short_circuit_js = SHORT_CIRCUIT_JS
+        self.grid_layer = grid_layer.get_name()
+        self.animation_layer = animation_layer.get_name()
+        self.fault_layer = fault_layer.get_name()
+        self.short_circuit_layer = short_circuit_layer.get_name()
+
+
+def get_grid_geometry(network, arrowheads):
+    # static part of the map: names, bus locations, line end points and
+    # the arrowheads for both flow directions of every line
+    buses = [{"name": buses_and_lines.get_bus_names(bus_name), "location": [y, x]}
+             for bus_name, x, y in zip(network.buses.index, network.buses.x, network.buses.y)]
+
+    bus0 = network.buses.loc[network.lines.bus0, ['y', 'x']].to_numpy()
+    bus1 = network.buses.loc[network.lines.bus1, ['y', 'x']].to_numpy()
+    lines = []
+    for i, line_name in enumerate(network.lines.index):
+        lines.append({"name": line_name,
+                      "locations": [bus0[i].tolist(), bus1[i].tolist()],
+                      "arrows": [arrowheads.forward[i].tolist(), arrowheads.reverse[i].tolist()],
+                      "midpoint": arrowheads.midpoints[i].tolist()})
+    return {"buses": buses, "lines": lines}
+
+
+def create_static_map(network, arrowheads, state_file: str):
+    # draws the geography, legends and layer control once
+    # per-minute values are applied in the browser from the state script
+    map, grid_layer, animation_layer, fault_layer, short_circuit_layer = create_base_map()
+    add_transformer_line(network, grid_layer)
+
+    # the tables are filled in by the browser from the state
+    map.get_root().html.add_child(folium.Element(html_contents.get_tables_html(TABLES_TOP, "", TABLES_ID)))
+
+    GridStateUpdater(get_grid_geometry(network, arrowheads), state_file,
+                     grid_layer, animation_layer, fault_layer, short_circuit_layer).add_to(map)
+    return map
+
+
+class GeoJsonUpdater(JSCSSMixin, MacroElement):
+    # draws the feature collection of grid_geojson, styled in the browser from its properties
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var disvizStyle = {{ this.style|tojson }};
+            {{ this.table_js }}
+            {{ this.short_circuit_js }}
+
+            function disvizBusColor(v) {
+                var limits = disvizStyle.voltage_limits;
+                return disvizStyle.bus_colors[v < limits[0] ? 0 : (v > limits[1] ? 2 : 1)];
+            }
+
+            function disvizLineColor(properties) {
+                if (!properties.direction) {
+                    return disvizStyle.line_colors[0];
+                }
+                var i = disvizStyle.loading_limits.findIndex(function(limit) { return properties.loading <= limit; });
+                return disvizStyle.line_colors[i < 0 ? disvizStyle.line_colors.length - 1 : i + 1];
+            }
+
+            // side point, tip and other side point of an arrowhead at the middle of the line
+            // from -> to ([longitude, latitude]), as arrow_geometry.get_arrowheads
+            function disvizArrowhead(from, to) {
+                var x3 = (from[0] + to[0])/2, y3 = (from[1] + to[1])/2;
+                var dx = to[0] - from[0], dy = to[1] - from[1];
+                var l = Math.hypot(dx, dy);
+                var ux = l > 0 ? dx/l : 0, uy = l > 0 ? dy/l : 0;
+                var al = l*disvizStyle.arrow_length, hw = al*Math.tan(disvizStyle.arrow_angle);
+                var xprime = x3 - al*ux, yprime = y3 - al*uy;
+                return [[yprime + hw*ux, xprime - hw*uy], [y3, x3], [yprime - hw*ux, xprime + hw*uy]];
+            }
+
+            var disvizArrows = L.layerGroup().addTo({{ this.grid_layer }});
+            var disvizFeatures = L.geoJSON(null, {
+                pointToLayer: function(feature, latlng) {
+                    return L.circle(latlng, {radius: 3.5, stroke: false, fill: true, fillOpacity: 1.0});
+                },
+                style: function(feature) {
+                    var properties = feature.properties;
+                    if (properties.element == 'bus') {
+                        return {fillColor: disvizBusColor(properties.v_mag_pu)};
+                    }
+                    return {color: disvizLineColor(properties), weight: 2.0 + properties.loading*4/100,
+                        dashArray: properties.direction ? null : '5, 10'};
+                },
+                onEachFeature: function(feature, layer) {
+                    var properties = feature.properties;
+                    if (properties.element == 'bus') {
+                        layer.bindPopup('<span style="font-weight:bold; padding-left:20px;">' + properties.name
+                            + '</span><br>|V| = ' + properties.v_mag_pu.toFixed(3) + ' p.u.<br>δ = '
+                            + properties.v_ang_deg.toFixed(3) + ' deg', {maxWidth: 100});
+                    } else {
+                        layer.bindTooltip('<span style="font-weight: bold; padding-left: 0px">' + properties.name
+                            + '</span><br>P = ' + properties.p.toFixed(3) + ' kW<br>Q = ' + properties.q.toFixed(3)
+                            + ' kVAr<br>loading = ' + properties.loading.toFixed(3) + '%');
+                    }
+                }
+            }).addTo({{ this.grid_layer }});
+
+            window.disvizApplyFeatures = function(collection) {
+                // every cycle replaces all features of the previous one
+                disvizFeatures.clearLayers();
+                disvizArrows.clearLayers();
+                {{ this.animation_layer }}.clearLayers();
+                {{ this.fault_layer }}.clearLayers();
+                disvizFeatures.addData(collection);
+                var faultLoading = disvizStyle.loading_limits[disvizStyle.loading_limits.length - 1];
+                collection.features.forEach(function(feature) {
+                    var properties = feature.properties;
+                    if (properties.element != 'line' || !properties.direction) {
+                        return;
+                    }
+                    // arrowheads and animation point from the sending to the receiving bus
+                    var ends = feature.geometry.coordinates;
+                    var from = properties.direction > 0 ? ends[0] : ends[1];
+                    var to = properties.direction > 0 ? ends[1] : ends[0];
+                    var color = disvizLineColor(properties);
+                    L.polygon(disvizArrowhead(from, to), {color: color, weight: 2.0,
+                        fill: true, fillColor: color, fillOpacity: 0.8}).addTo(disvizArrows);
+                    L.polyline.antPath([[from[1], from[0]], [to[1], to[0]]], {delay: 1200, dashArray: [3, 10],
+                        color: color, pulseColor: '#FFFFFF', weight: 3, opacity: 1.0}).addTo({{ this.animation_layer }});
+                    if (properties.loading > faultLoading) {
+                        L.marker([(ends[0][1] + ends[1][1])/2, (ends[0][0] + ends[1][0])/2],
+                            {icon: L.icon({iconUrl: {{ this.flash_url|tojson }},
+                            iconSize: [70, 70], iconAnchor: [35, 35], popupAnchor: [0, -20]})})
+                            .bindPopup('A fault exists in ' + properties.name).addTo({{ this.fault_layer }});
+                    }
+                });
+                document.getElementById({{ this.tables_id|tojson }}).innerHTML = collection.critical_tables.map(disvizTable).join('');
+                disvizLoadShortCircuit(collection.short_circuit, {{ this.short_circuit_layer }});
+            };
+
+            function disvizLoadFeatures() {
+                var script = document.createElement('script');
+                script.src = {{ this.features_file|tojson }} + '?t=' + Date.now();
+                script.onload = script.onerror = function() { script.remove(); };
+                document.head.appendChild(script);
+            }
+            disvizLoadFeatures();
+            setInterval(disvizLoadFeatures, {{ this.refresh_ms }});
+        {% endmacro %}
+    """)
+
+    default_js = AntPath.default_js
+
+    def __init__(self, features_file, grid_layer, animation_layer, fault_layer, short_circuit_layer):
+        super().__init__()
+        self._name = 'GeoJsonUpdater'
+        self.features_file = features_file
+        self.style = {"bus_colors": grid_metrics.BUS_COLORS.tolist(),
+                      "voltage_limits": grid_metrics.VOLTAGE_LIMITS,
+                      "line_colors": grid_metrics.LINE_COLORS.tolist(),
+                      "loading_limits": grid_metrics.LOADING_LIMITS,
+                      "arrow_length": arrow_geometry.ARROW_LENGTH,
+                      "arrow_angle": arrow_geometry.ARROW_ANGLE}
+        self.flash_url = FLASH_RELATIVE_URL
+        self.refresh_ms = STATE_REFRESH_MS
+        self.tables_id = TABLES_ID
+        self.table_js = TABLE_JS
+        self.short_circuit_js = SHORT_CIRCUIT_JS
+        self.grid_layer = grid_layer.get_name()
+        self.animation_layer = animation_layer.get_name()
+        self.fault_layer = fault_layer.get_name()
+        self.short_circuit_layer = short_circuit_layer.get_name()
+
+
+def create_geojson_map(network, features_file: str):
+    # the page of RENDER_MODE = "geojson": no element is drawn in python, every cycle
+    # the page loads the feature collection written by grid_geojson.save_feature_collection
+    map, grid_layer, animation_layer, fault_layer, short_circuit_layer = create_base_map()
+    add_transformer_line(network, grid_layer)
+    map.get_root().html.add_child(folium.Element(html_contents.get_tables_html(TABLES_TOP, "", TABLES_ID)))
+    GeoJsonUpdater(features_file, grid_layer, animation_layer, fault_layer, short_circuit_layer).add_to(map)
+    return map
@@ -0,0 +1,230 @@
+"""
+Built-in HTTP server that pushes every cycle to the viewers of the map.
+
+The server serves the files of the map (the page, the files published
+through the output sink and the images) and an event stream at /events (Server-Sent Events). A viewer
+that connects receives the complete grid state, and after that only a delta
+per cycle with the elements whose values changed (grid_state.get_state_delta).
+A viewer that fell behind, e.g. a phone waking up, gets the complete state
+again.
+
+Every cycle is encoded once, however many viewers are connected: publish()
+keeps the encoded messages of the latest version and every connection only
+waits for the version to change and writes the shared bytes.
+
+The page connects to /events when it is loaded from the server and keeps
+polling the grid state script when it is opened from disk or the stream is
+not available. Files published through an output_sink.OutputSink are sent
+with their ETag, as the pre-compressed copy the viewer accepts, and as
+304 Not Modified when the viewer already has them. Nothing else in the
+directory is served: it is the source directory, with .env, the cache and the
+history next to the map. The server listens on localhost only, unless it is
+given another host, e.g. 0.0.0.0 for the whole network.
+
+/what-if answers planning questions from the sensitivities of the latest
+solution (sensitivity.SensitivityModel) when the server was given a what_if
+function.
+"""
+
+import json
+import threading
+import os
+import posixpath
+import functools
+import urllib.parse
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import grid_state
+import output_sink
+
+# the url of the event stream, relative to the map page
+EVENTS_PATH = "events"
+# the url answering what-if questions as JSON, e.g. what-if?load=Load49&factor=2
+WHAT_IF_PATH = "what-if"
+# the directories of the map served as they are, besides the published files
+STATIC_DIRECTORIES = ("images",)
+# a comment is sent on idle streams this often (s), so proxies keep them open
+KEEPALIVE_SECONDS = 15.0
+
+
+def get_event(event: str, version: int, data) -> bytes:
+    return f"event: {event}\nid: {version}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+class StateBroadcaster:
+    # the latest grid state, shared by all connections
+    def __init__(self):
+        self._condition = threading.Condition()
+        self.version = 0
+        self.state = None
+        self._state_event = None        # the complete state of this version
+        self._delta_event = None        # the change from the previous version
+        self.viewers = 0
+
+    def publish(self, state: dict):
+        # called by load_flow() after every cycle
+        with self._condition:
+            delta = grid_state.get_state_delta(self.state, state) if self.state is not None else None
+            self.version += 1
+            self.state = state
+            self._state_event = get_event("state", self.version, state)
+            self._delta_event = get_event("delta", self.version, delta) if delta is not None else None
+            self._condition.notify_all()
+
+    def wait(self, version: int, timeout: float):
+        # waits for a version newer than the one a viewer has
+        # returns the new version and the event bringing the viewer there, None after a timeout
+        with self._condition:
+            self._condition.wait_for(lambda: self.version != version, timeout)
+            if self.version == version:
+                return version, None
+            if self.version == version + 1 and self._delta_event is not None:
+                return self.version, self._delta_event
+            return self.version, self._state_event
+
+
+class LiveRequestHandler(SimpleHTTPRequestHandler):
+    broadcaster: StateBroadcaster = None
+    index: str = None
+    sink = None
+    what_if = None
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == "/" + EVENTS_PATH:
+            self.send_events()
+            return
+        if path == "/" + WHAT_IF_PATH and self.what_if is not None:
+            self.send_what_if()
+            return
+        if path == "/" and self.index:
+            path = self.path = "/" + self.index
+        entry = self.sink.get_entry(path[1:]) if self.sink is not None else None
+        if entry is not None:
+            self.send_published(path[1:], entry)
+            return
+        super().do_GET()
+
+    def send_published(self, name: str, entry: dict):
+        etag = entry["etag"]
+        if etag in self.headers.get("If-None-Match", ""):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        accepted = [encoding.split(";")[0].strip() for encoding in self.headers.get("Accept-Encoding", "").split(",")]
+        # the smallest copy the viewer accepts
+        encoding = next((encoding for encoding in ("br", "gzip") if encoding in accepted and encoding in entry["encodings"]),
+                        None)
+        path = os.path.join(self.sink.directory, name)
+        try:
+            with open(path + output_sink.ENCODINGS[encoding] if encoding else path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", self.guess_type(name))
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", etag)
+        # revalidated on every request, answered with 304 while unchanged
+        self.send_header("Cache-Control", "no-cache")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Vary", "Accept-Encoding")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_what_if(self):
+        # the query parameters are handed to what_if as lists of values, like urllib.parse.parse_qs returns them
+        params = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        try:
+            answer = self.what_if(params)
+        except (KeyError, ValueError) as error:
+            self.send_error(400, f"cannot answer: {error}")
+            return
+        data = json.dumps(answer).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        broadcaster = self.broadcaster
+        with broadcaster._condition:
+            broadcaster.viewers += 1
+        # a new viewer has seen no version, so it starts from the complete state
+        version = 0
+        try:
+            while True:
+                version, event = broadcaster.wait(version, KEEPALIVE_SECONDS)
+                self.wfile.write(event if event is not None else b": keepalive\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with broadcaster._condition:
+                broadcaster.viewers -= 1
+
+    def send_head(self):
+        # every file not published through the sink is served here (GET and HEAD),
+        # only the map page and the images, never e.g. .env, the sources or the cache
+        path = posixpath.normpath(urllib.parse.unquote(self.path.split('?')[0].split('#')[0]))
+        name = path[1:]
+        if not name and self.index:
+            name = self.index
+            self.path = "/" + name
+        published = self.sink is not None and self.sink.get_entry(name) is not None
+        if not (published or name == self.index or name.startswith(tuple(d + "/" for d in STATIC_DIRECTORIES))):
+            self.send_error(404)
+            return None
+        return super().send_head()
+
+    def list_directory(self, path):
+        # only the files of the map are served, e.g. not a listing of the history
+        self.send_error(404)
+        return None
+
+    def log_message(self, format, *args):
+        # every poll of the state script would be logged otherwise
+        pass
+
+
+class LiveHTTPServer(ThreadingHTTPServer):
+    # one thread per connection, without holding up the exit of the live loop
+    daemon_threads = True
+    # control room screens and phones (re)connect together, e.g. after a restart
+    request_queue_size = 128
+
+
+class LiveServer:
+    def __init__(self, directory: str, index: str, port: int, host="127.0.0.1", sink=None, what_if=None):
+        # directory: the directory of the map, index: the file name of the map page,
+        # sink: the output_sink.OutputSink publishing into directory, if any,
+        # what_if: function answering the query parameters of WHAT_IF_PATH with a dict, if any
+        self.broadcaster = StateBroadcaster()
+        handler = type("Handler", (LiveRequestHandler,), {"broadcaster": self.broadcaster, "index": index,
+                                                          "sink": sink,
+                                                          "what_if": staticmethod(what_if) if what_if else None})
+        self.server = LiveHTTPServer((host, port), functools.partial(handler, directory=directory))
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{'localhost' if host == '0.0.0.0' else host}:{port}/"
+
+    def start(self):
+        self.thread.start()
+
+    def publish(self, state: dict):
+        self.broadcaster.publish(state)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,70 @@
+import os
+import json
+import math
+
+# set the power factor of 0.95
+PF = 0.95
+tan_phi = math.sqrt(1-PF**2)/PF
+
+# total power (W) assumed for a meter until it reports for the first time
+INITIAL_METER_POWER = 1000
+
+# the meter measuring the total power supplied by the transformer
+TRANSFORMER_METER = "transformer"
+
+# meter devices, their topics and the loads they measure
+METER_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "meters.json")
+
+
+def read_meter_config(path: str = METER_CONFIG_PATH) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def get_metered_loads(config: dict) -> dict:
+    # meter name -> load supplied through the meter
+    return {meter["name"]: meter["load"] for meter in config["meters"].values()}
+
+
+# load supplied through each building meter
+METERED_LOADS = get_metered_loads(read_meter_config())
+
+# share of the unmetered power (transformer minus all building meters) drawn by each
+# of the remaining loads, in proportion to their circuit breaker rating
+UNMETERED_SHARES = {"Load17": 0.010548,
+                    "Load8": 0.042194,
+                    "Load30": 0.042194,
+                    "Load38": 0.0843882,
+                    "Load13": 0.0527426,
+                    "Load23": 0.042194,
+                    "Load41": 0.0527426,
+                    "Load50": 0.042194,
+                    "Load22": 0.084388,
+                    "Load34": 0.0527426,
+                    "Load36": 0.084388,
+                    "Load40": 0.021097,
+                    "Load10": 0.021097,
+                    "Load25": 0.010548,
+                    "Load3": 0.021097,
+                    "Load45": 0.0527426,
+                    "Load32": 0.021097,
+                    "Load52": 0.021097,
+                    "Load43": 0.021097,
+                    "Load28": 0.042194,
+                    "Load27": 0.063291,
+                    "Load51": 0.063291}
+
+METERS = list(METERED_LOADS) + [TRANSFORMER_METER]
+
+
+def allocate_loads(meter_powers):
+    # meter_powers is a DataFrame with the total power (W) of every meter, one row per minute
+    # returns the active (MW) and reactive (MVAr) power of every load, one row per minute
+    metered = meter_powers[list(METERED_LOADS)]
+    unmetered_total_power = meter_powers[TRANSFORMER_METER] - metered.sum(axis=1)
+
+    p_set = metered.rename(columns=METERED_LOADS)/1e6
+    for load_name, share in UNMETERED_SHARES.items():
+        p_set[load_name] = (unmetered_total_power*share)/1e6
+    q_set = p_set*tan_phi
+    return p_set, q_set
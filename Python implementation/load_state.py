@@ -0,0 +1,83 @@
+import threading
+import numpy as np
+import load_allocation
+
+
+class LoadState:
+    # active and reactive power of every load, updated from meter messages on the MQTT thread
+    # and read by the power flow thread
+    #
+    # updates go into a pending buffer under a lock, and snapshot() copies the pending
+    # buffer for its caller, so a solve never sees a half applied update and the threads
+    # reading the loads (the live loop, the contingency and probabilistic analyses) never
+    # share their copies
+    #
+    # a load measured by several meters (e.g. sub-meters) draws the sum of their readings
+    def __init__(self, load_names, p_set, q_set, metered_loads=None, unmetered_shares=None):
+        self.load_names = list(load_names)
+        position = {load_name: i for i, load_name in enumerate(self.load_names)}
+
+        # meter -> position of the load it measures
+        if metered_loads is None:
+            metered_loads = load_allocation.METERED_LOADS
+        self.meters = list(metered_loads)
+        self.meter_loads = np.array([position[metered_loads[meter]] for meter in self.meters], dtype=int)
+        self.meter_index = {meter: i for i, meter in enumerate(self.meters)}
+        self.meter_powers = np.full(len(self.meters), float(load_allocation.INITIAL_METER_POWER))
+        self.metered_total_power = self.meter_powers.sum()
+        # metered power of every load (W), the sum of the meters measuring it
+        self.load_meter_powers = np.bincount(self.meter_loads, weights=self.meter_powers, minlength=len(self.load_names))
+        self.transformer_power = float(load_allocation.INITIAL_METER_POWER)
+
+        # positions and breaker rating shares of the unmetered loads
+        if unmetered_shares is None:
+            unmetered_shares = load_allocation.UNMETERED_SHARES
+        self.unmetered_loads = np.array([position[load_name] for load_name in unmetered_shares], dtype=int)
+        self.unmetered_shares = np.array(list(unmetered_shares.values()), dtype=float)
+
+        # row 0 holds p_set (MW), row 1 q_set (MVAr)
+        self._pending = np.array([p_set, q_set], dtype=float)
+        self._lock = threading.Lock()
+        # per unit active power -> (p, q) at the fixed power factor
+        self._pq = np.array([1.0, load_allocation.tan_phi])
+
+    def apply_meter(self, meter: str, total_power: float):
+        # total_power of the meter in W
+        self.apply_meters([meter], [total_power])
+
+    def apply_meters(self, meters, total_powers):
+        # a batch of readings, at most one per meter, applied with one assignment
+        # the transformer reading (if any) is applied last so it sees the new building readings
+        with self._lock:
+            transformer_power = None
+            index = []
+            powers = []
+            for meter, total_power in zip(meters, total_powers):
+                if meter == load_allocation.TRANSFORMER_METER:
+                    transformer_power = total_power
+                else:
+                    index.append(self.meter_index[meter])
+                    powers.append(total_power)
+
+            if index:
+                index = np.array(index)
+                powers = np.array(powers, dtype=float)
+                change = powers - self.meter_powers[index]
+                self.metered_total_power += change.sum()
+                self.meter_powers[index] = powers
+                loads = self.meter_loads[index]
+                np.add.at(self.load_meter_powers, loads, change)
+                self._pending[:, loads] = np.outer(self._pq, self.load_meter_powers[loads]/1e6)
+
+            if transformer_power is not None:
+                self.transformer_power = transformer_power
+                # update the unmetered loads in proportion to their circuit breaker rating
+                unmetered_total_power = transformer_power - self.metered_total_power
+                self._pending[:, self.unmetered_loads] = np.outer(self._pq, unmetered_total_power*self.unmetered_shares/1e6)
+
+    def snapshot(self):
+        # consistent copy of all loads, e.g. taken by the solver at the start of a cycle
+        # every call returns new arrays, owned by the caller
+        with self._lock:
+            current = self._pending.copy()
+        return current[0], current[1]
@@ -1,512 +1,401 @@
-import pypsa
-import pandas as pd
-import matplotlib.pyplot as plt
-import numpy  as np
-import cartopy.crs as ccrs
-import math
-import matplotlib.ticker as mticker
-import folium
-from folium.plugins import AntPath
-import time 
-import datetime
-import paho.mqtt.client as mqtt
+import time
+# startup time breakdown, printed when the first map is published
+START_TIME = time.perf_counter()
 import json
-import ku_grid_model
+import datetime
+import asyncio
 import threading
 import os
+import traceback
+import numpy as np
 from dotenv import load_dotenv
-import html_contents
-import buses_and_lines
+import grid_cache
+import grid_metrics
+import grid_state
+import grid_geojson
+import critical_elements
+from history_store import HistoryStore
+from live_server import LiveServer
+from output_sink import OutputSink
+from grid_statistics import GridStatistics
+from contingency import ContingencyAnalysis, get_report_dict
+import probabilistic_flow
+from state_estimation import StateEstimator
+import sensitivity
+import short_circuit
+import power_flow_stage
+import load_allocation
+from load_state import LoadState
+from solve_scheduler import SolveScheduler
+from meter_ingest import MeterIngestService
+# PyPSA, pandas and folium take seconds to import and are loaded only when needed:
+# PyPSA when the network is unpickled in the background, folium for RENDER_MODE = "full"
+# or when the grid cache has to be rebuilt
+
+startup_times = [("imports", time.perf_counter() - START_TIME)]
+startup_clock = time.perf_counter()
+
+
+def startup_step(step: str):
+    global startup_clock
+    now = time.perf_counter()
+    startup_times.append((step, now - startup_clock))
+    startup_clock = now
 
-network = ku_grid_model.create_network()
 
 load_dotenv()
-# MQTT broker details
-broker_address = "mqtt.iammeter.com"  # MQTT broker address 
-broker_port = 1883  # Default MQTT port
+# MQTT credentials, the broker, topics and meters are listed in meters.json
 username = os.getenv("METER_MQTT_USER")
 password = os.getenv("METER_MQTT_PASS")
-
-TOTAL_BLOCKS = 5
-PHYSICS = 0
-BIOTECH = 1
-MANAGEMENT = 2
-CIVIL = 3
-ELECTRICAL = 4
-TRANSFORMER = 5
-
-
-# Topics to subscribe to, for each meter
-Topic = {PHYSICS: "device/CD0FF6AB/realtime",
-          BIOTECH: "device/57DB095D/realtime",
-          MANAGEMENT: "device/8FA834AC/realtime",
-          CIVIL: "device/DAD94549/realtime",
-          ELECTRICAL: "device/C249361B/realtime",
-          TRANSFORMER: "device/F51C3384/realtime"}
-
-
-# set the power factor of 0.95
-PF = 0.95
-tan_phi = math.sqrt(1-PF**2)/PF
-
-# initialize the variables to store the total power for each block
-physics_meter_total_power = 1000
-biotech_meter_total_power = 1000
-management_meter_total_power = 1000
-civil_meter_total_power = 1000
-electrical_meter_total_power = 1000
-transformer_meter_total_power = 1000
+meter_config = load_allocation.read_meter_config()
 
 # path to save map
 MAP_PATH = r"G:\My Drive\D-VA\Main Project\Python implementation\ku_grid.html"
 
-# create a map object
-map = folium.Map(location=(27.619013147338894, 85.5387356168638), 
-                    zoom_start=18, max_zoom=30)
-
-# add a layer to plot the distribution grid
-grid_layer = folium.FeatureGroup(name='Grid Layer').add_to(map)
-# folium.LayerControl().add_to(map)
-
-# add a layer for animation
-animation_layer = folium.FeatureGroup(name='Animation', show = False).add_to(map)
-
-# add a layer to display faults
-fault_layer = folium.FeatureGroup(name='Fault Detection', show=False).add_to(map)
-folium.LayerControl().add_to(map)
-
-# get coordinates of all the buses in the network
-bus_coords = []
-for index, row in network.buses.iterrows():
-#     first latitude then longitude as folium expects location in this order
-    bus_coords.append([row['y'], row['x']])
-
-# Define a legend for the buses
-bus_legend_html = html_contents.get_legend_html(element_name="bus")
-
-# Define a legend for the lines
-line_legend_html = html_contents.get_legend_html(element_name="line")
-
-# Add bus legend to the map
-map.get_root().html.add_child(folium.Element(bus_legend_html))
-
-# Add line legend to the map
-map.get_root().html.add_child(folium.Element(line_legend_html))
-
-
-# Callback function to handle incoming messages
-def on_message(client, userdata, message):
-    # decode the message into a python string and then convert to a dictionary  
-    Payload_str = message.payload.decode("utf-8")
-    payload_dict = json.loads(Payload_str)
-
-    # get the active powers of all three phases
-    pa = float(payload_dict['Datas'][0][2])
-    pb = float(payload_dict['Datas'][1][2])
-    pc = float(payload_dict['Datas'][2][2])
-    total_power = int(pa+pb+pc)
-
-    # store the total power to the variables of corresponding blocks
-    global physics_meter_total_power
-    global biotech_meter_total_power
-    global civil_meter_total_power
-    global management_meter_total_power
-    global electrical_meter_total_power
-    global transformer_meter_total_power
-
-    global map
-    global grid_layer
-
-    if message.topic == Topic[PHYSICS]:
-        physics_meter_total_power = total_power
-        print(f"got message from physics, power = {total_power}")
-        network.loads.loc['Load16', 'p_set'] = physics_meter_total_power/1e6
-        network.loads.loc['Load16', 'q_set'] = (physics_meter_total_power/1e6)*tan_phi
-    elif message.topic == Topic[BIOTECH]:
-        biotech_meter_total_power = total_power
-        print(f"got message from biotech, power = {total_power}")
-        network.loads.loc['Load19', 'p_set'] = biotech_meter_total_power/1e6
-        network.loads.loc['Load19', 'q_set'] = (biotech_meter_total_power/1e6)*tan_phi
-    elif message.topic == Topic[MANAGEMENT]:
-        management_meter_total_power = total_power
-        print(f"got message from management, power = {total_power}")
-        network.loads.loc['Load5', 'p_set'] = management_meter_total_power/1e6
-        network.loads.loc['Load5', 'q_set'] = (management_meter_total_power/1e6)*tan_phi
-    elif message.topic == Topic[CIVIL]:
-        civil_meter_total_power = total_power
-        print(f"got message from civil, power = {total_power}")
-        network.loads.loc['Load6', 'p_set'] = civil_meter_total_power/1e6
-        network.loads.loc['Load6', 'q_set'] = (civil_meter_total_power/1e6)*tan_phi
-    elif message.topic == Topic[ELECTRICAL]:
-        electrical_meter_total_power = total_power
-        print(f"got message from electrical, power = {total_power}")
-        network.loads.loc['Load49', 'p_set'] = electrical_meter_total_power/1e6
-        network.loads.loc['Load49', 'q_set'] = (electrical_meter_total_power/1e6)*tan_phi
-    elif message.topic == Topic[TRANSFORMER]:
-        transformer_meter_total_power = total_power
-        print(f"got message from transformer, power = {total_power}")
-        metered_total_power = physics_meter_total_power+biotech_meter_total_power+management_meter_total_power+civil_meter_total_power+electrical_meter_total_power
-        unmetered_total_power = transformer_meter_total_power - metered_total_power
-
-        # update the active and reactive powers of unmetered loads
-        # in proportion to their circuit breaker rating
-        network.loads.loc['Load17', 'p_set'] = (unmetered_total_power*0.010548)/1e6
-        network.loads.loc['Load17', 'q_set'] = ((unmetered_total_power*0.010548)/1e6)*tan_phi
-        network.loads.loc['Load8', 'p_set'] = (unmetered_total_power*0.042194)/1e6
-        network.loads.loc['Load8', 'q_set'] = ((unmetered_total_power*0.042194)/1e6)*tan_phi
-        network.loads.loc['Load30', 'p_set'] = (unmetered_total_power*0.042194)/1e6
-        network.loads.loc['Load30', 'q_set'] = ((unmetered_total_power*0.042194)/1e6)*tan_phi
-        network.loads.loc['Load38', 'p_set'] = (unmetered_total_power*0.0843882)/1e6
-        network.loads.loc['Load38', 'q_set'] = ((unmetered_total_power*0.0843882)/1e6)*tan_phi
-        network.loads.loc['Load13', 'p_set'] = (unmetered_total_power*0.0527426)/1e6
-        network.loads.loc['Load13', 'q_set'] = ((unmetered_total_power*0.0527426)/1e6)*tan_phi
-        network.loads.loc['Load23', 'p_set'] = (unmetered_total_power*0.042194)/1e6
-        network.loads.loc['Load23', 'q_set'] = ((unmetered_total_power*0.042194)/1e6)*tan_phi
-        network.loads.loc['Load41', 'p_set'] = (unmetered_total_power*0.0527426)/1e6
-        network.loads.loc['Load41', 'q_set'] = ((unmetered_total_power*0.0527426)/1e6)*tan_phi
-        network.loads.loc['Load50', 'p_set'] = (unmetered_total_power*0.042194)/1e6
-        network.loads.loc['Load50', 'q_set'] = ((unmetered_total_power*0.042194)/1e6)*tan_phi
-        network.loads.loc['Load22', 'p_set'] = (unmetered_total_power*0.084388)/1e6
-        network.loads.loc['Load22', 'q_set'] = ((unmetered_total_power*0.084388)/1e6)*tan_phi
-        network.loads.loc['Load34', 'p_set'] = (unmetered_total_power*0.0527426)/1e6
-        network.loads.loc['Load34', 'q_set'] = ((unmetered_total_power*0.0527426)/1e6)*tan_phi
-        network.loads.loc['Load36', 'p_set'] = (unmetered_total_power*0.084388)/1e6
-        network.loads.loc['Load36', 'q_set'] = ((unmetered_total_power*0.084388)/1e6)*tan_phi
-        network.loads.loc['Load40', 'p_set'] = (unmetered_total_power*0.021097)/1e6
-        network.loads.loc['Load40', 'q_set'] = ((unmetered_total_power*0.021097)/1e6)*tan_phi
-        network.loads.loc['Load10', 'p_set'] = (unmetered_total_power*0.021097)/1e6
-        network.loads.loc['Load10', 'q_set'] = ((unmetered_total_power*0.021097)/1e6)*tan_phi
-        network.loads.loc['Load25', 'p_set'] = (unmetered_total_power*0.010548)/1e6
-        network.loads.loc['Load25', 'q_set'] = ((unmetered_total_power*0.010548)/1e6)*tan_phi
-        network.loads.loc['Load3', 'p_set'] = (unmetered_total_power*0.021097)/1e6
-        network.loads.loc['Load3', 'q_set'] = ((unmetered_total_power*0.021097)/1e6)*tan_phi
-        network.loads.loc['Load45', 'p_set'] = (unmetered_total_power*0.0527426)/1e6
-        network.loads.loc['Load45', 'q_set'] = ((unmetered_total_power*0.0527426)/1e6)*tan_phi
-        network.loads.loc['Load32', 'p_set'] = (unmetered_total_power*0.021097)/1e6
-        network.loads.loc['Load32', 'q_set'] = ((unmetered_total_power*0.021097)/1e6)*tan_phi
-        network.loads.loc['Load52', 'p_set'] = (unmetered_total_power*0.021097)/1e6
-        network.loads.loc['Load52', 'q_set'] = ((unmetered_total_power*0.021097)/1e6)*tan_phi
-        network.loads.loc['Load43', 'p_set'] = (unmetered_total_power*0.021097)/1e6
-        network.loads.loc['Load43', 'q_set'] = ((unmetered_total_power*0.021097)/1e6)*tan_phi
-        network.loads.loc['Load28', 'p_set'] = (unmetered_total_power*0.042194)/1e6
-        network.loads.loc['Load28', 'q_set'] = ((unmetered_total_power*0.042194)/1e6)*tan_phi
-        network.loads.loc['Load27', 'p_set'] = (unmetered_total_power*0.063291)/1e6
-        network.loads.loc['Load27', 'q_set'] = ((unmetered_total_power*0.063291)/1e6)*tan_phi
-        network.loads.loc['Load51', 'p_set'] = (unmetered_total_power*0.063291)/1e6
-        network.loads.loc['Load51', 'q_set'] = ((unmetered_total_power*0.063291)/1e6)*tan_phi
- 
-# counter to count number of minutes
-minute_counter=0
-# global variables to keep records of system peak power, total power, and losses
-peak_power = 65000
-system_total_power = 0
-system_loss_full_day = 0
+# "state" writes the map once and then publishes only the per-minute grid state next to it,
+# "geojson" writes the map once and then publishes every bus and line as one GeoJSON feature
+# collection styled in the browser, "full" redraws the complete map every minute
+RENDER_MODE = "state"
+# the per-minute file the map page of "state" and "geojson" loads
+STATE_FILE = "ku_grid_state.js"
+MAP_FILE = os.path.basename(MAP_PATH)
+
+# the map and the state are rendered in memory and only written when they changed, atomically
+# and with compressed copies, into the directory of the map
+output = OutputSink(os.path.dirname(os.path.abspath(MAP_PATH)))
+
+# in RENDER_MODE = "state" the map is also served on this port and every cycle is pushed
+# to its viewers, None to only write the files
+LIVE_SERVER_PORT = 8050
+# localhost only; "0.0.0.0" serves the map to the whole network
+LIVE_SERVER_HOST = "127.0.0.1"
+
+# load order, radial topology, line resistances, arrowheads and the static map,
+# read from the cache unless the model tables or the code deriving them changed
+grid, grid_cached = grid_cache.load_compiled_grid(state_file=STATE_FILE, render_mode=RENDER_MODE)
+startup_step("grid cache" if grid_cached else "grid cache (rebuilt)")
+
+# active and reactive power of every load, written by the meter ingestion and read by load_flow
+load_state = LoadState(grid.load_names, grid.p_set, grid.q_set,
+                       load_allocation.get_metered_loads(meter_config))
+
+# "newton" solves with PyPSA's Newton-Raphson (network.pf()),
+# "sweep" with the backward/forward sweep for radial networks
+POWER_FLOW_SOLVER = "newton"
+# loads changing by less than this (MW/MVAr) since the last solve do not trigger a new one
+POWER_FLOW_TOLERANCE = 1e-6
+
+# True shows the state estimated from all channels of the meters (voltages, currents and powers)
+# instead of the power flow of the allocated loads, see state_estimation
+STATE_ESTIMATION = False
+estimator = None
+if STATE_ESTIMATION:
+    estimator = StateEstimator(grid.topology, grid.load_buses, grid.p_set, grid.q_set,
+                               {meter: list(grid.load_names).index(load)
+                                for meter, load in load_allocation.get_metered_loads(meter_config).items()})
+
+# the PyPSA network and its power flow stage are set by load_network(), until then
+# the cycles are solved with the radial sweep of the cached topology
+network = None
+power_flow = None
+
+# a cycle starts SOLVE_DEBOUNCE seconds after the last of a burst of readings,
+# but not more often than every SOLVE_MIN_INTERVAL and at least every SOLVE_MAX_INTERVAL seconds
+SOLVE_DEBOUNCE = 1.0
+SOLVE_MIN_INTERVAL = 2.0
+SOLVE_MAX_INTERVAL = 60.0
+scheduler = SolveScheduler(SOLVE_DEBOUNCE, SOLVE_MIN_INTERVAL, SOLVE_MAX_INTERVAL)
+
+# the critical element tables: how many buses and lines, ranked by which criteria
+# (see critical_elements.CRITERIA)
+CRITICAL_ELEMENTS_K = 3
+CRITICAL_ELEMENTS_CRITERIA = ("voltage_deviation", "loading")
+
+# one row per minute is appended to the history store next to the map
+HISTORY_DIR = os.path.join(os.path.dirname(MAP_PATH), "history")
+history = HistoryStore(HISTORY_DIR, grid.bus_names, grid.line_names)
+
+# line resistances in the order of network.lines
+line_resistances = grid.line_resistances
+
+# arrowheads for both flow directions of every line, bus coordinates never change
+arrowheads = grid.arrowheads
+
+
+def print_daily_report(statistics):
+    # called when a window of the statistics ends, reports the days
+    if statistics.window != "day":
+        return
+    print(f"daily report for {statistics.start}")
+    print(f"daily average power = {statistics.average_power:.3f} kW")
+    print(f"daily_peak_power = {statistics.power_peak/1000} kW")
+    print(f"daily peak timestamp = {statistics.power_peak_time}")
+    print(f"system full day loss = {statistics.system_loss_kwh} kWh")
+    print(f"system peak loss = {statistics.loss_at_power_peak/1000:.2f} kW")
+
+
+# running voltage, loading, energy and loss statistics of the current hour, day and month
+statistics = GridStatistics(grid.bus_names, grid.line_names, on_close=print_daily_report)
+
+# every single line and transformer outage is analysed this often (s) on the current loads,
+# by CONTINGENCY_WORKERS processes (None for one per CPU), None to not analyse outages
+CONTINGENCY_INTERVAL = 300
+CONTINGENCY_WORKERS = None
+CONTINGENCY_FILE = "ku_grid_contingency.json"
+
+contingency = None
+if CONTINGENCY_INTERVAL is not None:
+    contingency = ContingencyAnalysis(grid.topology, CONTINGENCY_WORKERS)
+    # the workers are forked before any thread is started
+    contingency.start()
+    startup_step("contingency workers")
+
+# the unmetered loads are sampled this often (s) on the current meter readings and the
+# voltage and loading percentiles and violation probabilities published, None to not sample
+PROBABILISTIC_INTERVAL = 300
+PROBABILISTIC_SAMPLES = 5000
+# distributions of the breaker rating shares and power factors of the unmetered loads
+LOAD_UNCERTAINTY = probabilistic_flow.LoadUncertainty()
+PROBABILISTIC_FILE = "ku_grid_uncertainty.json"
+
+# voltage and flow sensitivities of every bus with a load, recomputed when the voltages drift,
+# answering what-if questions without a power flow
+sensitivities = sensitivity.SensitivityModel(grid.topology, grid.line_branches, grid.load_buses)
+# the loads of the latest cycle, the base of the what-if questions
+current_loads = (grid.p_set, grid.q_set)
+load_index = {load_name: i for i, load_name in enumerate(grid.load_names)}
+bus_index = {bus_name: i for i, bus_name in enumerate(grid.bus_names)}
+
+
+def answer_what_if(params: dict) -> dict:
+    # /what-if?load=Load49&factor=2 scales loads, /what-if?bus=LVB30&kw=22&pf=0.95 adds load at buses,
+    # both can be given several times and combined
+    if sensitivities.sensitivities is None:
+        raise ValueError("no solution yet")
+    p_set, q_set = current_loads
+    buses = []
+    delta_s = []
+    for load_name, factor in zip(params.get("load", []), params.get("factor", [])):
+        load = load_index[load_name]
+        buses.append(grid.load_buses[load])
+        delta_s.append((float(factor) - 1)*(p_set[load] + 1j*q_set[load]))
+    power_factor = float(params.get("pf", ["1"])[0])
+    if not 0 < power_factor <= 1:
+        raise ValueError("pf must be in (0, 1]")
+    tan_phi = np.sqrt(1 - power_factor**2)/power_factor
+    for bus_name, kw in zip(params.get("bus", []), params.get("kw", [])):
+        if bus_index[bus_name] not in sensitivities.column:
+            raise ValueError(f"{bus_name} has no loads, ask for a bus with loads")
+        buses.append(bus_index[bus_name])
+        delta_s.append(float(kw)/1000*(1 + 1j*tan_phi))
+    if not buses:
+        raise ValueError("ask with load and factor or bus and kw")
+    dp, dq = sensitivities.get_changes(buses, delta_s)
+    return sensitivity.get_what_if_dict(sensitivities.what_if(dp, dq), grid.bus_names, grid.line_names)
+
+
+# short-circuit currents of every bus (IEC 60909) in a layer of the map; loads do not change
+# them and the loop sees no switching (the grid is static, contingency outages are only
+# studied), so they are computed once at startup. Call publish_short_circuits() again
+# after short_circuits.switch() once switch states are read
+SHORT_CIRCUIT = short_circuit.ShortCircuitParameters()
+SHORT_CIRCUIT_FILE = "ku_grid_short_circuit.js"
+short_circuits = short_circuit.ShortCircuitModel(grid.topology, grid.bus_v_nom, SHORT_CIRCUIT)
+# the currents of the latest computation and the url the map loads them from
+short_circuit_report = None
+short_circuit_url = None
+
+
+def publish_short_circuits():
+    global short_circuit_report
+    global short_circuit_url
+    result = short_circuits.compute()
+    short_circuit_report = short_circuit.get_report_dict(result, grid.bus_display_names, grid.geometry.bus_locations)
+    output.publish(SHORT_CIRCUIT_FILE, short_circuit.get_short_circuit_script(short_circuit_report))
+    # every version of the currents has its own url, so the viewers load it again
+    short_circuit_url = f"{SHORT_CIRCUIT_FILE}?v={output.get_entry(SHORT_CIRCUIT_FILE)['sha256'][:16]}"
+    print(f"short-circuit currents of {len(result.ik3)} buses in {result.seconds*1000:.2f} ms")
+
+
+live_server = None
+if RENDER_MODE == "state" and LIVE_SERVER_PORT is not None:
+    live_server = LiveServer(output.directory, MAP_FILE, LIVE_SERVER_PORT, LIVE_SERVER_HOST,
+                             sink=output, what_if=answer_what_if)
+    live_server.start()
+    print(f"serving the map on {live_server.url}")
+
+
+def load_network():
+    # unpickling the network imports PyPSA, which takes a few seconds
+    global network
+    global power_flow
+    start = time.perf_counter()
+    loaded_network = grid_cache.get_network(grid)
+    network = loaded_network
+    power_flow = power_flow_stage.PowerFlowStage(loaded_network, POWER_FLOW_SOLVER, POWER_FLOW_TOLERANCE)
+    print(f"network loaded in {time.perf_counter() - start:.2f} s")
+
+
+def analyse_contingencies():
+    # runs next to load_flow, the cycles do not wait for the outages to be analysed
+    while True:
+        time.sleep(CONTINGENCY_INTERVAL)
+        try:
+            p_set, q_set = load_state.snapshot()
+            report = contingency.run(grid_cache.get_bus_loads(grid, p_set, q_set))
+            report_dict = get_report_dict(report, grid.topology, grid.bus_display_names)
+            report_dict["time"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            output.publish(CONTINGENCY_FILE, json.dumps(report_dict, indent=1))
+            print(f"contingency analysis: {report_dict['cases']} outages in {report.seconds:.2f} s")
+        except Exception:
+            # e.g. a base case that does not converge: reported, and tried again next interval
+            print("contingency analysis failed:")
+            traceback.print_exc()
+
+
+def analyse_uncertainty():
+    # runs next to load_flow, like analyse_contingencies
+    while True:
+        time.sleep(PROBABILISTIC_INTERVAL)
+        try:
+            p_set, q_set = load_state.snapshot()
+            report = probabilistic_flow.run(grid, p_set, q_set, load_state.unmetered_loads,
+                                            load_state.unmetered_shares, PROBABILISTIC_SAMPLES,
+                                            uncertainty=LOAD_UNCERTAINTY)
+            report_dict = probabilistic_flow.get_report_dict(report, grid.bus_display_names, grid.line_names)
+            report_dict["time"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            output.publish(PROBABILISTIC_FILE, json.dumps(report_dict, indent=1))
+            print(f"probabilistic load flow: {report.samples} samples in {report.seconds:.2f} s"
+                  + (f", {report.skipped} did not converge" if report.skipped else ""))
+        except Exception:
+            print("probabilistic load flow failed:")
+            traceback.print_exc()
 
 
 def load_flow():
-    global physics_meter_total_power
-    global biotech_meter_total_power
-    global civil_meter_total_power
-    global management_meter_total_power
-    global electrical_meter_total_power
-    global transformer_meter_total_power
-
-    global peak_power
-    global system_total_power
-    global system_loss_full_day
-    global minute_counter
     # timestamp = datetime.datetime.now()
+    global current_loads
+
+    if RENDER_MODE in ("state", "geojson"):
+        # the geography, legends and layer control are written only once, straight from the cache
+        output.publish(MAP_FILE, grid.static_map)
+        startup_step("static map")
+        threading.Thread(target=load_network, daemon=True).start()
+    else:
+        # every cycle draws the complete map from the network
+        import live_map
+        load_network()
+        startup_step("network")
+    publish_short_circuits()
+
+    # voltages of the last radial sweep, to warm start the next one
+    sweep_voltages = None
+    # time of the results shown on the map, kept while solves are skipped so an unchanged
+    # cycle renders to the same bytes and is not written again
+    results_time = None
+    # the minute of the last row appended to the history
+    history_minute = None
 
     while True:
-        # perform newton Raphson Load Flow
-        network.pf()
+        # wait for new meter readings (or at most SOLVE_MAX_INTERVAL seconds)
+        elapsed = scheduler.wait_for_cycle()
+        # minutes the results of this cycle stand for, used to weight the daily statistics
+        minutes = elapsed/60
+
+        # take a consistent copy of all loads, meter messages keep arriving during the solve
+        p_set, q_set = load_state.snapshot()
+
+        if estimator is not None:
+            # the allocated loads are only pseudo measurements of the unmetered loads
+            estimate = estimator.estimate(ingest.get_readings(), p_set, q_set)
+            bus_metrics, line_metrics = grid_cache.get_radial_metrics(grid, estimate.v, estimate.i_branch)
+            solved = True
+            print(f"state estimation: {estimate.seconds*1000:.1f} ms, {estimate.factorised} factorisations,"
+                  f" J = {estimate.objective:.1f}")
+            for meter, channel, reason in estimate.bad_data:
+                print(f"rejected {meter} {channel}: {reason}")
+        elif power_flow is None:
+            # PyPSA is still loading
+            bus_metrics, line_metrics, sweep_voltages = grid_cache.solve_sweep(grid, p_set, q_set, sweep_voltages)
+            solved = True
+        else:
+            network.loads['p_set'], network.loads['q_set'] = p_set, q_set
+            # skipped when no load changed, warm started from the previous voltages otherwise
+            solved = power_flow.solve()
+            print(f"power flow solves: {power_flow.counters}")
+            if solved:
+                # voltage of every bus and loading, losses and colours of every line, all at once
+                bus_metrics = grid_metrics.compute_bus_metrics(network)
+                line_metrics = grid_metrics.compute_line_metrics(network, line_resistances)
 
         ####################################################################
         ######################### Network Plotting #########################
         ####################################################################
 
-        # add circles to the locations of buses in the map
-        bus_v_mags = {}
-        for i in range(len(bus_coords)):
-            # get the bus name
-            bus_name = network.buses.index.to_list()[i]
-            bus_name = buses_and_lines.get_bus_names(bus_name)
-            # get per unit voltage magnitude the bus
-            v_mag_pu = network.buses_t.v_mag_pu.iloc[0, i]
-            # get the difference from the per unit value
-            V_mag_diff = abs(v_mag_pu-1.0)
-            # get voltage angle of the bus (in radian by default) and convert it to degree
-            v_ang_rad = network.buses_t.v_ang.iloc[0, i]
-            v_ang_deg = (180/math.pi)*v_ang_rad 
-            # set bus color based on voltage magnitude
-            bus_color=''
-            if v_mag_pu<0.95:
-                bus_color='red'
-            elif 0.95<=v_mag_pu<=1.05:
-                bus_color='green'
-            else:
-                bus_color='yellow'
-            # show bus voltage magnitude and voltage angle on the popup 
-            popup_text = f'<span style="font-weight:bold; padding-left:20px;">{bus_name}</span><br>|V| = {v_mag_pu: .3f} p.u.<br>δ = {v_ang_deg: .3f} deg'
-            folium.Circle(location=bus_coords[i], radius=3.5, 
-                        stroke=False,
-                        fill=True, fill_color= bus_color, fill_opacity=1.0,
-                        popup=folium.Popup(popup_text, max_width=100)).add_to(grid_layer)
-            bus_v_mags[f'{bus_name}'] = [v_mag_pu, V_mag_diff]
-    
-
-        line_loading = {}
-        total_system_loss = 0
-        for index, row in network.lines.iterrows():
-            # get the name of the line
-            line_name = index
-            # print(f"index= {index}\n type={type(index)}")
-            # get active and reactive powers of the line
-            line_p = network.lines_t.p0.loc['now', index ]
-            line_q = network.lines_t.q0.loc['now', index ]    
-            # get the starting and ending buses of each line
-            bus0 = row['bus0']
-            bus1 = row['bus1']
-            # set line colors based on the line loading
-            #assumed nominal capacity of the line (sqrt(3)*400*300/1000000 MVA)
-            s_nom_assumed = 0.207846   
-            # calculate the line percentage loading
-            s_actual = math.sqrt(line_p**2 + line_q**2)     #actual apparent power
-            # print(f"{line_name}: actual apparent power = {s_actual}")
-            percentage_loading = (s_actual/s_nom_assumed)*100
-            line_I = (s_actual*10e6)/(math.sqrt(3)*400.0)   #line current
-            line_I = line_I/3   #per phase current
-            line_R = buses_and_lines.get_line_resistance(line_name)     #line resistance
-            line_loss = (line_I**2)*line_R      # power loss per line
-            line_loss_3_phase = 3*line_loss     # total 3 phase power loss
-            # print(f"{line_name}: current = {line_I} A, resistance = {line_R}ohm,  line loss = {line_loss_3_phase:.2f} W")
-            total_system_loss = total_system_loss+line_loss_3_phase
-            line_color = ''
-            dash_size = ''
-            show_arrow = True
-            show_animation = True
-            show_fault = False
-
-            # uncomment to simulate a virtual power outage on line2_3
-            # if line_name=="Line2_3":
-            #     line_p = 0
-            #     line_q = 0
-
-            # uncomment to simulate a virtual fault on line4_5
-            # if line_name=="Line4_7":
-            #     percentage_loading = 160.0
-                
-            if (line_p == 0) and (line_q==0):
-                # black color if no power flowing through the line
-                line_color = 'black' 
-                dash_size = '5, 10'
-                percentage_loading = 0
-                show_arrow = False
-                show_animation = False
-            elif (0 < percentage_loading <= 50):
-                # green color if line loading is less than 50%
-                line_color = 'green' 
-            elif (50 < percentage_loading <= 100):
-                # violet if line loading is between 50 to 100%
-                line_color = 'orange' 
-            elif (100 < percentage_loading <= 150):
-                # red if line loading is between 100 to 150&
-                line_color = 'red'
-            else:
-                # indicate fault if percentage loading exceeds 150%
-                line_color = 'red'
-                show_fault = True
-
-            # set line weight relative to percentage loading
-            line_weight = 2.0 + percentage_loading*4/100
-            # tooltip text for the line
-            tooltip_text = f'<span style="font-weight: bold; padding-left: 0px">{line_name}</span><br>P = {line_p*1000: .3f} kW<br>Q = {line_q*1000:.3f} kVAr<br>loading = {percentage_loading: .3f}%'
-            # finally, add the line
-            # latitude first then longitude
-            folium.PolyLine(locations=[(network.buses.loc[bus0].y, network.buses.loc[bus0].x), 
-                                    (network.buses.loc[bus1].y, network.buses.loc[bus1].x)],
-                            color = line_color, weight  = line_weight,
-                            dash_array = dash_size,
-                            tooltip= tooltip_text).add_to(grid_layer)
-            
-            if line_p > 0:
-                # if power is flowing from bus0 to bus1 direct arrows from bus0 to bus1
-                x1, y1 = network.buses.loc[bus0].x, network.buses.loc[bus0].y  #first point of the line
-                x2, y2 = network.buses.loc[bus1].x, network.buses.loc[bus1].y  #second point
-            else:
-                # if power is flowing from bus1 to bus0 direct arrows from bus1 to bus0
-                x1, y1 = network.buses.loc[bus1].x, network.buses.loc[bus1].y  #first point of the line
-                x2, y2 = network.buses.loc[bus0].x, network.buses.loc[bus0].y  #second point
-            x3, y3 = (x1+x2)/2, (y1+y2)/2     # mid point
-            m = (y2-y1)/(x2-x1)     #slope
-            l = math.sqrt(pow(x2-x1, 2) + pow(y2-y1, 2))    #line length
-            al = l/8    #arrow length
-            # print(f'{line_name}: slope = {m}  & length = {l}')
-            theta = math.atan(m)
-            theta = abs(theta)
-            phi = math.pi/8     # angle between the main line and the arrow lines 
-            p = al*math.sin(theta)
-            b = al*math.cos(theta)
-            p1= al*math.tan(phi)
-            b1= p1*math.cos(theta)
-            k1= b1*math.tan(theta)
-            p2 = p1
-            b2 = b1
-            k2 = k1
-            if (x1<x2) and (y1<y2):
-                # coordinates for arrowheads to the lines having positive slope, arrowhead pointing upwards
-                xprime=x3-b
-                yprime=y3-p
-                x4=xprime-k1
-                y4=yprime+b1
-                x5=xprime+k2
-                y5=yprime-b2
-
-            elif (x1<x2) and (y1>y2):
-                 # coordinates for arrowheads to the lines having negative slope, arrowhead pointing downwards
-                xprime=x3-b
-                yprime=y3+p
-                x4=xprime+k1
-                y4=yprime+b1
-                x5=xprime-k2
-                y5=yprime-b2
-
-            elif (x1>x2) and (y1<y2):
-                # coordinates for arrowheads to the lines having negative slope, arrowhead pointing upwards
-                xprime=x3+b
-                yprime=y3-p
-                x4=xprime-k1
-                y4=yprime-b1
-                x5=xprime+k2
-                y5=yprime+b2
-
-            elif (x1>x2) and (y1>y2):
-                # coordinates for arrowheads to the lines having positive slope, arrowhead pointing downwards
-                xprime=x3+b
-                yprime=y3+p
-                x4=xprime+k1
-                y4=yprime-b1
-                x5=xprime-k2
-                y5=yprime+b2
-
-            if show_arrow:
-                folium.Polygon(locations=[(y4, x4), (y3, x3), (y5, x5)],
-                     color= line_color, weight=2.0,
-                     fill=True, fill_color = line_color, fill_opacity=0.8).add_to(grid_layer)
-              
-            
-            if show_animation:
-                # Use AntPath for animation
-                # coordinates - first latitude(y) then longitude(x)
-                AntPath([(y1, x1), (y2, x2)], 
-                        delay = 1200, dash_array=(3,10), 
-                        color=line_color, pulse_color='#FFFFFF',
-                        weight=3, opacity=1.0).add_to(animation_layer)
-                
-            if show_fault:
-                # url of fault icon
-                flash_url = 'G:\\My Drive\\D-VA\\Main Project\\Python implementation\\images\\flash2.png'
-
-                # Coordinates for the flash icon
-                flash_y = (network.buses.loc[bus0].y + network.buses.loc[bus1].y)/2
-                flash_x = (network.buses.loc[bus0].x + network.buses.loc[bus1].x)/2
-                flash_coords = [flash_y, flash_x]
-                m_flash = (network.buses.loc[bus1].y - network.buses.loc[bus0].y)/(network.buses.loc[bus1].x-network.buses.loc[bus0].x)
-                theta_flash = math.atan(m_flash)    #angle in radian
-                theta_flash = theta_flash * 180/math.pi     #radian to degrees
-
-                # Create a custom icon using the image URL
-                icon = folium.CustomIcon(
-                    flash_url,
-                    icon_size=(70, 70),  # Size of the icon
-                    icon_anchor=(35, 35),  # Position of the icon anchor relative to the icon center
-                    popup_anchor=(0, -20),  # Position of the popup relative to the icon
-                )
-
-                # Add a marker with the custom icon to the map
-                folium.Marker(
-                    location=flash_coords,
-                    icon=icon,
-                    popup=f'A fault exists in {line_name}'
-                ).add_to(fault_layer)
-            line_loading[f"{line_name}"] = percentage_loading
-
-        bus_v_mags = dict(sorted(bus_v_mags.items(), key=lambda item: item[1][1], reverse = True))
-        for key in bus_v_mags:
-            bus_v_mags[key] = bus_v_mags[key][0]
-        line_loading = dict(sorted(line_loading.items(), key=lambda item: item[1], reverse = True))
-        bus_html = html_contents.get_table_html(300, "Critical Buses", "Bus", "|V| pu", **bus_v_mags)
-        line_html = html_contents.get_table_html(500, "Critical Lines", "Line", "% Loading", **line_loading)
-        map.get_root().html.add_child(folium.Element(bus_html))
-        map.get_root().html.add_child(folium.Element(line_html))
-
-        # add a line between HVB and LVB1 as PyPSA doesn't create a line between the buses if there is a transformer in between
-        folium.PolyLine(locations=[(network.buses.loc['HVB'].y, network.buses.loc['HVB'].x), 
-                                    (network.buses.loc['LVB1'].y, network.buses.loc['LVB1'].x)],
-                                color = 'black').add_to(grid_layer)
-
-        # save the geomap of the network in an html file
-        map.save(MAP_PATH)
-        
-    #     Autorefresh section -- modify the html file so that it autorefreshes every minute
-        with open(MAP_PATH, 'r', encoding='utf-8') as f:
-            f_contents = f.read()
-        
-        refreshed_content = f_contents.replace('</head>', '<meta http-equiv="refresh" content="60"></head>')
-    
-        with open(MAP_PATH, 'w', encoding='utf-8') as f:
-            f.write(refreshed_content)
-        
-        time.sleep(60)
-        system_total_power = system_total_power+transformer_meter_total_power/1000
-        system_loss_full_day = system_loss_full_day+total_system_loss
-        if transformer_meter_total_power > peak_power:
-            print(f"peak power changed from {peak_power/1000} kW to {transformer_meter_total_power/1000} kW")
-            peak_power = transformer_meter_total_power
-            peak_loss = total_system_loss
-            peak_timestamp = datetime.datetime.now()
-        minute_counter = minute_counter+1
+        if solved:
+            total_system_loss = line_metrics.loss.sum()
+            current_loads = (p_set.copy(), q_set.copy())
+            if sensitivities.update(bus_metrics.v_mag_pu*np.exp(1j*np.radians(bus_metrics.v_ang_deg))):
+                print(f"sensitivities recomputed in {sensitivities.sensitivities.seconds*1000:.1f} ms")
+
+        # the results stand for this minute even when the solve was skipped, the history
+        # keeps the first cycle of every minute
+        timestamp = datetime.datetime.now()
+        minute = timestamp.replace(second=0, microsecond=0)
+        if history_minute is None or minute > history_minute:
+            history.append(timestamp, bus_metrics, line_metrics)
+            history_minute = minute
+        if solved or results_time is None:
+            results_time = timestamp
+
+        # uncomment to simulate a virtual power outage on line2_3
+        # line_metrics = grid_metrics.get_line_metrics(line_metrics.names,
+        #                                              np.where(line_metrics.names == "Line2_3", 0, line_metrics.p),
+        #                                              np.where(line_metrics.names == "Line2_3", 0, line_metrics.q),
+        #                                              line_resistances)
+
+        # e.g. buses furthest from 1 p.u. and most heavily loaded lines
+        critical_tables = critical_elements.get_critical_tables(bus_metrics, line_metrics, grid.bus_display_names,
+                                                                CRITICAL_ELEMENTS_CRITERIA, CRITICAL_ELEMENTS_K)
+
+        if RENDER_MODE == "state":
+            # only the small state document changes from minute to minute
+            state = grid_state.get_grid_state(results_time, bus_metrics, line_metrics, critical_tables,
+                                              short_circuit_url)
+            if output.publish(STATE_FILE, grid_state.get_state_script(state)) and live_server is not None:
+                live_server.publish(state)
+        elif RENDER_MODE == "geojson":
+            collection = grid_geojson.get_feature_collection(grid.geometry, results_time, bus_metrics, line_metrics,
+                                                             critical_tables, short_circuit_url)
+            output.publish(STATE_FILE, grid_geojson.get_feature_script(collection))
+        else:
+            # save the geomap of the network in an html file
+            map = live_map.render_full_map(network, arrowheads, bus_metrics, line_metrics, critical_tables,
+                                           short_circuit_report)
+            output.publish(MAP_FILE, live_map.get_full_map_html(map))
+
+        scheduler.published()
+        if startup_times[-1][0] != "first cycle":
+            startup_step("first cycle")
+            print("startup: " + ", ".join(f"{step} {seconds:.3f} s" for step, seconds in startup_times)
+                  + f", total {time.perf_counter() - START_TIME:.3f} s")
+        print(f"output files: {output.counters}")
+        print(f"reading to publish latency = {scheduler.latency['last']:.2f} s (max {scheduler.latency['max']:.2f} s)")
+
         print(f"total system loss = {total_system_loss/1000:.2f} kW")
-        if minute_counter==(1):
-            daily_average_power = system_total_power/(24*60)
-            daily_peak_power = peak_power
-            print(f"daily average power = {daily_average_power:.3f} kW")
-            print(f"daily_peak_power = {daily_peak_power/1000} kW")
-            print(f"daily peak timestamp = {peak_timestamp.strftime("%Y-%m-%d %H:%M:%S")}")
-            print(f"system full day loss = {system_loss_full_day/(60.0*1000)} kWh")
-            print(f"system peak loss = {peak_loss/1000:.2f} kW")
-            minute_counter=0
-            # reset the system total power
-            system_total_power = 0
-            # reset the peak power to 65 kW
-            peak_power = 65000
-            system_loss_full_day = 0
-            
+        statistics.update(timestamp, minutes, bus_metrics, line_metrics, load_state.transformer_power)
+
+
+# receive the readings of all meters, decode them in batches and update the loads
+ingest = MeterIngestService(meter_config, load_state, scheduler)
 
 #create a thread to handle the data operations
 #so that data fetching and manipulation run independently
 thread = threading.Thread(target=load_flow)
 thread.start()
+if contingency is not None:
+    threading.Thread(target=analyse_contingencies, daemon=True).start()
+if PROBABILISTIC_INTERVAL is not None:
+    threading.Thread(target=analyse_uncertainty, daemon=True).start()
 
-# Create MQTT client instance
-client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
-
-# Set username and password for authentication
-client.username_pw_set(username, password)
-
-# Assign callback function to handle incoming messages
-client.on_message = on_message
-
-# Connect to MQTT broker
-client.connect(broker_address, broker_port)
-
-# Subscribe to the topics
-client.subscribe(Topic[PHYSICS])
-client.subscribe(Topic[BIOTECH])
-client.subscribe(Topic[MANAGEMENT])
-client.subscribe(Topic[CIVIL])
-client.subscribe(Topic[ELECTRICAL])
-client.subscribe(Topic[TRANSFORMER])
-
-# Loop to maintain MQTT connection and process incoming messages
-client.loop_forever()
+asyncio.run(ingest.run(username, password))
@@ -0,0 +1,150 @@
+"""
+Asyncio ingestion of iammeter readings.
+
+A single MQTT subscription with a wildcard topic (device/+/realtime) receives
+the readings of every meter listed in meters.json. The MQTT network thread only
+hands raw messages to a bounded asyncio queue, and it blocks while the queue is
+full, which pushes back on the broker instead of piling messages up in memory.
+Decoding and load updates happen on the asyncio side in batches: all messages
+waiting in the queue are drained at once, only the newest reading of every
+device is kept, and the batch is applied to the load state with one call.
+"""
+
+import json
+import asyncio
+from typing import NamedTuple
+import numpy as np
+import paho.mqtt.client as mqtt
+import load_allocation
+
+# most messages waiting to be decoded before the MQTT thread is made to wait
+QUEUE_SIZE = 1000
+# most messages handled in one batch
+BATCH_SIZE = 500
+
+
+class MeterReading(NamedTuple):
+    # per phase values of one message, in the order of the 'Datas' rows
+    voltage: np.ndarray     # V
+    current: np.ndarray     # A
+    power: np.ndarray       # W
+
+    @property
+    def total_power(self) -> int:
+        return int(self.power.sum())
+
+
+def decode_payload(payload: bytes) -> MeterReading:
+    # decode the message into a python string and then convert to a dictionary
+    payload_dict = json.loads(payload.decode("utf-8"))
+    # voltage, current and active power of all three phases
+    datas = np.array([phase[:3] for phase in payload_dict['Datas'][:3]], dtype=float)
+    return MeterReading(voltage=datas[:, 0], current=datas[:, 1], power=datas[:, 2])
+
+
+def get_device_id(topic: str) -> str:
+    # device/<id>/realtime -> <id>
+    return topic.split('/')[1]
+
+
+class MeterIngestService:
+    def __init__(self, config: dict, load_state, scheduler=None, queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE):
+        self.config = config
+        self.load_state = load_state
+        self.scheduler = scheduler
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        # device id -> meter name used by the load state
+        self.device_meters = {device: meter["name"] for device, meter in config["meters"].items()}
+        self.device_meters[config["transformer"]] = load_allocation.TRANSFORMER_METER
+        # newest reading of every device, with all phase values
+        self.latest = {}
+        self.counters = {"received": 0, "applied": 0, "coalesced": 0, "unknown": 0, "invalid": 0, "batches": 0}
+        self.queue = None
+        self.loop = None
+
+    def enqueue_threadsafe(self, topic: str, payload: bytes):
+        # called from the MQTT network thread, waits while the queue is full
+        asyncio.run_coroutine_threadsafe(self.queue.put((topic, payload)), self.loop).result()
+
+    async def submit(self, topic: str, payload: bytes):
+        # called from coroutines on the service loop, e.g. an in-process replay
+        await self.queue.put((topic, payload))
+
+    async def _next_batch(self):
+        # waits for one message, then takes whatever else is already waiting
+        batch = [await self.queue.get()]
+        while len(batch) < self.batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    def handle_batch(self, batch):
+        self.counters["received"] += len(batch)
+        self.counters["batches"] += 1
+        readings = {}
+        decoded = 0
+        for topic, payload in batch:
+            device = get_device_id(topic)
+            if device not in self.device_meters:
+                self.counters["unknown"] += 1
+                continue
+            try:
+                readings[device] = decode_payload(payload)
+                decoded += 1
+            except (ValueError, KeyError, IndexError, TypeError):
+                self.counters["invalid"] += 1
+        if not readings:
+            return
+
+        # only the newest reading of every device in the batch is applied
+        self.counters["coalesced"] += decoded - len(readings)
+        self.latest.update(readings)
+        self.load_state.apply_meters([self.device_meters[device] for device in readings],
+                                     [reading.total_power for reading in readings.values()])
+        self.counters["applied"] += len(readings)
+        if self.scheduler is not None:
+            # let load_flow solve once the burst of readings is over
+            self.scheduler.notify()
+
+    def get_readings(self) -> dict:
+        # newest reading of every meter by meter name, e.g. for the state estimator on another thread
+        return {self.device_meters[device]: reading for device, reading in list(self.latest.items())}
+
+    async def process(self):
+        while True:
+            batch = await self._next_batch()
+            self.handle_batch(batch)
+
+    def start_queue(self):
+        # the queue belongs to the running loop
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+
+    def create_client(self, username=None, password=None):
+        client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+        if username is not None:
+            # Set username and password for authentication
+            client.username_pw_set(username, password)
+
+        def on_connect(client, userdata, flags, reason_code, properties):
+            # (re)subscribe on every connection, one wildcard for all meters
+            client.subscribe(self.config["topic"])
+
+        def on_message(client, userdata, message):
+            self.enqueue_threadsafe(message.topic, message.payload)
+
+        client.on_connect = on_connect
+        client.on_message = on_message
+        return client
+
+    async def run(self, username=None, password=None):
+        self.start_queue()
+        client = self.create_client(username, password)
+        # Connect to MQTT broker, the client runs its own network thread
+        client.connect(self.config["broker"]["host"], self.config["broker"]["port"])
+        client.loop_start()
+        try:
+            await self.process()
+        finally:
+            client.loop_stop()
+            client.disconnect()
@@ -0,0 +1,260 @@
+"""
+Record iammeter traffic and play it back for load testing.
+
+    record   subscribe to the live broker and append every message to a JSON lines file
+    play     play a recording (or synthetic traffic) back, either into a local MQTT
+             broker or into an in-process copy of the ingest -> solve -> render
+             pipeline, which needs no network at all
+
+Playback can be accelerated (--speed 1 to 1000) and fanned out to thousands of
+virtual meters (--virtual-meters N): every recorded building message is also
+sent as N copies from made up devices, mapped round robin onto the metered
+loads as their sub-meters, so the load state adds up several meters per load.
+Together the virtual meters draw about as much as one more building, and every
+transformer message is raised by their power, so the unmetered loads and the
+operating point stay as recorded however large N is.
+
+usage:
+    python meter_replay.py record traffic.jsonl --minutes 60
+    python meter_replay.py play traffic.jsonl --target inprocess --speed 100 --virtual-meters 2000
+    python meter_replay.py play --synthetic 30 --target mqtt --host localhost --speed 60
+"""
+
+import os
+import json
+import time
+import datetime
+import asyncio
+import argparse
+import tempfile
+import threading
+import logging
+import numpy as np
+import paho.mqtt.client as mqtt
+from dotenv import load_dotenv
+import ku_grid_model
+import load_allocation
+import grid_metrics
+import grid_state
+import power_flow_stage
+from load_state import LoadState
+from solve_scheduler import SolveScheduler
+from meter_ingest import MeterIngestService
+
+
+def record(config: dict, path: str, minutes: float, username=None, password=None):
+    # appends {"t": epoch seconds, "topic": ..., "payload": ...} lines to path
+    client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+    if username is not None:
+        client.username_pw_set(username, password)
+    lock = threading.Lock()
+    with open(path, 'a', encoding='utf-8') as f:
+        def on_message(client, userdata, message):
+            line = json.dumps({"t": time.time(), "topic": message.topic,
+                               "payload": message.payload.decode("utf-8")})
+            with lock:
+                f.write(line + "\n")
+
+        client.on_connect = lambda client, userdata, flags, reason_code, properties: client.subscribe(config["topic"])
+        client.on_message = on_message
+        client.connect(config["broker"]["host"], config["broker"]["port"])
+        client.loop_start()
+        time.sleep(minutes*60)
+        client.loop_stop()
+        client.disconnect()
+
+
+def read_recording(path: str):
+    # list of (seconds since the first message, topic, payload dict)
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    t0 = lines[0]["t"]
+    return [(line["t"] - t0, line["topic"], json.loads(line["payload"])) for line in lines]
+
+
+def synthesize_recording(config: dict, minutes: int, seed=0):
+    # one message per meter per minute, building meters between 1 and 6 kW per phase
+    # and the transformer carrying all of them plus the unmetered loads
+    rng = np.random.default_rng(seed)
+    messages = []
+    for minute in range(minutes):
+        building_total = 0.0
+        for i, device in enumerate(config["meters"]):
+            phase_powers = rng.uniform(300, 2000, 3)
+            building_total += phase_powers.sum()
+            messages.append((minute*60 + i*0.2, f"device/{device}/realtime", get_payload(phase_powers)))
+        phase_powers = (building_total + rng.uniform(20000, 60000))/3*np.ones(3)
+        messages.append((minute*60 + 1.0, f"device/{config['transformer']}/realtime", get_payload(phase_powers)))
+    return messages
+
+
+def get_payload(phase_powers) -> dict:
+    # the part of an iammeter message the ingestion reads: voltage, current and power per phase
+    return {"Datas": [[230.0, round(p/230.0, 3), round(float(p), 1), 0.0, 0.0] for p in phase_powers]}
+
+
+def get_virtual_config(config: dict, n_virtual: int, load_names=None) -> dict:
+    # adds n_virtual made up meters, mapped round robin onto load_names,
+    # by default the loads the building meters of config measure
+    if load_names is None:
+        load_names = list(dict.fromkeys(load_allocation.get_metered_loads(config).values()))
+    config = json.loads(json.dumps(config))
+    for i in range(n_virtual):
+        config["meters"][f"V{i:07X}"] = {"name": f"virtual{i}", "load": load_names[i % len(load_names)]}
+    return config
+
+
+def fan_out(messages, n_virtual: int, transformer: str, seed=0):
+    # every message of a building meter is also sent by n_virtual virtual meters with a share of its power,
+    # together about one building more; the transformer messages are raised by the power of the virtual meters
+    # the encoded payloads are prepared up front so playback itself stays cheap
+    rng = np.random.default_rng(seed)
+    scales = rng.uniform(0.2, 1.5, n_virtual)/max(n_virtual, 1)
+    virtual_ids = [f"V{i:07X}" for i in range(n_virtual)]
+    # latest total power (W) of every virtual meter, as the ingestion reads it
+    virtual_totals = np.zeros(n_virtual)
+    expanded = []
+    for t, topic, payload in messages:
+        powers = np.array([phase[2] for phase in payload["Datas"][:3]], dtype=float)
+        is_transformer = topic == f"device/{transformer}/realtime"
+        if is_transformer and n_virtual:
+            # the transformer supplies the virtual meters too, so the unmetered power stays as recorded
+            payload = dict(payload, Datas=get_payload(powers + virtual_totals.sum()/3)["Datas"])
+        expanded.append((t, topic, json.dumps(payload).encode()))
+        if is_transformer:
+            continue
+        for i, (device, scale) in enumerate(zip(virtual_ids, scales)):
+            virtual_payload = get_payload(powers*scale)
+            virtual_totals[i] = int(sum(phase[2] for phase in virtual_payload["Datas"]))
+            expanded.append((t, f"device/{device}/realtime", json.dumps(virtual_payload).encode()))
+    return expanded
+
+
+async def play(messages, speed: float, send):
+    # calls send(topic, payload) for every message, keeping the recorded spacing divided by speed
+    start = time.monotonic()
+    for t, topic, payload in messages:
+        delay = start + t/speed - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await send(topic, payload)
+    return time.monotonic() - start
+
+
+def play_to_broker(messages, speed: float, host: str, port: int):
+    client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+    client.connect(host, port)
+    client.loop_start()
+
+    async def send(topic, payload):
+        client.publish(topic, payload)
+
+    duration = asyncio.run(play(messages, speed, send))
+    client.loop_stop()
+    client.disconnect()
+    print(f"published {len(messages)} messages in {duration:.2f} s ({len(messages)/duration:.0f} messages/s)")
+
+
+class Pipeline:
+    # in-process copy of the live loop of main.py: snapshot the loads, solve,
+    # compute the metrics and write the grid state into a scratch directory
+    def __init__(self, network, load_state, scheduler, output_dir):
+        self.network = network
+        self.load_state = load_state
+        self.scheduler = scheduler
+        self.power_flow = power_flow_stage.PowerFlowStage(network)
+        self.line_resistances = grid_metrics.get_line_resistances(network)
+        self.state_path = os.path.join(output_dir, "ku_grid_state.js")
+        self.cycle_times = []
+        self.running = True
+
+    def run(self):
+        while self.running:
+            self.scheduler.wait_for_cycle()
+            start = time.perf_counter()
+            self.network.loads['p_set'], self.network.loads['q_set'] = self.load_state.snapshot()
+            self.power_flow.solve()
+            bus_metrics = grid_metrics.compute_bus_metrics(self.network)
+            line_metrics = grid_metrics.compute_line_metrics(self.network, self.line_resistances)
+            state = grid_state.get_grid_state(datetime.datetime.now(), bus_metrics, line_metrics, [])
+            grid_state.save_grid_state(self.state_path, state)
+            self.scheduler.published()
+            self.cycle_times.append(time.perf_counter() - start)
+
+
+def play_in_process(messages, config: dict, speed: float, network):
+    load_state = LoadState(network.loads.index, network.loads.p_set, network.loads.q_set,
+                           load_allocation.get_metered_loads(config))
+    scheduler = SolveScheduler()
+    ingest = MeterIngestService(config, load_state, scheduler)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        pipeline = Pipeline(network, load_state, scheduler, output_dir)
+        thread = threading.Thread(target=pipeline.run, daemon=True)
+        thread.start()
+
+        async def replay():
+            ingest.start_queue()
+            processor = asyncio.create_task(ingest.process())
+            duration = await play(messages, speed, ingest.submit)
+            # let the queue drain before stopping
+            while not ingest.queue.empty():
+                await asyncio.sleep(0.01)
+            processor.cancel()
+            return duration
+
+        duration = asyncio.run(replay())
+        # wake the pipeline once more so it finishes its last cycle before the directory goes away
+        pipeline.running = False
+        scheduler.notify()
+        thread.join()
+
+    cycle_ms = np.array(pipeline.cycle_times)*1000
+    print(f"replayed {len(messages)} messages in {duration:.2f} s ({len(messages)/duration:.0f} messages/s)")
+    print(f"ingest counters: {ingest.counters}")
+    print(f"power flow solves: {pipeline.power_flow.counters}")
+    if len(cycle_ms):
+        print(f"cycles: {len(cycle_ms)}, solve+render median {np.median(cycle_ms):.1f} ms, max {cycle_ms.max():.1f} ms")
+    print(f"reading to publish latency: {scheduler.latency}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record and replay iammeter traffic")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="record live traffic")
+    record_parser.add_argument("path")
+    record_parser.add_argument("--minutes", type=float, default=60)
+
+    play_parser = subparsers.add_parser("play", help="play traffic back")
+    play_parser.add_argument("path", nargs="?", help="recording made with the record command")
+    play_parser.add_argument("--synthetic", type=int, metavar="MINUTES", help="play synthetic traffic instead of a recording")
+    play_parser.add_argument("--target", choices=["inprocess", "mqtt"], default="inprocess")
+    play_parser.add_argument("--host", default="localhost", help="broker for --target mqtt")
+    play_parser.add_argument("--port", type=int, default=1883)
+    play_parser.add_argument("--speed", type=float, default=1.0, help="time acceleration, 1 to 1000")
+    play_parser.add_argument("--virtual-meters", type=int, default=0)
+    args = parser.parse_args()
+
+    config = load_allocation.read_meter_config()
+    if args.command == "record":
+        load_dotenv()
+        record(config, args.path, args.minutes, os.getenv("METER_MQTT_USER"), os.getenv("METER_MQTT_PASS"))
+    else:
+        if not 1 <= args.speed <= 1000:
+            parser.error("--speed must be between 1 and 1000")
+        if args.synthetic:
+            messages = synthesize_recording(config, args.synthetic)
+        elif args.path:
+            messages = read_recording(args.path)
+        else:
+            parser.error("give a recording or --synthetic MINUTES")
+        messages = fan_out(messages, args.virtual_meters, config["transformer"])
+
+        if args.target == "mqtt":
+            play_to_broker(messages, args.speed, args.host, args.port)
+        else:
+            logging.getLogger("pypsa").setLevel(logging.WARNING)
+            network = ku_grid_model.create_network()
+            config = get_virtual_config(config, args.virtual_meters)
+            play_in_process(messages, config, args.speed, network)
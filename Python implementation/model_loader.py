@@ -0,0 +1,109 @@
+"""
+Grid models read from tables instead of individual network.add() calls.
+
+A model is a directory with one table per component, as CSV (or Parquet, which
+is preferred when both exist and pyarrow is installed):
+
+    buses.csv           name, v_nom, x, y, display_name, in_service
+    lines.csv           name, bus0, bus1, length (km), line_type, in_service
+    line_types.csv      name, r_per_km, x_per_km (ohm/km)
+    loads.csv           name, bus, p_set (MW), power_factor
+    transformers.csv    name, bus0, bus1, model, r, x, s_nom
+    generators.csv      name, bus, control
+
+Rows with in_service = 0 stay in the tables but are left out of the network,
+together with every line, load or generator connected to them. Every component
+type is inserted with a single network.add() call, and the display names and
+line resistances used by buses_and_lines come from the same tables.
+"""
+
+import os
+from typing import NamedTuple
+
+# the KU distribution grid
+KU_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ku_grid")
+
+COMPONENT_TABLES = ["buses", "lines", "line_types", "loads", "transformers", "generators"]
+
+
+class GridModel(NamedTuple):
+    # one DataFrame per table, indexed by name, in the order of the files
+    buses: "pd.DataFrame"
+    lines: "pd.DataFrame"
+    line_types: "pd.DataFrame"
+    loads: "pd.DataFrame"
+    transformers: "pd.DataFrame"
+    generators: "pd.DataFrame"
+
+
+def read_table(directory: str, table: str):
+    # pandas and PyPSA are imported when a model is actually read, so that listing
+    # the model files (for the cache key of grid_cache) stays cheap
+    import pandas as pd
+    parquet_path = os.path.join(directory, table + ".parquet")
+    if os.path.exists(parquet_path):
+        try:
+            return pd.read_parquet(parquet_path).set_index("name")
+        except ImportError:
+            # no parquet engine installed, fall back to the csv copy
+            pass
+    return pd.read_csv(os.path.join(directory, table + ".csv"), index_col="name")
+
+
+def get_model_files(directory: str):
+    # the files a model is read from
+    return sorted(os.path.join(directory, file_name) for file_name in os.listdir(directory)
+                  if os.path.splitext(file_name)[0] in COMPONENT_TABLES)
+
+
+def read_model(directory=KU_MODEL_DIR) -> GridModel:
+    model = GridModel(*(read_table(directory, table) for table in COMPONENT_TABLES))
+
+    # resistance and reactance of every line from its conductor type
+    lines = model.lines.copy()
+    line_types = model.line_types.loc[lines.line_type]
+    lines["r"] = line_types.r_per_km.to_numpy()*lines.length
+    lines["x"] = line_types.x_per_km.to_numpy()*lines.length
+    return model._replace(lines=lines)
+
+
+def get_in_service(model: GridModel) -> GridModel:
+    # the part of the model that goes into the network
+    buses = model.buses[model.buses.in_service.astype(bool)]
+    lines = model.lines[model.lines.in_service.astype(bool)
+                        & model.lines.bus0.isin(buses.index) & model.lines.bus1.isin(buses.index)]
+    transformers = model.transformers[model.transformers.bus0.isin(buses.index)
+                                      & model.transformers.bus1.isin(buses.index)]
+    return model._replace(buses=buses, lines=lines, transformers=transformers,
+                          loads=model.loads[model.loads.bus.isin(buses.index)],
+                          generators=model.generators[model.generators.bus.isin(buses.index)])
+
+
+def create_network(model: GridModel):
+    import pypsa
+    model = get_in_service(model)
+    network = pypsa.Network()
+
+    def add(component, table, columns):
+        network.add(component, table.index, **{column: table[column].to_numpy() for column in columns})
+
+    add("Bus", model.buses, ["v_nom", "x", "y"])
+    add("Generator", model.generators, ["bus", "control"])
+    add("Transformer", model.transformers, ["bus0", "bus1", "model", "r", "x", "s_nom"])
+    add("Line", model.lines, ["bus0", "bus1", "length", "r", "x"])
+
+    loads = model.loads.copy()
+    tan_phi = (1 - loads.power_factor**2)**0.5/loads.power_factor
+    loads["q_set"] = loads.p_set*tan_phi
+    add("Load", loads, ["bus", "p_set", "q_set"])
+    return network
+
+
+def get_bus_names(model: GridModel) -> dict:
+    # bus -> name shown on the map
+    return model.buses.display_name.to_dict()
+
+
+def get_line_resistances(model: GridModel) -> dict:
+    # line -> resistance in ohm
+    return model.lines.r.to_dict()
@@ -0,0 +1,117 @@
+"""
+Writes the files the viewers load (the map page, the grid state) safely and
+only when they change.
+
+publish(name, content) takes the complete content of a file, rendered in
+memory, and
+
+    - hashes it (SHA-256) and does nothing if the file already has that content,
+      so a quiet period causes no disk or sync traffic at all
+    - writes it to a temporary file in the same directory and renames it over
+      the old one, so readers and sync clients (the map lives in a Google Drive
+      folder) only ever see a complete file
+    - writes compressed copies next to it the same way: name.gz and, when the
+      brotli package is installed, name.br
+    - records the ETag, size and encodings of the file in manifest.json, which
+      is written last
+
+publish() may be called from several threads (the solver, the contingency
+and the probabilistic cycles); a lock keeps the files and the manifest
+consistent, and every write gets its own temporary file.
+
+live_server uses the manifest to answer with the compressed copies and with
+304 Not Modified to viewers that already have the current version.
+"""
+
+import os
+import json
+import time
+import threading
+import gzip
+import hashlib
+import datetime
+try:
+    import brotli
+except ImportError:
+    # only the gzip copies are written
+    brotli = None
+
+MANIFEST_FILE = "manifest.json"
+# file suffix of every encoding
+ENCODINGS = {"gzip": ".gz", "br": ".br"}
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        # no time stamp in the header, so equal content gives equal bytes
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    return brotli.compress(data, quality=5)
+
+
+def write_atomic(path: str, data: bytes, attempts=5):
+    # one temporary file per process and thread, so concurrent writers never share one
+    # (mkstemp would also be unique, but its files are readable by the owner only)
+    temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temporary_path, 'wb') as f:
+            f.write(data)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+    for attempt in range(attempts):
+        try:
+            os.replace(temporary_path, path)
+            return
+        except PermissionError:
+            # on Windows a reader holding the file open blocks the rename for a moment
+            if attempt == attempts - 1:
+                os.remove(temporary_path)
+                raise
+            time.sleep(0.05)
+
+
+class OutputSink:
+    def __init__(self, directory: str, encodings=("gzip", "br")):
+        self.directory = directory
+        self.encodings = [encoding for encoding in encodings if encoding != "br" or brotli is not None]
+        self.manifest_path = os.path.join(directory, MANIFEST_FILE)
+        self.counters = {"written": 0, "unchanged": 0}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # the files published before a restart count as unchanged if they are still there
+        self.manifest = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = {name: entry for name, entry in json.load(f).items()
+                                 if os.path.exists(os.path.join(directory, name))}
+
+    def publish(self, name: str, content) -> bool:
+        # returns False if the file already had this content
+        data = content.encode('utf-8') if isinstance(content, str) else bytes(content)
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            entry = self.manifest.get(name)
+            if entry is not None and entry["sha256"] == digest:
+                self.counters["unchanged"] += 1
+                return False
+
+            path = os.path.join(self.directory, name)
+            write_atomic(path, data)
+            sizes = {}
+            for encoding in self.encodings:
+                compressed = compress(data, encoding)
+                write_atomic(path + ENCODINGS[encoding], compressed)
+                sizes[encoding] = len(compressed)
+
+            self.manifest[name] = {"sha256": digest,
+                                   "etag": f'"{digest[:32]}"',
+                                   "size": len(data),
+                                   "encodings": sizes,
+                                   "modified": datetime.datetime.now().isoformat(timespec="seconds")}
+            write_atomic(self.manifest_path, json.dumps(self.manifest, indent=1).encode('utf-8'))
+            self.counters["written"] += 1
+            return True
+
+    def get_entry(self, name: str):
+        # manifest entry of a published file, None if it was not published by this sink
+        return self.manifest.get(name)
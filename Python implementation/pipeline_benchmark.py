@@ -0,0 +1,219 @@
+"""
+Stage by stage timing of one cycle of the live loop.
+
+Every grid is put through the same steps as a cycle of main.py, and each step
+is timed on its own:
+
+    load_update   a batch with one message per meter through MeterIngestService.handle_batch
+    pf            network.pf(), reported as failed if it runs out of memory, in which
+                  case the radial sweep solves the network for the later stages
+    metrics       bus and line metrics plus the top CRITICAL_ELEMENTS_K critical bus and line tables
+    render        live_map.render_full_map()
+    save          map.save() plus the auto-refresh rewrite
+    state         the grid state document of RENDER_MODE = "state"
+    geojson       the feature collection of RENDER_MODE = "geojson"
+
+The grids are the KU model of ku_grid_model.create_network() and synthetic
+radial feeders of the given sizes. The results are written as JSON together
+with the commit they were measured on, so runs can be compared between commits.
+
+usage: python pipeline_benchmark.py [--sizes 1000 10000 50000] [--repeat 3]
+                                    [--skip STAGE ...] [--output pipeline_benchmark.json]
+"""
+
+import os
+import sys
+import json
+import time
+import datetime
+import argparse
+import tempfile
+import subprocess
+import logging
+import numpy as np
+import pypsa
+import ku_grid_model
+import load_allocation
+import grid_metrics
+import arrow_geometry
+import buses_and_lines
+import live_map
+import grid_state
+import grid_geojson
+import critical_elements
+import meter_replay
+import radial_sweep
+import feeder_generator
+from load_state import LoadState
+from meter_ingest import MeterIngestService
+
+STAGES = ["load_update", "pf", "metrics", "render", "save", "state", "geojson"]
+# rows of the critical element tables, as operators use on large feeders
+CRITICAL_ELEMENTS_K = 20
+
+
+def time_stage(function, repeat: int) -> dict:
+    # wall time of a stage in milliseconds, the result of the last call is kept for the next stage
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - start)*1000)
+    return {"median_ms": float(np.median(timings)), "min_ms": float(np.min(timings)),
+            "max_ms": float(np.max(timings)), "result": result}
+
+
+def get_meter_batch(config: dict, p_set, rng):
+    # one message per building meter and one from the transformer, like a burst after a minute
+    # every meter reads the load it measures (p_set in MW) give or take 50%
+    batch = []
+    total_power = 0.0
+    for device, meter in config["meters"].items():
+        phase_powers = p_set[meter["load"]]*1e6/3*rng.uniform(0.5, 1.5, 3)
+        total_power += phase_powers.sum()
+        batch.append((f"device/{device}/realtime", json.dumps(meter_replay.get_payload(phase_powers)).encode()))
+    # the transformer also carries the unmetered loads
+    transformer_powers = np.full(3, max(total_power, p_set.sum()*1e6)*1.2/3)
+    batch.append((f"device/{config['transformer']}/realtime", json.dumps(meter_replay.get_payload(transformer_powers)).encode()))
+    return batch
+
+
+def benchmark_grid(network, config: dict, unmetered_shares, repeat: int, skip, output_dir: str, feeder=None) -> dict:
+    # feeder: the feeder_generator.Feeder of network with its names and line resistances, None for the KU grid
+    timings = {}
+    bus_name_table = feeder.bus_names if feeder is not None else buses_and_lines.buses_dict
+
+    def run(stage, function):
+        if stage in skip:
+            return None
+        try:
+            timing = time_stage(function, repeat)
+        except MemoryError as error:
+            # e.g. network.pf() builds dense bus matrices that do not fit for the largest feeders
+            timings[stage] = {"error": f"MemoryError: {error}"}
+            return None
+        result = timing.pop("result")
+        timings[stage] = timing
+        return result
+
+    line_resistances = grid_metrics.get_line_resistances(network, feeder.line_resistances if feeder is not None else None)
+    load_state = LoadState(network.loads.index, network.loads.p_set, network.loads.q_set,
+                           load_allocation.get_metered_loads(config), unmetered_shares)
+    ingest = MeterIngestService(config, load_state)
+    batch = get_meter_batch(config, network.loads.p_set, np.random.default_rng(0))
+    run("load_update", lambda: ingest.handle_batch(batch))
+    network.loads['p_set'], network.loads['q_set'] = load_state.snapshot()
+
+    run("pf", network.pf)
+    # the metrics and everything after them need a solved network
+    if "median_ms" not in timings.get("pf", {}):
+        radial_sweep.run_sweep(network)
+
+    # looked up once at startup, like grid.bus_display_names in main.py
+    bus_names = np.array([bus_name_table.get(bus_name, bus_name) for bus_name in network.buses.index])
+
+    def metrics():
+        bus_metrics = grid_metrics.compute_bus_metrics(network)
+        line_metrics = grid_metrics.compute_line_metrics(network, line_resistances)
+        critical_tables = critical_elements.get_critical_tables(bus_metrics, line_metrics, bus_names,
+                                                                k=CRITICAL_ELEMENTS_K)
+        return bus_metrics, line_metrics, critical_tables
+
+    bus_metrics, line_metrics, critical_tables = metrics()
+    run("metrics", metrics)
+
+    # the arrowheads are computed once at startup in main.py, so they are not part of the cycle
+    arrowheads = arrow_geometry.build_arrowhead_cache(network)
+    render = lambda: live_map.render_full_map(network, arrowheads, bus_metrics, line_metrics, critical_tables,
+                                              bus_names=bus_name_table)
+    map = run("render", render)
+    map_path = os.path.join(output_dir, "ku_grid.html")
+    if "save" not in skip:
+        if map is None:
+            map = render()
+        run("save", lambda: live_map.save_full_map(map, map_path))
+
+    state_path = os.path.join(output_dir, "ku_grid_state.js")
+    run("state", lambda: grid_state.save_grid_state(state_path, grid_state.get_grid_state(
+        datetime.datetime.now(), bus_metrics, line_metrics, critical_tables)))
+
+    geometry = grid_geojson.get_grid_geometry(network, bus_names)
+    features_path = os.path.join(output_dir, "ku_grid_features.js")
+    run("geojson", lambda: grid_geojson.save_feature_collection(features_path, grid_geojson.get_feature_collection(
+        geometry, datetime.datetime.now(), bus_metrics, line_metrics, critical_tables)))
+
+    # size of what a viewer downloads every cycle
+    output_bytes = {stage: os.path.getsize(path) for stage, path in
+                    [("save", map_path), ("state", state_path), ("geojson", features_path)]
+                    if stage not in skip}
+    return {"buses": len(network.buses), "lines": len(network.lines), "loads": len(network.loads),
+            "meters": len(config["meters"]) + 1, "stages": timings, "output_bytes": output_bytes}
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_header():
+    print(f"{'grid':>11} {'buses':>7}" + "".join(f" {stage:>12}" for stage in STAGES) + "   (median ms)")
+
+
+def print_result(result):
+    stages = result["stages"]
+    columns = []
+    for stage in STAGES:
+        if stage not in stages:
+            columns.append(f" {'-':>12}")
+        elif "error" in stages[stage]:
+            columns.append(f" {'failed':>12}")
+        else:
+            columns.append(f" {stages[stage]['median_ms']:>12.1f}")
+    print(f"{result['grid']:>11} {result['buses']:>7}" + "".join(columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time every stage of the live loop on grids of growing size")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000, 50000],
+                        help="number of buses of the synthetic feeders")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip", nargs="+", default=[], choices=STAGES, help="stages not to time")
+    parser.add_argument("--output", default="pipeline_benchmark.json", help="JSON file for the results")
+    args = parser.parse_args()
+    logging.getLogger("pypsa").setLevel(logging.WARNING)
+    # the fault icon is read from disk while rendering
+    live_map.FLASH_URL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images", "flash2.png")
+
+    config = load_allocation.read_meter_config()
+    results = []
+    print_header()
+    with tempfile.TemporaryDirectory() as output_dir:
+        network = ku_grid_model.create_network()
+        result = {"grid": "ku"}
+        result.update(benchmark_grid(network, config, None, args.repeat, args.skip, output_dir))
+        results.append(result)
+        print_result(result)
+
+        for n_buses in args.sizes:
+            feeder = feeder_generator.create_feeder(n_buses)
+            network = feeder.network
+            # a virtual meter on every load of the synthetic feeder and no unmetered loads
+            feeder_config = meter_replay.get_virtual_config(dict(config, meters={}), len(network.loads),
+                                                            list(network.loads.index))
+            result = {"grid": f"feeder{n_buses}"}
+            result.update(benchmark_grid(network, feeder_config, {}, args.repeat, args.skip, output_dir, feeder))
+            results.append(result)
+            print_result(result)
+
+    report = {"commit": get_commit(),
+              "created": datetime.datetime.now().isoformat(timespec="seconds"),
+              "python": sys.version.split()[0],
+              "pypsa": pypsa.__version__,
+              "repeat": args.repeat,
+              "results": results}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
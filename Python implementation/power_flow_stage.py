@@ -0,0 +1,48 @@
+import numpy as np
+import radial_sweep
+
+# largest change of any load (MW or MVAr) that is still treated as "unchanged"
+DEFAULT_TOLERANCE = 1e-6
+
+
+class PowerFlowStage:
+    # runs the power flow of the live loop, remembering the last load vector and solution
+    #  - if no load changed by more than the tolerance, the solve is skipped and the
+    #    previous results in network.buses_t/lines_t are reused
+    #  - otherwise the solver starts from the previous voltages (warm start)
+    #  - the very first solve starts from a flat profile (cold start)
+    def __init__(self, network, solver="newton", tolerance=DEFAULT_TOLERANCE):
+        self.network = network
+        self.solver = solver
+        self.tolerance = tolerance
+        self.counters = {"skipped": 0, "warm": 0, "cold": 0}
+        self.last_loads = None
+        self.last_voltages = None
+        if solver == "sweep":
+            # parent/child ordering of the feeder, computed once
+            self.radial_topology = radial_sweep.build_topology(network)
+
+    def get_loads(self) -> np.ndarray:
+        return np.concatenate([self.network.loads.p_set.to_numpy(), self.network.loads.q_set.to_numpy()])
+
+    def solve(self) -> bool:
+        # returns False if the solve was skipped because the loads did not change
+        loads = self.get_loads()
+        if self.last_loads is not None and np.abs(loads - self.last_loads).max() <= self.tolerance:
+            self.counters["skipped"] += 1
+            return False
+
+        warm = self.last_loads is not None
+        if self.solver == "sweep":
+            self.last_voltages = radial_sweep.run_sweep(self.network, self.radial_topology,
+                                                        v0=self.last_voltages)
+        elif warm:
+            # the topology has not changed, so the dependent values of the last solve are still valid
+            self.network.pf(use_seed=True, skip_pre=True)
+        else:
+            # perform newton Raphson Load Flow
+            self.network.pf()
+
+        self.counters["warm" if warm else "cold"] += 1
+        self.last_loads = loads
+        return True
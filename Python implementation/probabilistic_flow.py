@@ -0,0 +1,198 @@
+"""
+Probabilistic load flow of the unmetered loads (Monte Carlo).
+
+Only the building meters and the transformer are measured. The rest of the
+power (transformer minus buildings) is split over the unmetered loads by their
+circuit breaker rating (load_allocation.UNMETERED_SHARES) at a power factor of
+0.95, which is a guess. Here both are sampled instead:
+
+    shares          Dirichlet distribution around the breaker rating shares, so
+                    every sample still adds up to the unmetered power;
+                    concentration sets the spread, larger is closer to the
+                    breaker rating shares
+    power factors   normal distribution around load_allocation.PF, clipped to
+                    pf_range, independently for every unmetered load
+
+The metered loads keep their measured values. A batch of samples is solved as
+one radial sweep with a column per sample (radial_sweep.sweep with s_load of
+shape (buses, samples)), so thousands of samples take about as many sweeps as
+there are batches instead of one network.pf() each. A sample whose sweep does
+not converge, e.g. an extreme draw of the shares, is left out of the report
+and counted as skipped.
+
+The report gives for every bus the percentiles of |V| and the probability of
+being outside grid_metrics.VOLTAGE_LIMITS, and for every line the percentiles
+of the loading and the probability of a loading above 100%: a line drawn red
+with an overload probability of 3% is an artefact of the allocation, one with
+90% is not. |V| and loading of every sample are kept (float32) until the
+percentiles are computed, about 8 bytes per bus and line and sample.
+
+usage: python probabilistic_flow.py [--samples 5000] [--batch 500] [--concentration 50] [--seed 1] [--output report.json]
+"""
+
+import json
+import time
+import argparse
+from typing import NamedTuple
+import numpy as np
+import radial_sweep
+import grid_metrics
+import load_allocation
+
+DEFAULT_SAMPLES = 5000
+# samples solved together in one sweep
+DEFAULT_BATCH = 500
+PERCENTILES = (5, 50, 95)
+# lines above this loading (%) are overloaded
+OVERLOAD_LIMIT = grid_metrics.LOADING_LIMITS[1]
+
+
+class LoadUncertainty(NamedTuple):
+    concentration: float = 50.0         # of the Dirichlet distribution of the shares
+    pf_mean: float = load_allocation.PF
+    pf_std: float = 0.02
+    pf_range: tuple = (0.85, 1.0)
+
+
+class ProbabilisticReport(NamedTuple):
+    samples: int                        # converged samples, the ones the report is made of
+    skipped: int                        # samples whose sweep did not converge
+    seconds: float
+    unmetered_power: float              # MW, split over the unmetered loads by every sample
+    v_percentiles: np.ndarray           # (PERCENTILES, buses) |V| in p.u.
+    voltage_violation: np.ndarray       # probability of every bus being outside the voltage limits
+    loading_percentiles: np.ndarray     # (PERCENTILES, lines) loading in %
+    overload: np.ndarray                # probability of every line being loaded above OVERLOAD_LIMIT
+
+
+def sample_unmetered(rng, shares, samples: int, uncertainty: LoadUncertainty):
+    # returns the share of the unmetered power and tan(phi) of every unmetered load, shape (loads, samples)
+    shares = np.asarray(shares, dtype=float)
+    total = shares.sum()
+    sampled_shares = rng.dirichlet(uncertainty.concentration*shares/total, size=samples).T*total
+    pf = np.clip(rng.normal(uncertainty.pf_mean, uncertainty.pf_std, (len(shares), samples)), *uncertainty.pf_range)
+    return sampled_shares, np.sqrt(1 - pf**2)/pf
+
+
+def get_unmetered_power(p_set, unmetered_loads, shares) -> float:
+    # the unmetered power (MW) the current allocation was split from
+    return float(np.asarray(p_set)[unmetered_loads].sum()/np.sum(shares))
+
+
+def run(grid, p_set, q_set, unmetered_loads, unmetered_shares, samples=DEFAULT_SAMPLES, batch_size=DEFAULT_BATCH,
+        uncertainty=LoadUncertainty(), rng=None) -> ProbabilisticReport:
+    # grid: grid_cache.CompiledGrid, p_set, q_set: the current loads (MW, MVAr) in the order of grid.load_names
+    # unmetered_loads: positions of the unmetered loads in p_set, unmetered_shares: their breaker rating shares
+    start = time.perf_counter()
+    if rng is None:
+        rng = np.random.default_rng()
+    p_set = np.asarray(p_set, dtype=float)
+    unmetered_loads = np.asarray(unmetered_loads)
+    unmetered_power = get_unmetered_power(p_set, unmetered_loads, unmetered_shares)
+
+    # the metered loads, the same in every sample
+    s_metered = np.zeros(len(grid.bus_names), dtype=complex)
+    metered = np.ones(len(p_set), dtype=bool)
+    metered[unmetered_loads] = False
+    np.add.at(s_metered, grid.load_buses[metered], p_set[metered] + 1j*np.asarray(q_set)[metered])
+    unmetered_buses = grid.load_buses[unmetered_loads]
+
+    v_mag = np.empty((len(grid.bus_names), samples), dtype=np.float32)
+    loading = np.empty((len(grid.line_names), samples), dtype=np.float32)
+    v0 = None
+    # converged samples so far, kept at the front of v_mag and loading
+    kept = 0
+    for first in range(0, samples, batch_size):
+        n = min(batch_size, samples - first)
+        shares, tan_phi = sample_unmetered(rng, unmetered_shares, n, uncertainty)
+        p = unmetered_power*shares
+        s_load = np.repeat(s_metered[:, None], n, axis=1)
+        np.add.at(s_load, unmetered_buses, p + 1j*p*tan_phi)
+
+        # every batch starts from the mean voltages of the previous one
+        # a diverging sample overflows in its own column only
+        with np.errstate(all='ignore'):
+            v, i_branch, iterations, converged = radial_sweep.sweep_cases(
+                grid.topology, s_load, v0=None if v0 is None else np.repeat(v0[:, None], n, axis=1))
+        if not converged.any():
+            continue
+        v, i_branch = v[:, converged], i_branch[:, converged]
+        v0 = v.mean(axis=1)
+        s0, s1 = radial_sweep.get_branch_flows(grid.topology, v, i_branch)
+        m = int(converged.sum())
+        v_mag[:, kept:kept + m] = np.abs(v)
+        loading[:, kept:kept + m] = np.abs(s0[grid.line_branches])/grid_metrics.S_NOM_ASSUMED*100
+        kept += m
+
+    if kept == 0:
+        raise RuntimeError(f"none of the {samples} samples converged")
+    v_mag, loading = v_mag[:, :kept], loading[:, :kept]
+    lower, upper = grid_metrics.VOLTAGE_LIMITS
+    return ProbabilisticReport(samples=kept,
+                               skipped=samples - kept,
+                               seconds=time.perf_counter() - start,
+                               unmetered_power=unmetered_power,
+                               v_percentiles=np.percentile(v_mag, PERCENTILES, axis=1),
+                               voltage_violation=((v_mag < lower) | (v_mag > upper)).mean(axis=1),
+                               loading_percentiles=np.percentile(loading, PERCENTILES, axis=1),
+                               overload=(loading > OVERLOAD_LIMIT).mean(axis=1))
+
+
+def get_report_dict(report: ProbabilisticReport, bus_names, line_names) -> dict:
+    # every bus and line with its percentiles and violation probability, e.g. to publish as JSON
+    return {"samples": report.samples,
+            "skipped_samples": report.skipped,
+            "seconds": round(report.seconds, 3),
+            "unmetered_kw": round(report.unmetered_power*1000, 3),
+            "percentiles": list(PERCENTILES),
+            "buses": [{"bus": str(name), "v": [round(float(v), 5) for v in percentiles],
+                       "p_violation": round(float(probability), 4)}
+                      for name, percentiles, probability
+                      in zip(bus_names, report.v_percentiles.T, report.voltage_violation)],
+            "lines": [{"line": str(name), "loading": [round(float(loading), 2) for loading in percentiles],
+                       "p_overload": round(float(probability), 4)}
+                      for name, percentiles, probability
+                      in zip(line_names, report.loading_percentiles.T, report.overload)]}
+
+
+def print_report(report_dict: dict, top=10):
+    p_low, p_mid, p_high = (f"p{q}" for q in report_dict["percentiles"])
+    print(f"{report_dict['samples']} samples of {report_dict['unmetered_kw']:.1f} kW unmetered power"
+          f" in {report_dict['seconds']:.2f} s, {report_dict['skipped_samples']} did not converge")
+    print(f"buses, lowest {p_low} first:           {p_low:>7} {p_mid:>7} {p_high:>7}  P(outside limits)")
+    for bus in sorted(report_dict["buses"], key=lambda bus: bus["v"][0])[:top]:
+        print(f"  {bus['bus']:>30}  " + " ".join(f"{v:7.4f}" for v in bus["v"]) + f"  {bus['p_violation']:8.1%}")
+    print(f"lines, highest {p_high} first:         {p_low:>7} {p_mid:>7} {p_high:>7}  P(overload)")
+    for line in sorted(report_dict["lines"], key=lambda line: -line["loading"][-1])[:top]:
+        print(f"  {line['line']:>30}  " + " ".join(f"{loading:7.1f}" for loading in line["loading"])
+              + f"  {line['p_overload']:8.1%}")
+
+
+if __name__ == "__main__":
+    import grid_cache
+    from load_state import LoadState
+
+    parser = argparse.ArgumentParser(description="Monte Carlo load flow of the unmetered loads of the KU grid")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES)
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH, help="samples solved together")
+    parser.add_argument("--concentration", type=float, default=LoadUncertainty().concentration,
+                        help="of the Dirichlet distribution of the shares, larger is closer to the breaker ratings")
+    parser.add_argument("--pf-std", type=float, default=LoadUncertainty().pf_std,
+                        help="standard deviation of the power factors")
+    parser.add_argument("--seed", type=int, help="of the random numbers, for repeatable reports")
+    parser.add_argument("--top", type=int, default=10, help="buses and lines printed")
+    parser.add_argument("--output", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    grid, grid_cached = grid_cache.load_compiled_grid()
+    # the loads of the model stand in for the current meter readings
+    load_state = LoadState(grid.load_names, grid.p_set, grid.q_set)
+    p_set, q_set = load_state.snapshot()
+    report = run(grid, p_set, q_set, load_state.unmetered_loads, load_state.unmetered_shares,
+                 args.samples, args.batch, LoadUncertainty(concentration=args.concentration, pf_std=args.pf_std),
+                 np.random.default_rng(args.seed))
+    report_dict = get_report_dict(report, grid.bus_display_names, grid.line_names)
+    print_report(report_dict, args.top)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report_dict, f, indent=2)
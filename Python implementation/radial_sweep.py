@@ -0,0 +1,209 @@
+"""
+Backward/forward sweep power flow for radial networks.
+
+The KU feeder is a tree fed from a single slack bus, so instead of PyPSA's
+general Newton-Raphson the power flow can be solved by sweeping currents from
+the leaves to the slack (backward) and voltage drops from the slack to the
+leaves (forward). The parent/child ordering of the tree is computed once in
+build_topology(), and every sweep handles a whole depth level of branches with
+one vectorised NumPy operation.
+
+All quantities are in per unit on a 1 MVA base, the same base PyPSA uses, so the
+results can be written straight into buses_t and lines_t.
+"""
+
+from typing import NamedTuple
+import numpy as np
+
+
+# pandas is only needed to read and write PyPSA networks, so sweep() on a prepared
+# topology runs with NumPy alone
+class RadialTopology(NamedTuple):
+    bus_names: "pd.Index"
+    slack: int                  # index of the slack bus
+    v_slack: float              # voltage magnitude set point of the slack bus (p.u.)
+    branch_component: np.ndarray    # "Line" or "Transformer"
+    branch_names: np.ndarray
+    parent: np.ndarray          # bus closer to the slack, one entry per branch
+    child: np.ndarray           # bus further from the slack, one entry per branch
+    parent_is_bus0: np.ndarray  # True if the parent is bus0 of the branch
+    z: np.ndarray               # series impedance of every branch (p.u.)
+    levels: list                # branch indices grouped by depth, starting at the slack
+
+
+def build_topology(network) -> RadialTopology:
+    # orders the branches of a radial network from the slack bus outwards
+    import pandas as pd
+    network.calculate_dependent_values()
+    bus_names = network.buses.index
+    slack_generators = network.generators.index[network.generators.control == "Slack"]
+    if len(slack_generators) != 1:
+        raise ValueError("radial sweep needs exactly one slack generator")
+    slack = bus_names.get_loc(network.generators.bus[slack_generators[0]])
+
+    branches = pd.concat([network.lines[['bus0', 'bus1', 'r_pu_eff', 'x_pu_eff']].assign(component="Line"),
+                          network.transformers[['bus0', 'bus1', 'r_pu_eff', 'x_pu_eff']].assign(component="Transformer")])
+    if len(branches) != len(bus_names) - 1:
+        raise ValueError(f"network is not radial: {len(bus_names)} buses but {len(branches)} branches")
+    bus0 = bus_names.get_indexer(branches.bus0)
+    bus1 = bus_names.get_indexer(branches.bus1)
+
+    # breadth first search from the slack bus
+    neighbours = [[] for _ in range(len(bus_names))]
+    for branch, (b0, b1) in enumerate(zip(bus0, bus1)):
+        neighbours[b0].append((branch, b1))
+        neighbours[b1].append((branch, b0))
+
+    parent = np.empty(len(branches), dtype=int)
+    child = np.empty(len(branches), dtype=int)
+    visited = np.zeros(len(bus_names), dtype=bool)
+    visited[slack] = True
+    levels = []
+    frontier = [slack]
+    while frontier:
+        level = []
+        next_frontier = []
+        for bus in frontier:
+            for branch, other in neighbours[bus]:
+                if visited[other]:
+                    continue
+                visited[other] = True
+                parent[branch] = bus
+                child[branch] = other
+                level.append(branch)
+                next_frontier.append(other)
+        if level:
+            levels.append(np.array(level))
+        frontier = next_frontier
+    if not visited.all():
+        raise ValueError("network is not radial: some buses are not connected to the slack bus")
+
+    return RadialTopology(bus_names=bus_names,
+                          slack=slack,
+                          v_slack=float(network.buses.v_mag_pu_set.iloc[slack]),
+                          branch_component=branches.component.to_numpy(),
+                          branch_names=branches.index.to_numpy(),
+                          parent=parent,
+                          child=child,
+                          parent_is_bus0=parent == bus0,
+                          z=(branches.r_pu_eff + 1j*branches.x_pu_eff).to_numpy(),
+                          levels=levels)
+
+
+def sweep(topology: RadialTopology, s_load, tol=1e-8, max_iter=100, v0=None):
+    # s_load: complex power drawn at every bus (MW + j MVAr), shape (buses,) or (buses, cases)
+    # v0: optional starting voltages of the same shape, e.g. the previous solution
+    # returns the complex bus voltages and branch currents (parent to child) in p.u.
+    v, i_branch, iterations, converged = sweep_cases(topology, s_load, tol, max_iter, v0)
+    if not converged.all():
+        raise RuntimeError(f"radial sweep did not converge in {max_iter} iterations")
+    return v, i_branch, iterations
+
+
+def sweep_cases(topology: RadialTopology, s_load, tol=1e-8, max_iter=100, v0=None):
+    # sweep() that does not raise when some cases do not converge: returns the voltages,
+    # branch currents, iterations and whether every case (column) converged, shape s_load.shape[1:]
+    # the cases are independent, so one diverging case does not disturb the others
+    s_load = np.asarray(s_load, dtype=complex)
+    if v0 is not None and np.shape(v0) == s_load.shape:
+        v = np.array(v0, dtype=complex)
+    else:
+        v = np.full(s_load.shape, topology.v_slack, dtype=complex)
+    i_branch = np.zeros((len(topology.parent),) + s_load.shape[1:], dtype=complex)
+
+    for iteration in range(max_iter):
+        # backward sweep: current drawn at every bus plus everything below it
+        i_node = np.conj(s_load/v)
+        for level in reversed(topology.levels):
+            i_branch[level] = i_node[topology.child[level]]
+            np.add.at(i_node, topology.parent[level], i_branch[level])
+
+        # forward sweep: voltage drop along every branch, starting at the slack
+        v_new = np.empty_like(v)
+        v_new[topology.slack] = topology.v_slack
+        for level in topology.levels:
+            z = topology.z[level].reshape((-1,) + (1,)*(v.ndim - 1))
+            v_new[topology.child[level]] = v_new[topology.parent[level]] - z*i_branch[level]
+
+        # largest voltage change of every case
+        converged = np.abs(v_new - v).reshape(len(v), -1).max(axis=0) < tol
+        v = v_new
+        if converged.all():
+            break
+    return v, i_branch, iteration + 1, converged.reshape(s_load.shape[1:])
+
+
+def get_branch_flows(topology: RadialTopology, v, i_branch):
+    # power entering every branch at bus0 and bus1 (MW + j MVAr), following PyPSA's sign convention
+    s_parent = v[topology.parent]*np.conj(i_branch)
+    s_child = -v[topology.child]*np.conj(i_branch)
+    mask = topology.parent_is_bus0.reshape((-1,) + (1,)*(v.ndim - 1))
+    return np.where(mask, s_parent, s_child), np.where(mask, s_child, s_parent)
+
+
+def get_bus_loads(network, topology: RadialTopology) -> np.ndarray:
+    # net complex power drawn at every bus, one column per snapshot
+    s_load = np.zeros((len(topology.bus_names), len(network.snapshots)), dtype=complex)
+    loads = (network.get_switchable_as_dense('Load', 'p_set')
+             + 1j*network.get_switchable_as_dense('Load', 'q_set'))
+    np.add.at(s_load, topology.bus_names.get_indexer(network.loads.bus[loads.columns]), loads.to_numpy().T)
+
+    generators = network.generators.index[network.generators.control != "Slack"]
+    if len(generators):
+        injections = (network.get_switchable_as_dense('Generator', 'p_set')[generators]
+                      + 1j*network.get_switchable_as_dense('Generator', 'q_set')[generators])
+        np.subtract.at(s_load, topology.bus_names.get_indexer(network.generators.bus[generators]), injections.to_numpy().T)
+    return s_load
+
+
+def run_sweep(network, topology: RadialTopology = None, tol=1e-8, v0=None):
+    # solves every snapshot of the network and stores the results where network.pf() would
+    # returns the complex bus voltages, which can seed the next solve as v0
+    import pandas as pd
+    if topology is None:
+        topology = build_topology(network)
+    v, i_branch, iterations = sweep(topology, get_bus_loads(network, topology), tol=tol, v0=v0)
+    s0, s1 = get_branch_flows(topology, v, i_branch)
+
+    snapshots = network.snapshots
+    network.buses_t.v_mag_pu = pd.DataFrame(np.abs(v).T, index=snapshots, columns=topology.bus_names)
+    network.buses_t.v_ang = pd.DataFrame(np.angle(v).T, index=snapshots, columns=topology.bus_names)
+    for component, frames in (("Line", network.lines_t), ("Transformer", network.transformers_t)):
+        mask = topology.branch_component == component
+        names = topology.branch_names[mask]
+        frames.p0 = pd.DataFrame(s0[mask].real.T, index=snapshots, columns=names)
+        frames.q0 = pd.DataFrame(s0[mask].imag.T, index=snapshots, columns=names)
+        frames.p1 = pd.DataFrame(s1[mask].real.T, index=snapshots, columns=names)
+        frames.q1 = pd.DataFrame(s1[mask].imag.T, index=snapshots, columns=names)
+    return v
+
+
+def compare_with_pypsa(network, tol=1e-6):
+    # solves copies of the network with network.pf() and with the sweep and
+    # returns the largest differences between the two, raising if any exceeds tol
+    # or network.pf() did not converge; its mismatch stalls around 1e-8, so it is run
+    # at tol and only the sweep well below it
+    newton = network.copy()
+    result = newton.pf(x_tol=tol)
+    unconverged = result["converged"].index[~result["converged"].all(axis=1)]
+    if len(unconverged):
+        raise AssertionError(f"network.pf() did not converge for snapshots {list(unconverged)}, nothing to compare")
+    radial = network.copy()
+    run_sweep(radial, tol=tol*1e-3)
+
+    differences = {
+        "v_mag_pu": (newton.buses_t.v_mag_pu - radial.buses_t.v_mag_pu[newton.buses_t.v_mag_pu.columns]).abs().max().max(),
+        "v_ang": (newton.buses_t.v_ang - radial.buses_t.v_ang[newton.buses_t.v_ang.columns]).abs().max().max(),
+        "p0": (newton.lines_t.p0 - radial.lines_t.p0[newton.lines_t.p0.columns]).abs().max().max(),
+        "q0": (newton.lines_t.q0 - radial.lines_t.q0[newton.lines_t.q0.columns]).abs().max().max(),
+    }
+    for quantity, difference in differences.items():
+        if difference > tol:
+            raise AssertionError(f"{quantity} differs from network.pf() by {difference:.3g} (tolerance {tol:.3g})")
+    return differences
+
+
+if __name__ == "__main__":
+    import ku_grid_model
+    for quantity, difference in compare_with_pypsa(ku_grid_model.create_network()).items():
+        print(f"{quantity}: largest difference from network.pf() = {difference:.3g}")
@@ -0,0 +1,43 @@
+"""
+Per-solve latency of the radial sweep compared with network.pf().
+
+usage: python radial_sweep_benchmark.py [--sizes 50 1000 10000] [--repeat 20] [--skip-pypsa]
+"""
+
+import time
+import argparse
+import logging
+import numpy as np
+import radial_sweep
+import feeder_generator
+
+
+def time_call(function, repeat: int) -> float:
+    # median wall time of a call in milliseconds
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start)*1000)
+    return float(np.median(timings))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the radial sweep against network.pf()")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--skip-pypsa", action="store_true", help="only time the radial sweep")
+    args = parser.parse_args()
+    logging.getLogger("pypsa").setLevel(logging.WARNING)
+
+    print(f"{'buses':>8} {'sweep (ms)':>12} {'pf (ms)':>12} {'max |dV| (pu)':>15}")
+    for n_buses in args.sizes:
+        network = feeder_generator.create_feeder(n_buses).network
+        topology = radial_sweep.build_topology(network)
+        sweep_ms = time_call(lambda: radial_sweep.run_sweep(network, topology), args.repeat)
+        if args.skip_pypsa:
+            print(f"{n_buses:>8} {sweep_ms:>12.2f} {'-':>12} {'-':>15}")
+            continue
+        pf_ms = time_call(network.pf, max(1, args.repeat//5))
+        error = radial_sweep.compare_with_pypsa(network)["v_mag_pu"]
+        print(f"{n_buses:>8} {sweep_ms:>12.2f} {pf_ms:>12.2f} {error:>15.2e}")
@@ -0,0 +1,312 @@
+"""
+Voltage and flow sensitivities for instant what-if questions.
+
+Around the latest solution, a change of the power drawn at a few buses moves
+the voltages and flows of the whole feeder almost linearly. The sensitivities
+per MW and MVAr drawn at every candidate bus (by default every bus with a
+load) are
+
+    dv_dp, dv_dq            |V| of every bus (p.u.)
+    dflow_dp, dflow_dq      complex power entering every branch at bus0 (MW + j MVAr),
+                            i.e. the flow distribution factors
+
+and a what-if question ("Load49 doubles", "a 22 kW charger at LVB30") is one
+matrix multiply of the columns of the changed buses with their changes, for
+one or many scenarios at once (one column each), instead of a power flow.
+
+The sensitivities come from the Jacobian of the power flow equations of the
+radial topology at the operating point: it is factorised once (scipy splu)
+and solved for a unit load at every candidate bus. SensitivityModel.update()
+is called with every new solution and only recomputes them when the voltage
+of some bus drifted by more than DRIFT_TOLERANCE since, so a quiet feeder
+costs nothing.
+
+get_hosting_capacity() turns the sensitivities into the extra load every
+candidate bus can take before a bus leaves the voltage limits or a line
+exceeds 100% loading, e.g. to approve EV chargers.
+
+The answers are linearised: accurate for changes that are small against the
+load of the feeder, optimistic for large ones. The command line compares a
+what-if answer with a full sweep.
+
+usage: python sensitivity.py [--load Load49] [--factor 2] [--buses 10000] [--candidates 200] [--queries 10000]
+"""
+
+import time
+import argparse
+from typing import NamedTuple
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+import radial_sweep
+import grid_metrics
+
+# the sensitivities are recomputed when |V| of a bus moved more than this (p.u.)
+DRIFT_TOLERANCE = 0.002
+
+
+class Sensitivities(NamedTuple):
+    v: np.ndarray               # complex bus voltages of the operating point
+    s0: np.ndarray              # complex power entering every branch at bus0 (MW + j MVAr)
+    candidates: np.ndarray      # bus index of every column
+    # one row per MW drawn at every candidate, then one per MVAr, so the rows a question
+    # needs are contiguous in memory
+    dv: np.ndarray              # (2*candidates, buses) change of |V| in p.u.
+    dflow: np.ndarray           # (2*candidates, branches) complex change of s0
+    seconds: float
+
+    @property
+    def dv_dp(self) -> np.ndarray:
+        # (buses, candidates) p.u. per MW drawn
+        return self.dv[:len(self.candidates)].T
+
+    @property
+    def dv_dq(self) -> np.ndarray:
+        return self.dv[len(self.candidates):].T
+
+    @property
+    def dflow_dp(self) -> np.ndarray:
+        # (branches, candidates) complex, per MW drawn
+        return self.dflow[:len(self.candidates)].T
+
+    @property
+    def dflow_dq(self) -> np.ndarray:
+        return self.dflow[len(self.candidates):].T
+
+
+class WhatIf(NamedTuple):
+    # one entry per bus or line, with a column per scenario when several were asked at once
+    v_mag_pu: np.ndarray
+    s0: np.ndarray              # complex power entering every branch at bus0
+    loading: np.ndarray         # of every line (%)
+
+
+def get_admittance_matrix(topology: radial_sweep.RadialTopology) -> "sp.csr_matrix":
+    n_buses = len(topology.parent) + 1
+    y = 1/topology.z
+    rows = np.concatenate([topology.parent, topology.child, topology.parent, topology.child])
+    cols = np.concatenate([topology.parent, topology.child, topology.child, topology.parent])
+    return sp.csr_matrix((np.concatenate([y, y, -y, -y]), (rows, cols)), shape=(n_buses, n_buses))
+
+
+def get_jacobian(y_bus, v, buses) -> "sp.csc_matrix":
+    # derivatives of the injected P and Q of buses by the angles and magnitudes of their voltages
+    i = y_bus @ v
+    v_norm = v/np.abs(v)
+    ds_dva = 1j*sp.diags(v) @ (sp.diags(i) - y_bus @ sp.diags(v)).conj()
+    ds_dvm = sp.diags(v) @ (y_bus @ sp.diags(v_norm)).conj() + sp.diags(np.conj(i)) @ sp.diags(v_norm)
+    ds_dva = ds_dva.tocsr()[buses][:, buses]
+    ds_dvm = ds_dvm.tocsr()[buses][:, buses]
+    return sp.bmat([[ds_dva.real, ds_dvm.real], [ds_dva.imag, ds_dvm.imag]]).tocsc()
+
+
+def get_branch_flow_changes(topology: radial_sweep.RadialTopology, v, dv) -> np.ndarray:
+    # change of the power entering every branch at bus0 for voltage changes dv (buses, columns)
+    z = topology.z[:, None]
+    v_parent = v[topology.parent][:, None]
+    v_child = v[topology.child][:, None]
+    i_branch = (v_parent - v_child)/z
+    di_branch = (dv[topology.parent] - dv[topology.child])/z
+    ds_parent = dv[topology.parent]*np.conj(i_branch) + v_parent*np.conj(di_branch)
+    ds_child = -(dv[topology.child]*np.conj(i_branch) + v_child*np.conj(di_branch))
+    return np.where(topology.parent_is_bus0[:, None], ds_parent, ds_child)
+
+
+def compute_sensitivities(topology: radial_sweep.RadialTopology, v, candidates, y_bus=None) -> Sensitivities:
+    # v: complex bus voltages of a solution, candidates: bus indices of the columns
+    start = time.perf_counter()
+    v = np.asarray(v, dtype=complex)
+    candidates = np.asarray(candidates)
+    if y_bus is None:
+        y_bus = get_admittance_matrix(topology)
+    n_buses = len(v)
+    # every bus but the slack is a PQ bus
+    buses = np.delete(np.arange(n_buses), topology.slack)
+    position = np.full(n_buses, -1)
+    position[buses] = np.arange(len(buses))
+    if (position[candidates] < 0).any():
+        raise ValueError("the slack bus cannot be a candidate")
+
+    # a load of 1 MW (1 MVAr) at a candidate is an injection of -1
+    n, m = len(buses), len(candidates)
+    rhs = np.zeros((2*n, 2*m))
+    rhs[position[candidates], np.arange(m)] = -1.0
+    rhs[n + position[candidates], m + np.arange(m)] = -1.0
+    x = splu(get_jacobian(y_bus, v, buses)).solve(rhs)
+
+    # x holds the angle and magnitude changes of the PQ buses, the slack stays put
+    dv_ang = np.zeros((n_buses, 2*m))
+    dv_mag = np.zeros((n_buses, 2*m))
+    dv_ang[buses] = x[:n]
+    dv_mag[buses] = x[n:]
+    dv = v[:, None]*(dv_mag/np.abs(v)[:, None] + 1j*dv_ang)
+    dflow = get_branch_flow_changes(topology, v, dv)
+
+    i_branch = (v[topology.parent] - v[topology.child])/topology.z
+    s_parent = v[topology.parent]*np.conj(i_branch)
+    s0 = np.where(topology.parent_is_bus0, s_parent, -v[topology.child]*np.conj(i_branch))
+    return Sensitivities(v=v, s0=s0, candidates=candidates,
+                         dv=np.ascontiguousarray(dv_mag.T), dflow=np.ascontiguousarray(dflow.T),
+                         seconds=time.perf_counter() - start)
+
+
+def get_hosting_capacity(sensitivities: Sensitivities, line_branches, power_factor=1.0,
+                         voltage_limits=grid_metrics.VOLTAGE_LIMITS,
+                         loading_limit=grid_metrics.LOADING_LIMITS[1]) -> np.ndarray:
+    # extra load (MW) at every candidate bus, at power_factor (lagging), before the first bus leaves
+    # voltage_limits or the first line exceeds loading_limit; inf if nothing limits it
+    tan_phi = np.sqrt(1 - power_factor**2)/power_factor
+    v_mag = np.abs(sensitivities.v)[:, None]
+    dv = sensitivities.dv_dp + tan_phi*sensitivities.dv_dq
+    with np.errstate(divide='ignore', invalid='ignore'):
+        voltage = np.where(dv < 0, (v_mag - voltage_limits[0])/-dv,
+                           np.where(dv > 0, (voltage_limits[1] - v_mag)/dv, np.inf))
+
+        s0 = sensitivities.s0[line_branches][:, None]
+        ds = (sensitivities.dflow_dp + tan_phi*sensitivities.dflow_dq)[line_branches]
+        # change of |s0| along the flow, the full change for lines without flow
+        direction = np.where(np.abs(s0) > 0, np.conj(s0)/np.abs(s0), 1.0)
+        d_loading = np.where(np.abs(s0) > 0, (direction*ds).real, np.abs(ds))/grid_metrics.S_NOM_ASSUMED*100
+        loading = np.abs(s0)/grid_metrics.S_NOM_ASSUMED*100
+        lines = np.where(d_loading > 0, (loading_limit - loading)/d_loading, np.inf)
+    return np.maximum(np.minimum(voltage.min(axis=0, initial=np.inf), lines.min(axis=0, initial=np.inf)), 0.0)
+
+
+class SensitivityModel:
+    # the sensitivities of the latest operating point, recomputed when it drifts
+    # update() runs on the power flow thread, the queries may run on others
+    def __init__(self, topology: radial_sweep.RadialTopology, line_branches, candidates,
+                 drift_tolerance=DRIFT_TOLERANCE):
+        # line_branches: branch index of every line, candidates: bus indices the questions may change
+        self.topology = topology
+        self.line_branches = np.asarray(line_branches)
+        self.candidates = np.unique(candidates)
+        self.column = {int(bus): i for i, bus in enumerate(self.candidates)}
+        self.drift_tolerance = drift_tolerance
+        self.y_bus = get_admittance_matrix(topology)
+        self.sensitivities = None
+        self.counters = {"updates": 0, "recomputed": 0}
+
+    def update(self, v) -> bool:
+        # v: complex bus voltages of the latest solution, returns True if the sensitivities were recomputed
+        self.counters["updates"] += 1
+        current = self.sensitivities
+        if current is not None and np.abs(np.abs(v) - np.abs(current.v)).max() <= self.drift_tolerance:
+            return False
+        self.sensitivities = compute_sensitivities(self.topology, v, self.candidates, self.y_bus)
+        self.counters["recomputed"] += 1
+        return True
+
+    def get_changes(self, buses, delta_s):
+        # dp, dq vectors over the candidates for the complex load changes delta_s (MW + j MVAr) at buses
+        delta_s = np.asarray(delta_s, dtype=complex)
+        buses = np.atleast_1d(buses)
+        missing = [int(bus) for bus in buses if int(bus) not in self.column]
+        if missing:
+            raise ValueError(f"no sensitivities of buses {missing}, only of the candidates")
+        columns = np.array([self.column[int(bus)] for bus in buses], dtype=int)
+        change = np.zeros((len(self.candidates),) + delta_s.shape[1:], dtype=complex)
+        np.add.at(change, columns, np.atleast_1d(delta_s))
+        return change.real, change.imag
+
+    def what_if(self, dp, dq=None) -> WhatIf:
+        # dp, dq: extra MW and MVAr drawn at every candidate bus, shape (candidates,) or (candidates, scenarios)
+        sensitivities = self.sensitivities
+        dp = np.asarray(dp, dtype=float)
+        dq = np.zeros_like(dp) if dq is None else np.asarray(dq, dtype=float)
+        v_mag = np.abs(sensitivities.v)
+        s0 = sensitivities.s0
+        if dp.ndim == 2:
+            v_mag = v_mag[:, None]
+            s0 = s0[:, None]
+        # a question changes a few buses, only their rows are multiplied
+        change = np.concatenate([dp, dq])
+        changed = np.flatnonzero(change.reshape(len(change), -1).any(axis=1))
+        change = change[changed]
+        v_mag = v_mag + sensitivities.dv[changed].T @ change
+        s0 = s0 + sensitivities.dflow[changed].T @ change
+        return WhatIf(v_mag_pu=v_mag, s0=s0,
+                      loading=np.abs(s0[self.line_branches])/grid_metrics.S_NOM_ASSUMED*100)
+
+    def get_hosting_capacity(self, power_factor=1.0) -> np.ndarray:
+        # extra load (MW) every candidate bus can take, see get_hosting_capacity()
+        return get_hosting_capacity(self.sensitivities, self.line_branches, power_factor)
+
+
+def get_what_if_dict(answer: WhatIf, bus_names, line_names) -> dict:
+    # the answer to one question, e.g. to send as JSON
+    lower, upper = grid_metrics.VOLTAGE_LIMITS
+    lowest = int(np.argmin(answer.v_mag_pu))
+    highest = int(np.argmax(answer.loading))
+    outside = np.flatnonzero((answer.v_mag_pu < lower) | (answer.v_mag_pu > upper))
+    overloaded = np.flatnonzero(answer.loading > grid_metrics.LOADING_LIMITS[1])
+    return {"lowest_v": [str(bus_names[lowest]), round(float(answer.v_mag_pu[lowest]), 5)],
+            "highest_loading": [str(line_names[highest]), round(float(answer.loading[highest]), 2)],
+            "voltage_violations": [[str(bus_names[bus]), round(float(answer.v_mag_pu[bus]), 5)] for bus in outside],
+            "overloads": [[str(line_names[line]), round(float(answer.loading[line]), 2)] for line in overloaded]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="What-if questions on the KU grid or a synthetic feeder, "
+                                                 "answered by the sensitivities and by a full sweep")
+    parser.add_argument("--load", default="Load49", help="the load that changes (KU grid)")
+    parser.add_argument("--factor", type=float, default=2.0, help="its new power relative to the current")
+    parser.add_argument("--buses", type=int, help="use a synthetic feeder of this size instead of the KU grid")
+    parser.add_argument("--candidates", type=int, help="candidate buses of a synthetic feeder (default all load buses)")
+    parser.add_argument("--queries", type=int, default=10000, help="queries timed")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    if args.buses:
+        import feeder_generator
+        network = feeder_generator.create_feeder(args.buses).network
+    else:
+        import ku_grid_model
+        network = ku_grid_model.create_network()
+    topology = radial_sweep.build_topology(network)
+    line_branches = np.flatnonzero(topology.branch_component == "Line")
+    load_buses = topology.bus_names.get_indexer(network.loads.bus)
+    s_load = radial_sweep.get_bus_loads(network, topology)[:, 0]
+    v, i_branch, iterations = radial_sweep.sweep(topology, s_load)
+
+    candidates = np.unique(load_buses)
+    if args.candidates:
+        candidates = rng.choice(candidates, min(args.candidates, len(candidates)), replace=False)
+    model = SensitivityModel(topology, line_branches, candidates)
+    model.update(v)
+    print(f"sensitivities of {len(model.candidates)} candidate buses in {model.sensitivities.seconds:.3f} s")
+
+    # the question: one load changes by the factor
+    load = args.load if args.load in network.loads.index and not args.buses \
+        else network.loads.index[np.isin(load_buses, model.candidates)][0]
+    position = network.loads.index.get_loc(load)
+    delta_s = (args.factor - 1)*(network.loads.p_set.iloc[position] + 1j*network.loads.q_set.iloc[position])
+    dp, dq = model.get_changes(load_buses[position], delta_s)
+    start = time.perf_counter()
+    for _ in range(args.queries):
+        answer = model.what_if(dp, dq)
+    query_seconds = (time.perf_counter() - start)/args.queries
+
+    changed = s_load.copy()
+    changed[load_buses[position]] += delta_s
+    v_exact, i_exact, iterations = radial_sweep.sweep(topology, changed, v0=v)
+    s0_exact, s1_exact = radial_sweep.get_branch_flows(topology, v_exact, i_exact)
+    loading_exact = np.abs(s0_exact[line_branches])/grid_metrics.S_NOM_ASSUMED*100
+    print(f"{load} x {args.factor:g} ({delta_s.real*1000:+.1f} kW): answered in {query_seconds*1e6:.1f} us")
+    print(f"  lowest |V| {np.abs(v).min():.5f} -> {answer.v_mag_pu.min():.5f} p.u. (sweep {np.abs(v_exact).min():.5f}),"
+          f" max error {np.abs(answer.v_mag_pu - np.abs(v_exact)).max():.2e} p.u.")
+    print(f"  highest loading {answer.loading.max():.2f}% (sweep {loading_exact.max():.2f}%),"
+          f" max error {np.abs(answer.loading - loading_exact).max():.2e}%")
+
+    # many scenarios at once: every candidate bus taking 10 kW more, one column each
+    scenarios = np.eye(len(model.candidates))*0.01
+    start = time.perf_counter()
+    answers = model.what_if(scenarios, scenarios*0.33)
+    print(f"{len(model.candidates)} scenarios of +10 kW in {(time.perf_counter() - start)*1000:.2f} ms")
+
+    start = time.perf_counter()
+    capacity = model.get_hosting_capacity(power_factor=0.95)
+    print(f"hosting capacity of all candidates in {(time.perf_counter() - start)*1000:.2f} ms, lowest:")
+    for column in np.argsort(capacity)[:5]:
+        print(f"  {topology.bus_names[model.candidates[column]]:>10}  {capacity[column]*1000:8.1f} kW")
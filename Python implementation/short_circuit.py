@@ -0,0 +1,381 @@
+"""
+Short-circuit currents of every bus (IEC 60909, far from generator).
+
+For a fault at bus k the initial symmetrical short-circuit currents are
+
+    three-phase         Ik3 = c Un / (sqrt(3) |Z1kk|)
+    line to earth       Ik1 = sqrt(3) c Un / |2 Z1kk + Z0kk|
+    peak                ip  = kappa sqrt(2) Ik3, kappa = 1.02 + 0.98 exp(-3 R/X) of Z1kk
+
+with the voltage factor c of IEC 60909 table 1 (c_max for the largest currents,
+the breaking capacity of the protection, and c_min for Ik1 min, the current a
+fuse or breaker still has to trip on). Loads are neglected, so the currents only
+change with the topology, not from minute to minute.
+
+Z1kk and Z0kk are the diagonals of the bus impedance matrices of the positive
+and zero sequence networks:
+
+    positive    the branches of the radial topology, the feeding network at the
+                slack bus (s_k_network, R/X = rx_network)
+    zero        the lines (line_z0_ratio times their impedance), the Dyn
+                transformers as an earth connection of their star (child) side,
+                the feeding network at the slack bus
+
+The admittance matrix of both sequences is factorised once (scipy splu) for the
+radial topology, whose Zbus diagonal is the impedance of the path to earth.
+A topology change (ShortCircuitModel.switch(): a branch opened or closed, a tie
+to another feeder closed) is a rank-1 update of Zbus, which needs one solve with
+the factorisation and one term per earlier update, so a change and the currents
+of all buses take milliseconds even on feeders of thousands of buses. After
+MAX_UPDATES changes the admittance matrix of the current topology is factorised
+again, and returning to the radial topology drops all updates. Opening the only
+path to a bus cuts it off: its currents are 0.
+
+switch() is driven by the caller, e.g. --open and --tie below or a protection
+study; the live loop of main.py reads no switch states and computes the
+currents of its fixed topology once.
+
+The transformer of the KU model is practically ideal (r = x = 0.5 on an s_nom
+of 312.5e6), so the currents on the low voltage side are limited by the feeding
+network and the lines only. transformer_z replaces it with the real impedance.
+
+usage: python short_circuit.py [--buses 10000] [--s-k 250] [--open Line2_4] [--tie LVB5 LVB30 0.02 0.015] [--output report.json]
+"""
+
+import json
+import math
+import time
+import argparse
+from typing import NamedTuple
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components, breadth_first_order
+from scipy.sparse.linalg import splu
+import radial_sweep
+
+# buses of a nominal voltage up to this (kV) use the low voltage factors
+LV_LIMIT = 1.0
+# decimals of the currents (kA) in the report
+CURRENT_DECIMALS = 3
+# rank-1 updates applied on top of a factorisation before the current topology is factorised again,
+# every column of Zbus costs one solve plus one term per update
+MAX_UPDATES = 16
+
+
+class ShortCircuitParameters(NamedTuple):
+    s_k_network: float = 250.0          # short-circuit power of the feeding network at the slack bus (MVA)
+    rx_network: float = 0.1             # R/X of the feeding network
+    c_max_lv: float = 1.10              # voltage factors of IEC 60909 table 1, low voltage with +10% tolerance
+    c_min_lv: float = 0.95
+    c_max_hv: float = 1.10
+    c_min_hv: float = 1.00
+    line_z0_ratio: float = 4.0          # Z0/Z1 of the lines, R0 = R + 3 R_N for a neutral like the phases
+    transformer_z0_ratio: float = 1.0   # Z0/Z1 of the Dyn transformers, seen from the star side
+    network_z0_ratio: float = 1.0       # Z0/Z1 of the feeding network
+    transformer_z: complex = None       # impedance of every transformer (p.u.), None for the one of the topology
+
+
+class ShortCircuitResult(NamedTuple):
+    # one entry per bus, in the order of topology.bus_names, currents in kA, 0 at buses cut off
+    ik3: np.ndarray
+    ip: np.ndarray
+    ik1: np.ndarray
+    ik1_min: np.ndarray
+    z1: np.ndarray                      # Zbus diagonal of the positive sequence (p.u.)
+    z0: np.ndarray                      # Zbus diagonal of the zero sequence (p.u.)
+    supplied: np.ndarray                # False if a bus is cut off from the feeding network
+    seconds: float
+
+
+def get_network_impedance(parameters: ShortCircuitParameters) -> complex:
+    # the feeding network as an impedance to earth at the slack bus (p.u. on 1 MVA),
+    # Z = c Un^2/S''k with X = 0.995 Z for R/X = 0.1 as in IEC 60909
+    z = parameters.c_max_hv/parameters.s_k_network
+    x = z/math.hypot(1.0, parameters.rx_network)
+    return complex(parameters.rx_network*x, x)
+
+
+class SequenceNetwork:
+    # the bus impedance matrix of one sequence, as a factorisation (of the radial base or of a
+    # later topology, see refactorise()) and the rank-1 updates of every change since
+    # elements connect bus0 and bus1 (bus1 = n for earth), the base elements must form a
+    # tree rooted at earth, i.e. every bus has a single path to earth
+    def __init__(self, n_buses: int, bus0, bus1, z):
+        self.n = n_buses
+        self.bus0 = np.asarray(bus0)
+        self.bus1 = np.asarray(bus1)
+        self.z = np.asarray(z, dtype=complex)
+        self.base = np.ones(len(self.z), dtype=bool)
+        # Zbus stands for the closed elements plus the cut ones, see switch()
+        self.closed = self.base.copy()
+        self.cut = np.zeros(len(self.z), dtype=bool)
+        self.updates = []
+        self.base_lu = splu(self.get_admittance_matrix(self.base))
+        self.lu = self.base_lu
+        self.diagonal = self.get_base_diagonal()
+        self.base_diagonal = self.diagonal.copy()
+        self.connected = np.ones(n_buses, dtype=bool)
+
+    def add_element(self, bus0: int, bus1: int, z: complex, closed=False) -> int:
+        # a new element, e.g. a tie, open until switched
+        self.bus0 = np.append(self.bus0, bus0)
+        self.bus1 = np.append(self.bus1, bus1)
+        self.z = np.append(self.z, z)
+        self.base = np.append(self.base, False)
+        self.closed = np.append(self.closed, False)
+        self.cut = np.append(self.cut, False)
+        element = len(self.z) - 1
+        if closed:
+            self.switch(element, True)
+        return element
+
+    def get_admittance_matrix(self, elements) -> "sp.csc_matrix":
+        # earth is the reference, its row and column are left out
+        y = 1/self.z[elements]
+        bus0, bus1 = self.bus0[elements], self.bus1[elements]
+        rows = np.concatenate([bus0, bus1, bus0, bus1])
+        cols = np.concatenate([bus0, bus1, bus1, bus0])
+        data = np.concatenate([y, y, -y, -y])
+        inside = (rows < self.n) & (cols < self.n)
+        return sp.csc_matrix((data[inside], (rows[inside], cols[inside])), shape=(self.n, self.n))
+
+    def get_graph(self, elements) -> "sp.csr_matrix":
+        # the elements as an undirected graph of the buses and earth (node n)
+        return sp.csr_matrix((np.ones(elements.sum()), (self.bus0[elements], self.bus1[elements])),
+                             shape=(self.n + 1, self.n + 1))
+
+    def get_base_diagonal(self) -> np.ndarray:
+        # the Zbus diagonal of a tree rooted at earth: the impedance of the path from every bus to earth
+        order, predecessors = breadth_first_order(self.get_graph(self.base), self.n, directed=False)
+        if len(order) != self.n + 1 or self.base.sum() != self.n:
+            raise ValueError("the base elements do not connect every bus to earth by a single path")
+        # impedance of the element between every node and its predecessor
+        z_up = np.zeros(self.n + 1, dtype=complex)
+        lower = np.where(predecessors[self.bus0[self.base]] == self.bus1[self.base],
+                         self.bus0[self.base], self.bus1[self.base])
+        z_up[lower] = self.z[self.base]
+        diagonal = np.zeros(self.n + 1, dtype=complex)
+        for node in order[1:].tolist():
+            diagonal[node] = diagonal[predecessors[node]] + z_up[node]
+        return diagonal[:self.n]
+
+    def get_column(self, bus0: int, bus1: int) -> np.ndarray:
+        # Zbus (e_bus0 - e_bus1), the voltages for a unit current injected at bus0 and drawn at bus1
+        m = np.zeros(self.n, dtype=complex)
+        m[bus0] = 1.0
+        if bus1 < self.n:
+            m[bus1] = -1.0
+        c = self.lu.solve(m)
+        for c_update, d_update in self.updates:
+            c -= c_update*(self.get_difference(c_update, bus0, bus1)/d_update)
+        return c
+
+    def get_difference(self, c, bus0: int, bus1: int) -> complex:
+        return c[bus0] - (c[bus1] if bus1 < self.n else 0.0)
+
+    def update(self, element: int, z: complex):
+        # adds z in parallel to the network between the buses of element, -z removes it again
+        bus0, bus1 = self.bus0[element], self.bus1[element]
+        c = self.get_column(bus0, bus1)
+        d = z + self.get_difference(c, bus0, bus1)
+        self.updates.append((c, d))
+        self.diagonal -= c*c/d
+        if len(self.updates) > MAX_UPDATES:
+            self.refactorise()
+
+    def refactorise(self):
+        # factorises the admittance matrix of the closed and cut elements, which connect every bus
+        # to earth, so it is never singular; the diagonal is kept, it is already the one of this topology
+        self.lu = splu(self.get_admittance_matrix(self.closed | self.cut))
+        self.updates = []
+
+    def is_bridge(self, element: int, elements) -> bool:
+        # True if removing element from elements separates its buses
+        elements = elements.copy()
+        elements[element] = False
+        n_components, labels = connected_components(self.get_graph(elements), directed=False)
+        return labels[self.bus0[element]] != labels[self.bus1[element]]
+
+    def switch(self, element: int, closed: bool):
+        # Zbus stays the one of the closed and the cut elements: an element whose removal would
+        # cut buses off is only marked as cut, the buses behind it do not influence the others
+        if closed == self.closed[element]:
+            return
+        self.closed[element] = closed
+        if closed:
+            if self.cut[element]:
+                self.cut[element] = False
+            else:
+                self.update(element, self.z[element])
+                # a new path may have turned cut elements into ordinary ones
+                for cut in np.flatnonzero(self.cut):
+                    if not self.is_bridge(cut, self.closed | self.cut):
+                        self.cut[cut] = False
+                        self.update(cut, -self.z[cut])
+        elif self.is_bridge(element, self.closed | self.cut):
+            self.cut[element] = True
+        else:
+            self.update(element, -self.z[element])
+
+        if np.array_equal(self.closed | self.cut, self.base):
+            # back at the radial topology, e.g. after an outage was cleared
+            self.lu = self.base_lu
+            self.updates = []
+            self.diagonal = self.base_diagonal.copy()
+        self.connected = self.get_connected()
+
+    def get_connected(self) -> np.ndarray:
+        # True for the buses with a path to earth through closed elements
+        n_components, labels = connected_components(self.get_graph(self.closed), directed=False)
+        return labels[:self.n] == labels[self.n]
+
+
+class ShortCircuitModel:
+    def __init__(self, topology: radial_sweep.RadialTopology, v_nom, parameters=ShortCircuitParameters()):
+        # v_nom: nominal voltage of every bus (kV), in the order of topology.bus_names
+        self.topology = topology
+        self.parameters = parameters
+        self.v_nom = np.asarray(v_nom, dtype=float)
+        n = len(self.v_nom)
+        is_transformer = topology.branch_component == "Transformer"
+        z = topology.z.astype(complex)
+        if parameters.transformer_z is not None:
+            z[is_transformer] = parameters.transformer_z
+        z_network = get_network_impedance(parameters)
+
+        # the branches are elements 0 to branches - 1 of both sequences, the feeding network the last one
+        self.positive = SequenceNetwork(n, np.append(topology.parent, topology.slack),
+                                        np.append(topology.child, n), np.append(z, z_network))
+        # in the zero sequence a transformer connects its star side to earth
+        self.zero = SequenceNetwork(n, np.append(np.where(is_transformer, topology.child, topology.parent),
+                                                 topology.slack),
+                                    np.append(np.where(is_transformer, n, topology.child), n),
+                                    np.append(np.where(is_transformer, parameters.transformer_z0_ratio,
+                                                       parameters.line_z0_ratio)*z,
+                                              parameters.network_z0_ratio*z_network))
+        self.ties = {}
+
+        low_voltage = self.v_nom <= LV_LIMIT
+        self.c_max = np.where(low_voltage, parameters.c_max_lv, parameters.c_max_hv)
+        self.c_min = np.where(low_voltage, parameters.c_min_lv, parameters.c_min_hv)
+        # current of 1 p.u. on the 1 MVA base (kA)
+        self.i_base = 1/(math.sqrt(3)*self.v_nom)
+        self.counters = {"switched": 0}
+
+    def add_tie(self, bus0: int, bus1: int, z: complex, z0=None, closed=False) -> int:
+        # a tie line (z in p.u.) between two buses, e.g. to a neighbouring feeder, returns its element
+        # number for switch(); z0 defaults to line_z0_ratio*z
+        z0 = self.parameters.line_z0_ratio*z if z0 is None else z0
+        element = self.positive.add_element(bus0, bus1, z)
+        self.zero.add_element(bus0, bus1, z0)
+        self.ties[element] = (bus0, bus1)
+        if closed:
+            self.switch(element, True)
+        return element
+
+    def switch(self, element: int, closed: bool):
+        # element: a branch index of the topology or a tie of add_tie()
+        self.positive.switch(element, closed)
+        self.zero.switch(element, closed)
+        self.counters["switched"] += 1
+
+    def compute(self) -> ShortCircuitResult:
+        # the currents of a fault at every bus, all at once
+        start = time.perf_counter()
+        z1 = self.positive.diagonal
+        z0 = self.zero.diagonal
+        supplied = self.positive.connected
+        earthed = supplied & self.zero.connected
+        ik3 = np.where(supplied, self.c_max/np.abs(z1)*self.i_base, 0.0)
+        with np.errstate(divide='ignore'):
+            kappa = 1.02 + 0.98*np.exp(-3*z1.real/z1.imag)
+        z_loop = np.abs(2*z1 + z0)
+        return ShortCircuitResult(ik3=ik3,
+                                  ip=kappa*math.sqrt(2)*ik3,
+                                  ik1=np.where(earthed, 3*self.c_max/z_loop*self.i_base, 0.0),
+                                  ik1_min=np.where(earthed, 3*self.c_min/z_loop*self.i_base, 0.0),
+                                  z1=z1.copy(), z0=z0.copy(), supplied=supplied,
+                                  seconds=time.perf_counter() - start)
+
+
+def get_report_dict(result: ShortCircuitResult, bus_names, bus_locations=None) -> dict:
+    # every bus with its currents in kA, e.g. to publish as JSON
+    # bus_locations: (buses, 2) longitude, latitude as grid_geojson.GridGeometry, to draw them on the map
+    columns = [np.round(currents, CURRENT_DECIMALS).tolist()
+               for currents in (result.ik3, result.ip, result.ik1, result.ik1_min)]
+    buses = [{"bus": str(name), "ik3": ik3, "ip": ip, "ik1": ik1, "ik1_min": ik1_min}
+             for name, ik3, ip, ik1, ik1_min in zip(bus_names, *columns)]
+    if bus_locations is not None:
+        for bus, (x, y) in zip(buses, np.round(bus_locations, 7).tolist()):
+            bus["location"] = [y, x]
+    return {"buses": buses}
+
+
+def get_short_circuit_script(report_dict: dict) -> str:
+    # wrapped in a call like the grid state, so the page also works when opened from disk
+    return f"disvizApplyShortCircuit({json.dumps(report_dict, separators=(',', ':'))});"
+
+
+def print_report(report_dict: dict, top=10):
+    supplied = [bus for bus in report_dict["buses"] if bus["ik3"] > 0]
+    print(f"{len(supplied)} of {len(report_dict['buses'])} buses supplied")
+    print("highest Ik3 (breaking capacity):          Ik3      ip     Ik1  Ik1 min (kA)")
+    for bus in sorted(supplied, key=lambda bus: -bus["ik3"])[:top]:
+        print(f"  {bus['bus']:>30}  {bus['ik3']:7.2f} {bus['ip']:7.2f} {bus['ik1']:7.2f} {bus['ik1_min']:7.2f}")
+    print("lowest Ik1 min (protection must still trip):")
+    for bus in sorted(supplied, key=lambda bus: bus["ik1_min"])[:top]:
+        print(f"  {bus['bus']:>30}  {bus['ik3']:7.2f} {bus['ip']:7.2f} {bus['ik1']:7.2f} {bus['ik1_min']:7.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Short-circuit currents of every bus of the KU grid or a "
+                                                 "synthetic feeder (IEC 60909)")
+    parser.add_argument("--buses", type=int, help="use a synthetic feeder of this size instead of the KU grid")
+    parser.add_argument("--s-k", type=float, default=ShortCircuitParameters().s_k_network,
+                        help="short-circuit power of the feeding network (MVA)")
+    parser.add_argument("--transformer-z", type=float, nargs=2, metavar=("R", "X"),
+                        help="impedance of the transformer (p.u. on 1 MVA) instead of the model's")
+    parser.add_argument("--tie", nargs=4, action="append", default=[], metavar=("BUS0", "BUS1", "R", "X"),
+                        help="close a tie line of R + jX ohm between two buses")
+    parser.add_argument("--open", nargs="+", default=[], metavar="BRANCH", help="branches opened after the ties")
+    parser.add_argument("--top", type=int, default=10, help="buses printed")
+    parser.add_argument("--output", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    if args.buses:
+        import feeder_generator
+        network = feeder_generator.create_feeder(args.buses).network
+    else:
+        import ku_grid_model
+        network = ku_grid_model.create_network()
+    topology = radial_sweep.build_topology(network)
+    v_nom = network.buses.v_nom.to_numpy()
+    parameters = ShortCircuitParameters(s_k_network=args.s_k,
+                                        transformer_z=complex(*args.transformer_z) if args.transformer_z else None)
+
+    start = time.perf_counter()
+    model = ShortCircuitModel(topology, v_nom, parameters)
+    print(f"{len(v_nom)} buses factorised in {(time.perf_counter() - start)*1000:.1f} ms")
+    result = model.compute()
+    print(f"currents of all buses in {result.seconds*1000:.3f} ms")
+
+    bus_index = {name: i for i, name in enumerate(topology.bus_names)}
+    branch_index = {name: i for i, name in enumerate(topology.branch_names)}
+    for bus0, bus1, r, x in args.tie:
+        # ohm to p.u. on 1 MVA at the voltage of the tie
+        z = complex(float(r), float(x))/v_nom[bus_index[bus0]]**2
+        start = time.perf_counter()
+        model.add_tie(bus_index[bus0], bus_index[bus1], z, closed=True)
+        print(f"tie {bus0} - {bus1} closed in {(time.perf_counter() - start)*1000:.2f} ms")
+    for branch in args.open:
+        start = time.perf_counter()
+        model.switch(branch_index[branch], False)
+        print(f"{branch} opened in {(time.perf_counter() - start)*1000:.2f} ms")
+    if args.tie or args.open:
+        result = model.compute()
+
+    report_dict = get_report_dict(result, topology.bus_names)
+    print_report(report_dict, args.top)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report_dict, f, indent=2)
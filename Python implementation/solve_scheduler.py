@@ -0,0 +1,83 @@
+import time
+import threading
+
+# wait this long after the last reading of a burst before solving (s)
+DEFAULT_DEBOUNCE = 1.0
+# never start two cycles closer together than this (s)
+DEFAULT_MIN_INTERVAL = 2.0
+# start a cycle at least this often, even without new readings (s)
+DEFAULT_MAX_INTERVAL = 60.0
+# never let a reading wait longer than this, even if the burst goes on (s)
+DEFAULT_MAX_DELAY = 5.0
+
+
+class SolveScheduler:
+    # decides when load_flow() runs its next cycle
+    #  - a cycle starts once new readings have arrived and no further reading came
+    #    in for `debounce` seconds, so a burst of meter messages triggers one solve
+    #  - a reading never waits more than `max_delay` seconds, so a steady stream of
+    #    readings from many meters cannot hold the cycle back
+    #  - cycles start at most every `min_interval` seconds, whatever triggered them
+    #  - without readings a cycle still starts `max_interval` seconds after the previous
+    #    one started, so the period does not drift by the cycle duration
+    def __init__(self, debounce=DEFAULT_DEBOUNCE, min_interval=DEFAULT_MIN_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL,
+                 max_delay=DEFAULT_MAX_DELAY):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._condition = threading.Condition()
+        now = time.monotonic()
+        # the first cycle runs straight away
+        self._first_reading = now
+        self._last_reading = now - debounce
+        self._last_cycle = now - min_interval
+        self._cycle_readings = None
+        # reading-to-publish latency in seconds
+        self.latency = {"last": 0.0, "max": 0.0, "mean": 0.0, "cycles": 0}
+
+    def notify(self):
+        # called for every new meter reading
+        with self._condition:
+            now = time.monotonic()
+            if self._first_reading is None:
+                self._first_reading = now
+            self._last_reading = now
+            self._condition.notify_all()
+
+    def _get_wait(self, now) -> float:
+        # seconds until the next cycle may start, 0 if it can start now
+        ready = self._last_cycle + self.max_interval
+        if self._first_reading is not None:
+            quiet = min(self._last_reading + self.debounce, self._first_reading + self.max_delay)
+            ready = min(ready, quiet)
+        return max(0.0, max(ready, self._last_cycle + self.min_interval) - now)
+
+    def wait_for_cycle(self) -> float:
+        # blocks until the next cycle should start
+        # returns the time since the previous cycle started (s)
+        with self._condition:
+            while True:
+                wait = self._get_wait(time.monotonic())
+                if wait <= 0:
+                    break
+                self._condition.wait(wait)
+
+            now = time.monotonic()
+            elapsed = now - self._last_cycle
+            self._last_cycle = now
+            self._cycle_readings = self._first_reading
+            self._first_reading = None
+            return elapsed
+
+    def published(self):
+        # called once the results of the cycle are published
+        with self._condition:
+            if self._cycle_readings is None:
+                return
+            latency = time.monotonic() - self._cycle_readings
+            self._cycle_readings = None
+            self.latency["cycles"] += 1
+            self.latency["last"] = latency
+            self.latency["max"] = max(self.latency["max"], latency)
+            self.latency["mean"] += (latency - self.latency["mean"])/self.latency["cycles"]
@@ -0,0 +1,451 @@
+"""
+Weighted least squares state estimation from all meter channels.
+
+The live loop splits the transformer reading minus the building meters over
+the unmetered loads by fixed shares, and only uses the summed active power of
+every meter. The estimator instead weighs every observation by its accuracy
+and finds the most likely state of the radial feeder:
+
+    meters          active power (sum of the phases), reactive power (from the
+                    phase voltages, currents and powers) and |V| (mean of the
+                    phases) at the bus of the metered load
+    transformer     active and reactive power into LVB1 and |V| of LVB1
+    pseudo          the allocated power of every unmetered load (the nominal
+                    power while the transformer has no valid reading), and
+                    the nominal power of a metered load whose meter has not
+                    reported or was rejected, with a large sigma
+    virtual         zero power at buses without a load, with a tiny sigma
+
+The model is balanced, so the phases are summed, and the estimate is a
+branch current estimator: the states are the real and imaginary parts of
+every branch current plus the slack voltage. With the power observations
+turned into equivalent currents at the estimated voltages, the current
+observations are linear in the states and |V| is linear up to the bus
+angles, so the gain matrix G = H'WH only depends on which channels are in use
+and, slightly, on the angles of the metered buses. Its sparse LU
+factorisation (scipy splu) is cached, and the next minutes with the same
+channels only solve with it: one sweep of forward and back substitution per
+iteration, plus a forward sweep for the voltages.
+
+Bad data is rejected in two steps. The phases of every reading are checked on
+their own first: a phase with more active power than voltage times current
+(power factor above 1 + PLAUSIBILITY_TOLERANCE) rejects the power channels of
+the meter, a mean voltage outside VOLTAGE_RANGE its |V| channel. Then the
+largest normalised residual test runs on the meter channels left: a channel
+whose residual is more than BAD_DATA_THRESHOLD standard deviations of the
+residual is rejected and the state estimated again without it, at most
+MAX_BAD_DATA times per cycle. The variance of a residual takes a solve with the
+factorisation, so only the BAD_DATA_CANDIDATES channels with the largest
+weighted residuals are normalised. Only redundant channels can be tested this way;
+with a single transformer meter and loose pseudo measurements, a building
+meter that is off by less than the uncertainty of the unmetered loads goes
+unnoticed.
+
+usage: python state_estimation.py [--buses 10000] [--metered 0.05] [--bad physics] [--bad-channel P] [--seed 0]
+"""
+
+import math
+import time
+import argparse
+from typing import NamedTuple
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+import radial_sweep
+import load_allocation
+
+# phase voltage (V) of 1 p.u. on the 400 V network
+V_PHASE_BASE = 400.0/math.sqrt(3)
+
+# standard deviations of the channels (MW, MVAr, p.u.)
+METER_P_SIGMA = 0.0005
+METER_Q_SIGMA = 0.002
+METER_V_SIGMA = 0.003
+TRANSFORMER_P_SIGMA = 0.002
+TRANSFORMER_Q_SIGMA = 0.005
+# pseudo measurements: this share of the nominal power of the load, at least PSEUDO_SIGMA_MIN
+PSEUDO_SIGMA_SHARE = 0.5
+PSEUDO_SIGMA_MIN = 0.0001
+ZERO_INJECTION_SIGMA = 1e-5
+# the slack voltage set point, as a pseudo measurement for when no |V| is metered
+SLACK_V_SIGMA = 0.05
+
+# readings with a phase power factor above 1 + PLAUSIBILITY_TOLERANCE or a mean |V| (p.u.) outside
+# VOLTAGE_RANGE are rejected before the estimation
+PLAUSIBILITY_TOLERANCE = 0.05
+VOLTAGE_RANGE = (0.5, 1.5)
+# normalised residuals above this reject a channel
+BAD_DATA_THRESHOLD = 4.0
+# only the channels with the largest weighted residuals are candidates for the normalised residual test,
+# each costing one solve with the factorisation
+BAD_DATA_CANDIDATES = 20
+MAX_BAD_DATA = 3
+# the factorisation is renewed when a metered bus angle moved more than this (rad)
+ANGLE_TOLERANCE = 0.005
+# factorisations kept, e.g. for the channel sets with and without a rejected meter
+CACHED_FACTORISATIONS = 8
+
+
+class Factorisation(NamedTuple):
+    theta: np.ndarray           # angles of the voltage rows the matrix was built with
+    h: "sp.csr_matrix"          # measurement matrix
+    lu: object                  # splu of the gain matrix
+
+
+class StateEstimate(NamedTuple):
+    v: np.ndarray               # complex bus voltages (p.u.)
+    i_branch: np.ndarray        # complex branch currents, parent to child (p.u.)
+    s_load: np.ndarray          # estimated complex power drawn at every bus (MW + j MVAr)
+    bad_data: list              # (meter, channel, reason) of the rejected channels
+    objective: float            # weighted sum of squared residuals
+    iterations: int
+    factorised: int             # gain matrices factorised in this cycle, 0 when the cache was used
+    seconds: float
+
+
+def read_channels(readings):
+    # returns (meter, "P" | "Q" | "V") -> value in MW, MVAr or p.u. from the newest reading of every meter,
+    # and (meter, channel, reason) of the implausible channels left out
+    # readings: meter name -> meter_ingest.MeterReading
+    channels = {}
+    rejected = []
+    for meter, reading in readings.items():
+        voltage = np.asarray(reading.voltage, dtype=float)
+        power = np.asarray(reading.power, dtype=float)
+        apparent = np.abs(voltage*np.asarray(reading.current, dtype=float))
+        power_factor = np.divide(np.abs(power), apparent, out=np.zeros(len(power)), where=apparent > 0)
+        if (power_factor > 1 + PLAUSIBILITY_TOLERANCE).any():
+            rejected += [(meter, channel, f"power factor {power_factor.max():.2f}") for channel in ("P", "Q")]
+        else:
+            channels[meter, "P"] = power.sum()/1e6
+            channels[meter, "Q"] = np.sqrt(np.maximum(apparent**2 - power**2, 0.0)).sum()/1e6
+        v_mean = voltage.mean()/V_PHASE_BASE
+        if VOLTAGE_RANGE[0] <= v_mean <= VOLTAGE_RANGE[1]:
+            channels[meter, "V"] = v_mean
+        else:
+            rejected.append((meter, "V", f"|V| {v_mean:.3f} p.u."))
+    return channels, rejected
+
+
+class StateEstimator:
+    def __init__(self, topology: radial_sweep.RadialTopology, load_buses, p_nominal, q_nominal, meter_loads,
+                 transformer_meter=load_allocation.TRANSFORMER_METER):
+        # load_buses: bus index of every load, p_nominal, q_nominal: nominal load (MW, MVAr) in the same order
+        # meter_loads: meter name -> index of the load it measures
+        self.topology = topology
+        n_branches = len(topology.parent)
+        self.n_branches = n_branches
+        self.p_nominal = np.asarray(p_nominal, dtype=float)
+        self.q_nominal = np.asarray(q_nominal, dtype=float)
+        self.pseudo_sigma = np.maximum(PSEUDO_SIGMA_SHARE*np.abs(self.p_nominal), PSEUDO_SIGMA_MIN)
+        self.meter_loads = dict(meter_loads)
+        self.transformer_meter = transformer_meter
+        self.unmetered = np.ones(len(self.p_nominal), dtype=bool)
+        self.unmetered[list(self.meter_loads.values())] = False
+
+        # every bus but the slack is the child of exactly one branch, whose rows hold its observations
+        self.feeding = np.full(n_branches + 1, -1)
+        self.feeding[topology.child] = np.arange(n_branches)
+        self.load_rows = self.feeding[np.asarray(load_buses)]
+        if (self.load_rows < 0).any():
+            raise ValueError("loads at the slack bus are not supported")
+
+        # current drawn at the child of every branch: the branch current minus the currents leaving the child
+        below = topology.parent != topology.slack
+        self.injection = sp.csr_matrix((np.concatenate([np.ones(n_branches), -np.ones(below.sum())]),
+                                        (np.concatenate([np.arange(n_branches), self.feeding[topology.parent[below]]]),
+                                         np.concatenate([np.arange(n_branches), np.flatnonzero(below)]))),
+                                       shape=(n_branches, n_branches))
+
+        # the transformer meter measures the branch into LVB1
+        transformers = np.flatnonzero(topology.branch_component == "Transformer")
+        self.transformer_branch = transformers[0] if len(transformers) == 1 else None
+
+        # |V| rows: the metered loads and the secondary of the transformer
+        self.voltage_meters = [meter for meter in self.meter_loads]
+        voltage_buses = [topology.child[self.load_rows[load]] for load in self.meter_loads.values()]
+        if self.transformer_branch is not None:
+            self.voltage_meters.append(transformer_meter)
+            voltage_buses.append(topology.child[self.transformer_branch])
+        self.voltage_buses = np.array(voltage_buses, dtype=int)
+        # branches between the slack and every |V| bus
+        self.voltage_paths = [self.get_path(bus) for bus in self.voltage_buses]
+
+        # rows: Re and Im of the current drawn at every bus, the transformer current, |V|, the slack voltage
+        self.transformer_row = 2*n_branches
+        self.voltage_row = self.transformer_row + (2 if self.transformer_branch is not None else 0)
+        self.slack_row = self.voltage_row + len(self.voltage_buses)
+        self.n_rows = self.slack_row + 1
+        self.n_states = 2*n_branches + 1
+
+        # meter channel of every row that is tested for bad data
+        self.row_channels = {}
+        for meter, load in self.meter_loads.items():
+            self.row_channels[self.load_rows[load]] = (meter, "P")
+            self.row_channels[n_branches + self.load_rows[load]] = (meter, "Q")
+        if self.transformer_branch is not None:
+            self.row_channels[self.transformer_row] = (transformer_meter, "P")
+            self.row_channels[self.transformer_row + 1] = (transformer_meter, "Q")
+        for i, meter in enumerate(self.voltage_meters):
+            self.row_channels[self.voltage_row + i] = (meter, "V")
+
+        self.factorisations = {}
+        self.v = np.full(n_branches + 1, topology.v_slack, dtype=complex)
+
+    def get_path(self, bus: int) -> np.ndarray:
+        path = []
+        while bus != self.topology.slack:
+            branch = self.feeding[bus]
+            path.append(branch)
+            bus = self.topology.parent[branch]
+        return np.array(path, dtype=int)
+
+    def get_matrix(self, theta) -> "sp.csr_matrix":
+        # measurement matrix, the |V| rows projected on the angles theta of their buses
+        n = self.n_branches
+        injection = self.injection.tocoo()
+        rows = [injection.row, n + injection.row]
+        cols = [injection.col, n + injection.col]
+        data = [injection.data, injection.data]
+        if self.transformer_branch is not None:
+            rows.append([self.transformer_row, self.transformer_row + 1])
+            cols.append([self.transformer_branch, n + self.transformer_branch])
+            data.append([1.0, 1.0])
+        # |V| = Re(exp(-j theta) (v_slack - sum of z*i along the path))
+        for i, (path, angle) in enumerate(zip(self.voltage_paths, theta)):
+            c = np.exp(-1j*angle)*self.topology.z[path]
+            row = self.voltage_row + i
+            rows.append(np.full(2*len(path) + 1, row))
+            cols.append(np.concatenate([path, n + path, [2*n]]))
+            data.append(np.concatenate([-c.real, c.imag, [np.cos(angle)]]))
+        rows.append([self.slack_row])
+        cols.append([2*n])
+        data.append([1.0])
+        return sp.csr_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+                             shape=(self.n_rows, self.n_states))
+
+    def get_factorisation(self, weights, theta):
+        # returns the factorisation for these weights, and True if it had to be computed
+        key = weights.tobytes()
+        factorisation = self.factorisations.get(key)
+        if factorisation is not None and np.abs(theta - factorisation.theta).max(initial=0.0) <= ANGLE_TOLERANCE:
+            return factorisation, False
+
+        h = self.get_matrix(theta)
+        gain = (h.T @ sp.diags(weights) @ h).tocsc()
+        factorisation = Factorisation(theta=theta, h=h, lu=splu(gain))
+
+        self.factorisations.pop(key, None)
+        if len(self.factorisations) >= CACHED_FACTORISATIONS:
+            del self.factorisations[next(iter(self.factorisations))]
+        self.factorisations[key] = factorisation
+        return factorisation, True
+
+    def get_observations(self, channels: dict, p_set, q_set):
+        # complex power drawn at the child of every branch and into LVB1, measured |V| and the weights of all rows
+        n = self.n_branches
+        p = np.array(p_set, dtype=float)
+        q = np.array(q_set, dtype=float)
+        if (self.transformer_meter, "P") not in channels:
+            # the allocation splits the transformer reading, without it the nominal loads are the better guess
+            p[self.unmetered] = self.p_nominal[self.unmetered]
+            q[self.unmetered] = self.q_nominal[self.unmetered]
+        sigma_p = self.pseudo_sigma.copy()
+        sigma_q = self.pseudo_sigma.copy()
+        for meter, load in self.meter_loads.items():
+            # unreported and rejected meters fall back to the nominal load as a pseudo measurement
+            p[load], sigma_p[load] = ((channels[meter, "P"], METER_P_SIGMA) if (meter, "P") in channels
+                                      else (self.p_nominal[load], self.pseudo_sigma[load]))
+            q[load], sigma_q[load] = ((channels[meter, "Q"], METER_Q_SIGMA) if (meter, "Q") in channels
+                                      else (self.q_nominal[load], self.pseudo_sigma[load]))
+
+        s_rows = np.zeros(n, dtype=complex)
+        np.add.at(s_rows, self.load_rows, p + 1j*q)
+        variance_p = np.full(n, ZERO_INJECTION_SIGMA**2)
+        variance_q = np.full(n, ZERO_INJECTION_SIGMA**2)
+        has_load = np.zeros(n, dtype=bool)
+        has_load[self.load_rows] = True
+        variance_p[has_load] = 0.0
+        variance_q[has_load] = 0.0
+        np.add.at(variance_p, self.load_rows, sigma_p**2)
+        np.add.at(variance_q, self.load_rows, sigma_q**2)
+
+        # sigma of the equivalent currents, taking |V| as 1 p.u. so the weights do not change with the state
+        sigma = np.full(self.n_rows, np.inf)
+        sigma[:n] = np.sqrt(variance_p)
+        sigma[n:2*n] = np.sqrt(variance_q)
+        s_transformer = 0j
+        meter = self.transformer_meter
+        if self.transformer_branch is not None and (meter, "P") in channels and (meter, "Q") in channels:
+            s_transformer = channels[meter, "P"] + 1j*channels[meter, "Q"]
+            sigma[self.transformer_row:self.transformer_row + 2] = TRANSFORMER_P_SIGMA, TRANSFORMER_Q_SIGMA
+        v_measured = np.array([channels.get((meter, "V"), np.nan) for meter in self.voltage_meters])
+        sigma[self.voltage_row:self.slack_row][~np.isnan(v_measured)] = METER_V_SIGMA
+        sigma[self.slack_row] = SLACK_V_SIGMA
+        return s_rows, s_transformer, np.nan_to_num(v_measured), 1/sigma**2
+
+    def get_values(self, s_rows, s_transformer, v_measured, v) -> np.ndarray:
+        # the observations as equivalent currents at the voltages v
+        n = self.n_branches
+        z = np.zeros(self.n_rows)
+        i_rows = np.conj(s_rows/v[self.topology.child])
+        z[:n] = i_rows.real
+        z[n:2*n] = i_rows.imag
+        if self.transformer_branch is not None:
+            i_transformer = np.conj(s_transformer/v[self.topology.child[self.transformer_branch]])
+            z[self.transformer_row:self.transformer_row + 2] = i_transformer.real, i_transformer.imag
+        z[self.voltage_row:self.slack_row] = v_measured
+        z[self.slack_row] = self.topology.v_slack
+        return z
+
+    def get_voltages(self, v_slack: float, i_branch) -> np.ndarray:
+        # forward sweep from the slack
+        v = np.empty(self.n_branches + 1, dtype=complex)
+        v[self.topology.slack] = v_slack
+        for level in self.topology.levels:
+            v[self.topology.child[level]] = v[self.topology.parent[level]] - self.topology.z[level]*i_branch[level]
+        return v
+
+    def solve(self, channels: dict, p_set, q_set, tol=1e-8, max_iter=20):
+        n = self.n_branches
+        s_rows, s_transformer, v_measured, weights = self.get_observations(channels, p_set, q_set)
+        v = self.v
+        factorised = 0
+        for iteration in range(max_iter):
+            z = self.get_values(s_rows, s_transformer, v_measured, v)
+            factorisation, new = self.get_factorisation(weights, np.angle(v[self.voltage_buses]))
+            factorised += new
+            x = factorisation.lu.solve(factorisation.h.T @ (weights*z))
+            i_branch = x[:n] + 1j*x[n:2*n]
+            v_new = self.get_voltages(x[2*n], i_branch)
+            converged = np.abs(v_new - v).max() < tol
+            v = v_new
+            if converged:
+                break
+        residuals = z - factorisation.h @ x
+        return v, i_branch, factorisation, residuals, weights, iteration + 1, factorised
+
+    def estimate(self, readings, p_set, q_set) -> StateEstimate:
+        # readings: meter name -> newest meter_ingest.MeterReading (the transformer under TRANSFORMER_METER)
+        # p_set, q_set: the allocated loads (MW, MVAr), the pseudo measurements of the unmetered loads
+        start = time.perf_counter()
+        channels, rejected = read_channels(readings)
+        known = lambda meter: meter in self.meter_loads or meter == self.transformer_meter
+        channels = {key: value for key, value in channels.items() if known(key[0])}
+        bad_data = [channel for channel in rejected if known(channel[0])]
+        factorised = 0
+        for attempt in range(MAX_BAD_DATA + 1):
+            v, i_branch, factorisation, residuals, weights, iterations, new = self.solve(channels, p_set, q_set)
+            factorised += new
+            # the rows of the meter channels in use
+            tested = np.array([row for row, channel in self.row_channels.items() if channel in channels], dtype=int)
+            if attempt == MAX_BAD_DATA or not len(tested):
+                break
+            candidates = tested[np.argsort(-np.abs(residuals[tested])*np.sqrt(weights[tested]))[:BAD_DATA_CANDIDATES]]
+            # variance of their residuals: 1/w - diag(H G^-1 H'), critical channels have none to test
+            h_candidates = factorisation.h[candidates].toarray()
+            omega = 1/weights[candidates] - (h_candidates*factorisation.lu.solve(h_candidates.T).T).sum(axis=1)
+            testable = omega > 1e-6/weights[candidates]
+            normalised = np.zeros(len(candidates))
+            normalised[testable] = np.abs(residuals[candidates[testable]])/np.sqrt(omega[testable])
+            worst = int(np.argmax(normalised))
+            if normalised[worst] <= BAD_DATA_THRESHOLD:
+                break
+            meter, channel = self.row_channels[candidates[worst]]
+            bad_data.append((meter, channel, f"normalised residual {normalised[worst]:.1f}"))
+            del channels[meter, channel]
+
+        self.v = v
+        s_load = np.zeros(self.n_branches + 1, dtype=complex)
+        s_load[self.topology.child] = v[self.topology.child]*np.conj(self.injection @ i_branch)
+        return StateEstimate(v=v, i_branch=i_branch, s_load=s_load, bad_data=bad_data,
+                             objective=float((weights*residuals**2).sum()), iterations=iterations,
+                             factorised=factorised, seconds=time.perf_counter() - start)
+
+
+def simulate_readings(v, s_load, meter_buses, transformer_bus, s_transformer, noise: float, rng) -> dict:
+    # meter readings of a solved state with relative gaussian noise, split equally over the phases
+    # meter_buses: meter name -> bus index, s_load: complex power drawn at every bus (MW + j MVAr)
+    from meter_ingest import MeterReading
+    readings = {}
+    for meter, bus, s in [(meter, bus, s_load[bus]) for meter, bus in meter_buses.items()] + \
+                         [(load_allocation.TRANSFORMER_METER, transformer_bus, s_transformer)]:
+        voltage = np.abs(v[bus])*V_PHASE_BASE*(1 + noise*rng.standard_normal(3))
+        power = s.real/3*1e6*(1 + noise*rng.standard_normal(3))
+        current = np.abs(s)/3*1e6/voltage*(1 + noise*rng.standard_normal(3))
+        readings[meter] = MeterReading(voltage=voltage, current=current, power=power)
+    return readings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="State estimation of the KU grid or a synthetic feeder from "
+                                                 "simulated meter readings, compared with the load allocation")
+    parser.add_argument("--buses", type=int, help="estimate a synthetic feeder of this size instead of the KU grid")
+    parser.add_argument("--metered", type=float, default=0.05, help="share of the loads of a synthetic feeder metered")
+    parser.add_argument("--noise", type=float, default=0.003, help="relative noise of the readings")
+    parser.add_argument("--spread", type=float, default=0.5, help="lognormal spread of the true loads around nominal")
+    parser.add_argument("--tap", type=float, default=0.02,
+                        help="the true supply voltage is 1 p.u. plus or minus up to this")
+    parser.add_argument("--bad", help="meter with a bad reading")
+    parser.add_argument("--bad-channel", choices=("P", "V"), default="P",
+                        help="the active power of the bad meter is five times, its voltage 4%% too high")
+    parser.add_argument("--cycles", type=int, default=5, help="minutes estimated")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    if args.buses:
+        import feeder_generator
+        network = feeder_generator.create_feeder(args.buses).network
+    else:
+        import ku_grid_model
+        network = ku_grid_model.create_network()
+    topology = radial_sweep.build_topology(network)
+    load_names = network.loads.index.to_numpy()
+    load_buses = topology.bus_names.get_indexer(network.loads.bus)
+    p_nominal = network.loads.p_set.to_numpy()
+    q_nominal = network.loads.q_set.to_numpy()
+    if args.buses:
+        metered = rng.choice(len(load_names), max(1, int(args.metered*len(load_names))), replace=False)
+        meter_loads = {f"meter{load}": load for load in metered}
+    else:
+        meter_loads = {meter: list(load_names).index(load) for meter, load in load_allocation.METERED_LOADS.items()}
+    meter_buses = {meter: load_buses[load] for meter, load in meter_loads.items()}
+    metered = np.array(list(meter_loads.values()))
+    unmetered = np.setdiff1d(np.arange(len(load_names)), metered)
+    transformer = np.flatnonzero(topology.branch_component == "Transformer")[0]
+
+    estimator = StateEstimator(topology, load_buses, p_nominal, q_nominal, meter_loads)
+    for cycle in range(args.cycles):
+        # the true state: every load around its nominal value
+        scale = rng.lognormal(0.0, args.spread, len(load_names))
+        s_true = np.zeros(len(topology.bus_names), dtype=complex)
+        np.add.at(s_true, load_buses, scale*(p_nominal + 1j*q_nominal))
+        # the supply voltage drifts, the allocation keeps assuming the slack set point
+        true_topology = topology._replace(v_slack=topology.v_slack + rng.uniform(-args.tap, args.tap))
+        v_true, i_true, iterations = radial_sweep.sweep(true_topology, s_true)
+        s_transformer = v_true[topology.child[transformer]]*np.conj(i_true[transformer])
+        readings = simulate_readings(v_true, s_true, meter_buses, topology.child[transformer], s_transformer,
+                                     args.noise, rng)
+        if args.bad and args.bad_channel == "P":
+            readings[args.bad] = readings[args.bad]._replace(power=readings[args.bad].power*5)
+        elif args.bad:
+            readings[args.bad] = readings[args.bad]._replace(voltage=readings[args.bad].voltage*1.04)
+
+        # the live loop: metered loads from their readings, the rest of the transformer power by nominal shares
+        p_set = p_nominal.copy()
+        for meter, load in meter_loads.items():
+            p_set[load] = readings[meter].power.sum()/1e6
+        unmetered_power = readings[load_allocation.TRANSFORMER_METER].power.sum()/1e6 - p_set[metered].sum()
+        p_set[unmetered] = unmetered_power*p_nominal[unmetered]/p_nominal[unmetered].sum()
+        q_set = p_set*load_allocation.tan_phi
+        s_allocated = np.zeros(len(topology.bus_names), dtype=complex)
+        np.add.at(s_allocated, load_buses, p_set + 1j*q_set)
+        v_allocated, i_allocated, iterations = radial_sweep.sweep(topology, s_allocated)
+
+        estimate = estimator.estimate(readings, p_set, q_set)
+        print(f"cycle {cycle}: {estimate.seconds*1000:.1f} ms, {estimate.iterations} iterations, "
+              f"{estimate.factorised} factorisations, J = {estimate.objective:.1f}, bad data {estimate.bad_data}")
+        for name, v, i_branch in (("allocation", v_allocated, i_allocated), ("estimate", estimate.v, estimate.i_branch)):
+            print(f"  {name:>10}: max |V| error {np.abs(np.abs(v) - np.abs(v_true)).max():.5f} p.u., "
+                  f"max current error {np.abs(np.abs(i_branch) - np.abs(i_true)).max()*1000:.3f} p.u./1000")